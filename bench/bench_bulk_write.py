@@ -0,0 +1,62 @@
+"""
+Benchmark of SkypeDatabase bulk writes: inserts generated Messages rows
+with insert_row() committing row by row, and inside bulk_write() sessions,
+printing rows per second.
+
+Usage: python bench_bulk_write.py [ROWS]
+
+@author    Erki Suurjaak
+@created   16.10.2026
+@modified  16.10.2026
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(ROOT_DIR, "src"))
+from skyperious import conf
+from skyperious import skypedata
+
+
+def make_rows(start, count):
+    """Returns generated Messages rows."""
+    return [{"id": i, "convo_id": 1 + i % 10, "author": "author%s" % (i % 7),
+             "body_xml": "message <b>%s</b> text" % i, "timestamp": 1600000000 + i,
+             "type": 61, "chatmsg_type": 3} for i in range(start, start + count)]
+
+
+def measure(tempdir, title, count, session=None):
+    """Inserts rows into a new database and prints rows per second."""
+    filename = os.path.join(tempdir, "%s.db" % len(os.listdir(tempdir)))
+    db = skypedata.SkypeDatabase(filename, truncate=True)
+    db.ensure_schema(create_only=True)
+    rows = make_rows(1, count)
+    start = time.time()
+    if session is None:
+        for row in rows: db.insert_row("messages", row)
+    else:
+        with db.bulk_write(**session):
+            for row in rows: db.insert_row("messages", row)
+    elapsed = max(time.time() - start, 1e-9)
+    db.close()
+    print("%-45s %7d rows %8d rows/sec" % (title, count, count / elapsed))
+
+
+def main(count=20000):
+    conf.DBDoBackup = False
+    tempdir = tempfile.mkdtemp()
+    try:
+        print("insert_row() into Messages, Python %s.\n" % sys.version.split()[0])
+        measure(tempdir, "commit per row", min(count, 2000))
+        measure(tempdir, "bulk_write(), default limits", count, {})
+        measure(tempdir, "bulk_write(rowlimit=1000)", count, {"rowlimit": 1000, "sizelimit": 0})
+        measure(tempdir, "bulk_write(atomic=True)", count, {"atomic": True})
+    finally:
+        shutil.rmtree(tempdir, ignore_errors=True)
+
+
+if "__main__" == __name__:
+    main(*map(int, sys.argv[1:2]))
@@ -0,0 +1,92 @@
+"""
+Microbenchmark of SkypeDatabase row factory: fetches all rows of a generated
+Messages table with the baseline row factory and with the current one,
+printing rows per second, best of several rounds.
+
+Usage: python bench_row_factory.py [ROWS] [ROUNDS]
+
+@author    Erki Suurjaak
+@created   16.10.2026
+@modified  16.10.2026
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import six
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(ROOT_DIR, "src"))
+from skyperious import skypedata
+
+
+def baseline_row_factory(cursor, row):
+    """Row factory from before row plans, converting BLOB and bytes values to strings."""
+    result = {}
+    for idx, col in enumerate(cursor.description):
+        name = col[0]
+        result[name] = row[idx]
+    for name in list(result):
+        datatype = type(result[name])
+        if sys.version_info < (3, ) and datatype is buffer:  # Py2
+            result[name] = str(result[name]).decode("latin1")
+        elif datatype is memoryview:
+            result[name] = datatype.to_bytes().decode("latin1")
+        elif datatype is six.binary_type:
+            try:
+                result[name] = result[name].decode("utf-8")
+            except Exception:
+                result[name] = result[name].decode("latin1")
+    return result
+
+
+def populate(db, count):
+    """Fills Messages table with generated rows, having one BLOB column."""
+    db.ensure_schema(create_only=True)
+    rows = [(i, 1 + i % 10, "author%s" % (i % 7), "message <b>%s</b> text" % i,
+             1600000000 + i, 61, ("guid%s" % i).encode("latin1") + b"\x00\xff")
+            for i in range(1, count + 1)]
+    db.connection.executemany("INSERT INTO Messages "
+                              "(id, convo_id, author, body_xml, timestamp, type, guid) "
+                              "VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+    db.connection.commit()
+
+
+def measure(db, row_factory, text_factory, rounds):
+    """Returns best rows per second of fetching all Messages rows."""
+    result = 0
+    db.connection.text_factory = text_factory
+    for _ in range(rounds):
+        cursor = db.connection.cursor()
+        cursor.row_factory = row_factory
+        start = time.time()
+        count = len(cursor.execute("SELECT * FROM Messages").fetchall())
+        result = max(result, count / max(time.time() - start, 1e-9))
+    return result
+
+
+def main(count=200000, rounds=5):
+    tempdir = tempfile.mkdtemp()
+    try:
+        db = skypedata.SkypeDatabase(os.path.join(tempdir, "bench.db"), truncate=True)
+        populate(db, count)
+        print("SELECT * FROM Messages, %s rows of %s columns, best of %s rounds, Python %s.\n" %
+              (count, len(db.get_table_columns("messages")), rounds, sys.version.split()[0]))
+        variants = [
+            ("tuples, no row factory",               None,                 skypedata.decode_text),
+            ("baseline row factory, bytes text",     baseline_row_factory, six.binary_type),
+            ("baseline row factory, decode_text",    baseline_row_factory, skypedata.decode_text),
+            ("current row factory, decode_text",     db.row_factory,       skypedata.decode_text),
+        ]
+        for title, row_factory, text_factory in variants:
+            speed = measure(db, row_factory, text_factory, rounds)
+            print("%-40s %8d rows/sec" % (title, speed))
+        db.close()
+    finally:
+        shutil.rmtree(tempdir, ignore_errors=True)
+
+
+if "__main__" == __name__:
+    main(*map(int, sys.argv[1:3]))
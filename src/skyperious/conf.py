@@ -10,7 +10,7 @@ Released under the MIT License.
 
 @author      Erki Suurjaak
 @created     26.11.2011
-@modified    10.05.2025
+@modified    16.10.2026
 ------------------------------------------------------------------------------
 """
 try: from ConfigParser import RawConfigParser                 # Py2
@@ -57,17 +57,22 @@ FileDirectives = ["ConsoleHistoryCommands", "DBDoBackup",  "DBFiles", "DBSort",
 ]
 """List of attributes saved if changed from default."""
 OptionalFileDirectives = [
-    "EmoticonsPlotWidth", "ExportChatTemplate", "ExportContactsTemplate", "ExportDbTemplate",
-    "ExportFileAutoOpen", "HistoryFontSize", "HistoryZoom", "LiveSyncAutoDownload",
+    "BulkWriteRowLimit", "BulkWriteSizeLimit", "CacheMessagesSizeLimit", "CacheTablesSizeLimit",
+    "DBBackupPageBatch", "DatabasePragmaProfile", "DatabasePragmaProfileBulk",
+    "DatabasePragmaProfileReadOnly", "DatabasePragmaProfiles", "EmoticonsPlotWidth",
+    "ExportChatTemplate", "ExportContactsTemplate", "ExportDbTemplate", "ExportFileAutoOpen",
+    "FingerprintsFile", "HistoryFontSize", "HistoryZoom", "LiveSyncAutoDownload",
     "LiveSyncAuthRateLimitDelay", "LiveSyncRateLimit", "LiveSyncRateWindow", "LiveSyncRetryDelay",
-    "LiveSyncRetryLimit", "LogFile", "LogSQL", "LogToFile", "MaxConsoleHistory",
-    "MaxHistoryInitialMessages", "MaxRecentFiles", "MaxSearchHistory", "MaxSearchMessages",
-    "MaxSearchTableRows", "MinWindowSize", "PlotDaysColour", "PlotDaysUnitSize", "PlotHoursColour",
-    "PlotHoursUnitSize", "PopupUnexpectedErrors", "SearchResultsChunk",
+    "LiveSyncRetryLimit",
+    "LogFile", "LogSQL", "LogToFile", "MaxConsoleHistory", "MaxHistoryInitialMessages",
+    "MaxRecentFiles", "MaxSearchHistory", "MaxSearchMessages", "MaxSearchTableRows",
+    "MergeInsertChunk", "MinWindowSize", "PlotDaysColour", "PlotDaysUnitSize", "PlotHoursColour",
+    "PlotHoursUnitSize", "PopupUnexpectedErrors", "RowCountsEstimated", "SearchResultsChunk",
     "SharedAudioVideoAutoDownload", "SharedContentPromptAutoLogin", "SharedFileAutoDownload",
     "SharedImageAutoDownload", "ShareDirectoryEnabled", "ShareDirectoryTemplate",
-    "StatisticsPlotWidth", "StatusFlashLength", "UpdateCheckInterval", "WordCloudCountMin",
-    "WordCloudLengthMin", "WordCloudWordsAuthorMax", "WordCloudWordsMax",
+    "SQLProgressInterval", "SQLProgressSteps", "StatisticsPlotWidth", "StatusFlashLength",
+    "UpdateCheckInterval", "WordCloudCountMin", "WordCloudLengthMin", "WordCloudWordsAuthorMax",
+    "WordCloudWordsMax",
 ]
 Defaults = {}
 
@@ -146,6 +151,53 @@ WindowSize = (1080, 710)
 
 """------------------------ OptionalFileDirectives: ------------------------"""
 
+"""Number of changed rows after which to commit in bulk database writes like import or merge."""
+BulkWriteRowLimit = 10000
+
+"""Approximate size of changed data in bytes after which to commit in bulk database writes."""
+BulkWriteSizeLimit = 50 * 1024 * 1024
+
+"""
+Approximate memory budget in bytes for cached chat messages,
+least recently used chats evicted first, unlimited if negative.
+"""
+CacheMessagesSizeLimit = 500 * 1024 * 1024
+
+"""
+Approximate memory budget in bytes for cached full tables,
+least recently used tables evicted first, unlimited if negative.
+"""
+CacheTablesSizeLimit = 200 * 1024 * 1024
+
+"""Number of database pages to copy at a time when making a backup before first write."""
+DBBackupPageBatch = 1024
+
+"""SQLite PRAGMA profile from DatabasePragmaProfiles applied on opening a database."""
+DatabasePragmaProfile = "safe"
+
+"""
+SQLite PRAGMA profile from DatabasePragmaProfiles applied for the duration
+of bulk writes like import, merge or sync.
+"""
+DatabasePragmaProfileBulk = "bulk-write"
+
+"""SQLite PRAGMA profile from DatabasePragmaProfiles applied on opening a database read-only."""
+DatabasePragmaProfileReadOnly = "fast-read"
+
+"""
+SQLite PRAGMA settings by profile name, as {name: [[pragma, value], ]}.
+journal_mode is best left unset, as it is persistent in WAL databases
+and would change it for Skype and other programs using the file.
+"""
+DatabasePragmaProfiles = {
+    "safe":       [["synchronous", "FULL"], ["cache_size", -2000], ["mmap_size", 0],
+                   ["temp_store", "DEFAULT"]],
+    "fast-read":  [["cache_size", -64 * 1024], ["mmap_size", 256 * 1024 * 1024],
+                   ["temp_store", "MEMORY"]],
+    "bulk-write": [["synchronous", "NORMAL"], ["cache_size", -128 * 1024],
+                   ["temp_store", "MEMORY"]],
+}
+
 """Width of the chat emoticons plots, in pixels."""
 EmoticonsPlotWidth = 200
 
@@ -161,6 +213,9 @@ ExportDbTemplate = u"Export from %(name)s"
 """Automatically open exported files and directories in registered application."""
 ExportFileAutoOpen = True
 
+"""Path to database file caching message fingerprints for chat comparison and merge."""
+FingerprintsFile = os.path.join(VarDirectory, "fingerprints.db")
+
 """Font size in chat history."""
 HistoryFontSize = 10
 
@@ -212,6 +267,9 @@ MaxSearchMessages = 500
 """Maximum number of table rows to show in search results."""
 MaxSearchTableRows = 500
 
+"""Number of messages to insert in one batch when merging."""
+MergeInsertChunk = 1000
+
 """Minimum allowed size for the main window, as (width, height)."""
 MinWindowSize = (600, 400)
 
@@ -230,6 +288,9 @@ PlotHoursUnitSize = (4, 30)
 """Whether to pop up message dialogs for unhandled errors."""
 PopupUnexpectedErrors = True
 
+"""Whether to estimate table rowcounts on opening database, counting exact rows in background."""
+RowCountsEstimated = True
+
 """Number of search results to yield in one chunk from search thread."""
 SearchResultsChunk = 50
 
@@ -251,6 +312,12 @@ ShareDirectoryEnabled = True
 """Template for local shared files folder name, format can use "filename" parameter."""
 ShareDirectoryTemplate = "%(filename)s files"
 
+"""Seconds between progress reports of long-running cancellable SQL, like integrity check."""
+SQLProgressInterval = 0.1
+
+"""Number of SQLite virtual machine instructions between checks for cancelling SQL."""
+SQLProgressSteps = 10000
+
 """Width of the chat statistics plots, in pixels."""
 StatisticsPlotWidth = 150
 
@@ -442,7 +509,7 @@ def load(configfile=None):
 
     @param   configfile  name of configuration file to use from now if not module defaults
     """
-    global Defaults, VarDirectory, LogFile, ConfigFile, ConfigFileStatic
+    global Defaults, VarDirectory, LogFile, FingerprintsFile, ConfigFile, ConfigFileStatic
 
     try: VARTYPES = (basestring, bool, float, int, long, list, tuple, dict, type(None))        # Py2
     except Exception: VARTYPES = (bytes, str, bool, float, int, list, tuple, dict, type(None)) # Py3
@@ -468,6 +535,7 @@ def load(configfile=None):
         try:
             VarDirectory = appdirs.user_data_dir(title, appauthor=False)
             LogFile = os.path.join(VarDirectory, "%s.log" % Title.lower())
+            FingerprintsFile = os.path.join(VarDirectory, "fingerprints.db")
         except Exception: pass
 
     section = "*"
@@ -8,7 +8,7 @@ Released under the MIT License.
 
 @author      Erki Suurjaak
 @created     13.01.2012
-@modified    26.04.2025
+@modified    16.10.2026
 ------------------------------------------------------------------------------
 """
 import codecs
@@ -17,6 +17,7 @@ import csv
 import datetime
 import itertools
 import logging
+import multiprocessing
 import os
 import re
 
@@ -85,6 +86,10 @@ IMAGE_FORMATS = {"bmp": wx.BITMAP_TYPE_BMP, "jpg": wx.BITMAP_TYPE_JPEG, "png": w
 logger = logging.getLogger(__name__)
 
 
+"""Worker process state in parallel export, as {"db", "format", "opts"}."""
+EXPORT_PROCESS = {}
+
+
 def export_chats(chats, path, format, db, opts=None):
     """
     Exports the specified chats from the database under path.
@@ -102,6 +107,11 @@ def export_chats(chats, path, format, db, opts=None):
                ?noskip         whether to not skip chats with no messages
                ?progress       function called before exporting each chat,
                                with the number of messages exported so far
+               ?jobs           number of worker processes for exporting chats
+                               to separate files in parallel, if more than 1;
+                               not used if downloading shared media
+               ?password       Skype password to log in with
+                               if downloading shared media and password not stored
     """
     files, count, message_count = [], 0, 0
     format, opts = format.lower(), opts or {}
@@ -130,49 +140,151 @@ def export_chats(chats, path, format, db, opts=None):
                        export_chat_csv   if "csv"  == format else
                        export_chat_template)
 
-        if "html" == format \
-        and (conf.SharedImageAutoDownload or conf.SharedAudioVideoAutoDownload
-             or conf.SharedFileAutoDownload and opts.get("files_folder")) \
-        and not db.live.is_logged_in() \
-        and conf.Login.get(db.filename, {}).get("password"):
-            # Log in to Skype online service to download shared media
-            pwd = util.deobfuscate(conf.Login[db.filename]["password"])
-            util.try_ignore(db.live.login, password=pwd)
+        login_for_media(db, format, opts)
 
         noskip, messages, timerange, progress = (opts.get(x)
             for x in ("noskip", "messages", "timerange", "progress"))
+        # Media downloads go through the single online login session: export serially
+        is_parallel = (opts.get("jobs") or 0) > 1 and opts.get("multi") \
+                      and not messages and len(chats) > 1 \
+                      and not (is_media_download(format, opts) and db.live.is_logged_in())
+        tasks = [] # [(chat, filename), ] for parallel export
         for chat in chats:
-            do_skip = False
+            do_skip, chat_messages = False, messages
             timestamp_from, timestamp_to = timerange or (None, None)
 
-            if not noskip and not messages and chat["message_count"] \
+            if not noskip and not chat_messages and chat["message_count"] \
             and any(x is not None for x in timerange or ()):
-                messages = db.get_messages(chat, use_cache=False,
-                    timestamp_from=timestamp_from, timestamp_to=timestamp_to
+                chat_messages = db.get_messages(chat, use_cache=False,
+                    timestamp_from=timestamp_from, timestamp_to=timestamp_to,
+                    columns=skypedata.MESSAGE_COLUMNS_CORE
                 )
-                msg = next(messages, None)
-                if not msg: do_skip, messages = True, None
-                else: messages = itertools.chain([msg], messages)
+                msg = next(chat_messages, None)
+                if not msg: do_skip, chat_messages = True, None
+                else: chat_messages = itertools.chain([msg], chat_messages)
 
-            if do_skip or not noskip and not messages and not chat["message_count"]:
+            if do_skip or not noskip and not chat_messages and not chat["message_count"]:
                 logger.info("Skipping exporting %s: no messages.",
                             chat["title_long_lc"])
-                if progress: progress(message_count)
+                if progress and not is_parallel: progress(message_count)
+                continue # continue for chat in chats
+
+            filename = make_filename(chat)
+            files.append(filename)
+            if is_parallel:
+                util.create_file(filename) # Reserve unique name for worker process
+                tasks.append((chat, filename))
                 continue # continue for chat in chats
 
             guibase.status("Exporting %s.", chat["title_long_lc"], log=True)
             if progress: progress(message_count)
-            filename = make_filename(chat)
-            msgs = messages or db.get_messages(chat, use_cache=False,
-                timestamp_from=timestamp_from, timestamp_to=timestamp_to
+            msgs = chat_messages or db.get_messages(chat, use_cache=False,
+                timestamp_from=timestamp_from, timestamp_to=timestamp_to,
+                columns=skypedata.MESSAGE_COLUMNS_CORE
             )
             chatarg = [chat] if "xlsx" == format else chat
             c_count, c_message_count = export_func(chatarg, filename, db, msgs, opts)
             count, message_count = count + c_count, message_count + c_message_count
-            files.append(filename)
+        if tasks:
+            count, message_count = export_chats_parallel(tasks, format, db, opts)
     return files, count, message_count
 
 
+def export_chats_parallel(tasks, format, db, opts):
+    """
+    Exports chats to separate files in a pool of worker processes, each with
+    its own read-only database connection, largest chats first.
+    Deletes files of chats not exported, if interrupted by error or cancel.
+
+    @param   tasks   list of (chat dict, export filename reserved as empty file)
+    @param   format  export format (html|txt|xlsx|csv)
+    @param   db      SkypeDatabase instance
+    @param   opts    export options dictionary, as in export_chats()
+    @return          (number of chats exported, number of messages exported)
+    """
+    count, message_count, progress = 0, 0, opts.get("progress")
+    logger.info("Exporting %s from %s in %s worker processes.", util.plural("chat", tasks),
+                db.filename, min(opts["jobs"], len(tasks)))
+    popts = dict((k, v) for k, v in opts.items() if k not in ("messages", "progress"))
+    configfile = conf.ConfigFile if conf.ConfigFileStatic else None
+    tasks = sorted(tasks, key=lambda x: x[0]["message_count"] or 0, reverse=True)
+    pending = set(filename for _, filename in tasks)
+    pool = None
+    try:
+        pool = multiprocessing.Pool(min(opts["jobs"], len(tasks)), init_export_process,
+                                    (db.filename, format, popts, configfile))
+        if progress: progress(message_count)
+        for filename, c_count, c_message_count in pool.imap_unordered(export_chat_process, tasks):
+            count, message_count = count + c_count, message_count + c_message_count
+            pending.discard(filename)
+            if progress: progress(message_count)
+        pool.close()
+    except BaseException:
+        if pool: pool.terminate()
+        raise
+    finally:
+        if pool: pool.join()
+        for filename in pending: util.try_ignore(os.unlink, filename)
+    return count, message_count
+
+
+def init_export_process(filename, format, opts, configfile=None):
+    """Initializes worker process for parallel export, opening its own database connection."""
+    if not conf.Defaults: conf.load(configfile) # Spawned process, not forked
+    db = skypedata.SkypeDatabase(filename, readonly=True)
+    EXPORT_PROCESS.update(db=db, format=format, opts=opts)
+
+
+def export_chat_process(task):
+    """
+    Exports a chat in parallel export worker process.
+
+    @param   task  (chat dict, export filename)
+    @return        (export filename, number of chats exported, number of messages exported)
+    """
+    (chat, filename), format = task, EXPORT_PROCESS["format"]
+    db, opts = EXPORT_PROCESS["db"], EXPORT_PROCESS["opts"]
+    export_func = (export_chats_xlsx if "xlsx" == format else
+                   export_chat_csv   if "csv"  == format else
+                   export_chat_template)
+    timestamp_from, timestamp_to = opts.get("timerange") or (None, None)
+    guibase.status("Exporting %s.", chat["title_long_lc"], log=True)
+    msgs = db.get_messages(chat, use_cache=False,
+        timestamp_from=timestamp_from, timestamp_to=timestamp_to,
+        columns=skypedata.MESSAGE_COLUMNS_CORE
+    )
+    chatarg = [chat] if "xlsx" == format else chat
+    return (filename, ) + tuple(export_func(chatarg, filename, db, msgs, opts))
+
+
+def is_media_login(filename, format, opts):
+    """
+    Returns whether export would log in to Skype online service for downloading
+    shared media: if exporting HTML with shared media downloads enabled,
+    and password available.
+    """
+    return is_media_download(format, opts) \
+           and bool(opts.get("password") or conf.Login.get(filename, {}).get("password"))
+
+
+def is_media_download(format, opts):
+    """Returns whether export would download shared media, if logged in to Skype online service."""
+    return "html" == format \
+           and bool(conf.SharedImageAutoDownload or conf.SharedAudioVideoAutoDownload
+                    or conf.SharedFileAutoDownload and opts.get("files_folder"))
+
+
+def login_for_media(db, format, opts):
+    """
+    Logs in to Skype online service if exporting HTML with shared media
+    downloads enabled, and password available.
+    """
+    if is_media_login(db.filename, format, opts) and not db.live.is_logged_in():
+        # Log in to Skype online service to download shared media
+        pwd = opts.get("password") or util.deobfuscate(conf.Login[db.filename]["password"])
+        util.try_ignore(db.live.login, password=pwd)
+
+
 def export_chats_xlsx(chats, filename, db, messages=None, opts=None):
     """
     Exports the chats to a single XLSX file with chats on separate worksheets.
@@ -201,7 +313,8 @@ def export_chats_xlsx(chats, filename, db, messages=None, opts=None):
         if not noskip and not messages and chat["message_count"] \
         and any(x is not None for x in timerange or ()):
             messages = db.get_messages(chat, use_cache=False,
-                timestamp_from=timestamp_from, timestamp_to=timestamp_to
+                timestamp_from=timestamp_from, timestamp_to=timestamp_to,
+                columns=skypedata.MESSAGE_COLUMNS_CORE
             )
             msg = next(messages, None)
             if not msg: do_skip, messages = True, None
@@ -221,7 +334,8 @@ def export_chats_xlsx(chats, filename, db, messages=None, opts=None):
                         {3: "boldhidden"})
         writer.set_header(False)
         msgs = messages or db.get_messages(chat, use_cache=False,
-            timestamp_from=timestamp_from, timestamp_to=timestamp_to
+            timestamp_from=timestamp_from, timestamp_to=timestamp_to,
+            columns=skypedata.MESSAGE_COLUMNS_CORE
         )
         for m in msgs:
             text = parser.parse(m, output={"format": "text"})
@@ -8,7 +8,7 @@ Released under the MIT License.
 
 @author      Erki Suurjaak
 @created     26.11.2011
-@modified    10.05.2025
+@modified    16.10.2026
 ------------------------------------------------------------------------------
 """
 import ast
@@ -1968,6 +1968,7 @@ class MainWindow(guibase.TemplateFrameMixIn, wx.Frame):
                 text += ", latest %(lastmessage_chat)s" % stats
             self.label_chats.Value = text
             text = util.plural("message", stats["messages"], sep=",")
+            if stats.get("messages_estimated"): text = "~" + text
             if stats.get("lastmessage_dt"):
                 text += ", last at %(lastmessage_dt)s" % stats
             self.label_messages.Value = text
@@ -2108,6 +2109,8 @@ class MainWindow(guibase.TemplateFrameMixIn, wx.Frame):
                     del conf.LastActivePage[page.db.filename]
                 page.save_page_conf()
                 page.worker_live.stop()
+                page.worker_index.stop()
+                page.worker_rowcount.stop()
                 for worker in page.workers_search.values(): worker.stop()
                 page.db.close()
             for page in self.merger_pages:
@@ -2186,6 +2189,8 @@ class MainWindow(guibase.TemplateFrameMixIn, wx.Frame):
 
             for worker in page.workers_search.values(): worker.stop()
             page.worker_live.stop()
+            page.worker_index.stop()
+            page.worker_rowcount.stop()
             page.save_page_conf()
 
             if page in self.db_pages:
@@ -2384,6 +2389,7 @@ class DatabasePage(wx.Panel):
         self.db_grids = {} # {"tablename": SqliteGridBase, }
         self.memoryfs = memoryfs
         self.timeline_timer = None # Timeline highlight callback timer
+        self.backup_percent = None # Last shown progress of background database backup
         parent_notebook.InsertPage(1, self, title)
         busy = controls.BusyPanel(self, "Loading \"%s\"." % db.filename)
         self.counter = lambda x={"c": 0}: x.update(c=1+x["c"]) or x["c"]
@@ -2412,6 +2418,9 @@ class DatabasePage(wx.Panel):
         self.workers_search = {} # {search ID: workers.SearchThread, }
         self.db.live.progress = self.on_live_result
         self.worker_live = workers.LiveThread(self.on_live_result, self.db.live)
+        self.worker_index = workers.SearchIndexThread(self.on_search_index_result)
+        self.worker_rowcount = workers.RowCountThread(self.on_rowcount_result)
+        self.info_stats = {} # Last general statistics shown on Information page
 
         sizer = self.Sizer = wx.BoxSizer(wx.VERTICAL)
 
@@ -2538,6 +2547,9 @@ class DatabasePage(wx.Panel):
             busy.Close()
         self.edit_searchall.SetFocus()
         wx.CallAfter(self.edit_searchall.SelectAll)
+        # Back up in the background, writes meanwhile wait for it in a cancellable window
+        self.db.backup_progress, self.db.backup_wait = self.on_backup_progress, self.on_backup_wait
+        self.db.start_backup(self.on_backup_progress)
 
 
     def create_page_chats(self, notebook):
@@ -3163,11 +3175,11 @@ class DatabasePage(wx.Panel):
                  "edit_info_transfers", "edit_info_messages",
                  "edit_info_lastmessage", "edit_info_firstmessage", "",
                  "edit_info_path", "edit_info_sharepath", "edit_info_size",
-                 "edit_info_modified", "edit_info_sha1", "edit_info_md5", ]
+                 "edit_info_modified", "edit_info_sha1", "edit_info_md5", "edit_info_pragmas", ]
         labels = ["Conversations", "Contacts", "File sharing", "Messages",
                   "Last message", "First message", "",
                   "Full path", "Shared files path", "File size", "Last modified",
-                  "SHA-1 checksum", "MD5 checksum",  ]
+                  "SHA-1 checksum", "MD5 checksum", "SQLite profile", ]
         for name, label in zip(names, labels):
             if not name and not label:
                 sizer_file.AddSpacer(20), sizer_file.AddSpacer(20)
@@ -3190,22 +3202,36 @@ class DatabasePage(wx.Panel):
 
         button_check = self.button_check_integrity = \
             wx.Button(parent=panel2, label="Check for corruption")
+        button_index = self.button_search_index = \
+            wx.Button(parent=panel2, label="Build search index")
+        button_optimize = self.button_optimize = \
+            wx.Button(parent=panel2, label="Optimize")
         button_setshare = self.button_set_sharepath = \
             wx.Button(parent=panel2, label="Set shared files path")
         button_refresh = self.button_refresh_fileinfo = \
             wx.Button(parent=panel2, label="Refresh")
         button_check.Enabled = button_setshare.Enabled = button_refresh.Enabled = False
+        button_index.Enabled = button_optimize.Enabled = False
+        button_index.Shown = self.db.is_search_index_supported()
         button_setshare.Shown = conf.ShareDirectoryEnabled
         button_setshare.ToolTip = "Set or clear database-specific path for local shared files cache"
         button_check.SetToolTip("Check database integrity for corruption and recovery.")
+        button_index.SetToolTip("Build or drop full-text index for faster message search.")
+        button_optimize.SetToolTip("Add or drop indexes for faster common queries.")
         sizer_buttons.Add(button_check)
         sizer_buttons.AddStretchSpacer()
+        sizer_buttons.Add(button_index)
+        sizer_buttons.AddStretchSpacer()
+        sizer_buttons.Add(button_optimize)
+        sizer_buttons.AddStretchSpacer()
         sizer_buttons.Add(button_setshare)
         sizer_buttons.AddStretchSpacer()
         sizer_buttons.Add(button_refresh, border=5, flag=wx.RIGHT)
         
         self.Bind(wx.EVT_BUTTON, self.on_compare_database, button_compare)
         self.Bind(wx.EVT_BUTTON, self.on_check_integrity,  button_check)
+        self.Bind(wx.EVT_BUTTON, self.on_search_index,     button_index)
+        self.Bind(wx.EVT_BUTTON, self.on_optimize,         button_optimize)
         self.Bind(wx.EVT_BUTTON, self.on_set_sharepath,    button_setshare)
         self.Bind(wx.EVT_BUTTON, lambda e: self.update_info_page(),
                   button_refresh)
@@ -3449,6 +3475,46 @@ class DatabasePage(wx.Panel):
         wx.CallAfter(dorefresh) # Postpone to allow conf update
 
 
+    def on_backup_progress(self, copied=0, total=0, done=False, error=None):
+        """Handler for database backup progress, shows status (from any thread)."""
+        if done and error:
+            text = "Error creating backup of %s: %s" % (self.db, util.format_exc(error))
+            wx.CallAfter(guibase.status, text, log=True, flash=False)
+        elif done: wx.CallAfter(guibase.status, "Created backup of %s.", self.db, log=True)
+        elif total:
+            percent = 100 * copied // total
+            if percent == self.backup_percent: return
+            self.backup_percent = percent
+            wx.CallAfter(guibase.status, "Creating backup of %s: %s%%.", self.db, percent,
+                         flash=False)
+
+
+    def on_backup_wait(self, session):
+        """
+        Handler for database write waiting for backup in progress: shows a cancellable
+        progress window on UI thread, keeping UI responsive meanwhile,
+        and joins backup thread if called from another thread.
+
+        @return  False if user cancelled waiting, True otherwise
+        """
+        if not wx.IsMainThread():
+            session["thread"].join()
+            return True
+        dlg = controls.ProgressWindow(self, "Database backup", agwStyle=wx.ALIGN_CENTER)
+        disabler = wx.WindowDisabler(dlg) # Prevent other actions while waiting
+        try:
+            while not session["done"]:
+                percent = 100 * session["copied"] // session["total"] if session["total"] else 0
+                text = "Creating backup of %s before saving changes: %s%%." % (self.db, percent)
+                if not dlg.Update(percent, text): return False
+                wx.YieldIfNeeded()
+                time.sleep(0.05)
+            return True
+        finally:
+            del disabler
+            dlg.Destroy()
+
+
     def on_change_configuration(self, event):
         """Handler for changing advanced options, updates local share directory related UI."""
         opts1, opts2 = event.opts1, event.opts2
@@ -4284,26 +4350,134 @@ class DatabasePage(wx.Panel):
         self.update_info_page()
 
 
+    def on_search_index(self, event):
+        """
+        Handler for clicking to build or drop full-text search index,
+        starts or stops indexing in background, or drops existing index.
+        """
+        if self.worker_index.is_working():
+            self.worker_index.stop_work()
+            self.button_search_index.Enabled = False
+            return
+
+        if self.db.has_search_index():
+            if wx.OK != wx.MessageBox(
+                "Drop full-text search index from %s?\n\nMessage search will "
+                "fall back to slower full scan." % self.db,
+                conf.Title, wx.OK | wx.CANCEL | wx.ICON_INFORMATION
+            ): return
+            self.db.drop_search_index()
+            guibase.status("Dropped full-text search index from %s.", self.db, log=True)
+            self.update_search_index_button()
+            return
+
+        guibase.status("Indexing messages for search in %s.", self.db, log=True)
+        self.worker_index.work({"action": "build", "db": self.db})
+        self.update_search_index_button()
+
+
+    def on_search_index_result(self, result):
+        """Callback for workers.SearchIndexThread results."""
+
+        def after(result):
+            if not self: return
+
+            if "index" in result and "count" in result:
+                percent = min(100, math.ceil(100 * util.safedivf(result["index"], result["count"])))
+                guibase.status("Indexing messages for search in %s, %s%% complete.",
+                               self.db, percent, flash=False)
+            if result.get("error"):
+                logger.error("Error building search index in %s:\n\n%s", self.db, result["error"])
+                errormsg = "Error building search index in %s:\n\n%s" % \
+                           (self.db, result.get("error_short", result["error"]))
+                wx.MessageBox(errormsg, conf.Title, wx.OK | wx.ICON_WARNING)
+            elif result.get("done"):
+                guibase.status("Indexing messages for search in %s %s.", self.db,
+                               "complete" if result.get("complete") else "stopped", log=True)
+            if result.get("done"):
+                self.button_search_index.Enabled = True
+                self.update_search_index_button(working=False)
+
+        wx.CallAfter(after, result)
+
+
+    def update_search_index_button(self, working=None):
+        """
+        Updates search index button label according to index status.
+
+        @param   working  whether indexing is ongoing, queries worker if None
+        """
+        label = "Build search index"
+        if working is None: working = self.worker_index.is_working()
+        if working: label = "Stop indexing"
+        elif self.db.has_search_index(): label = "Drop search index"
+        self.button_search_index.Label = label
+        self.button_search_index.ContainingSizer.Layout()
+
+
     def on_compare_database(self, event):
         """Handler for choosing file to merge into this database, opens menu."""
         evt = DatabasePageEvent(self.Id, source=self, compare=True, target=self.button_compare)
         wx.PostEvent(self.Parent, evt)
 
 
+    def make_sql_progress(self, title, message):
+        """
+        Returns (progress callback for cancellable SQL, function closing progress),
+        callback showing a cancellable progress window with elapsed time
+        while statement runs, other windows disabled meanwhile.
+        Closing function returns whether user cancelled.
+        """
+        state = {"dlg": None, "disabler": None, "cancel": False}
+
+        def on_cancel():
+            state["cancel"] = True
+            return True
+
+        def progress(elapsed):
+            text = "%s\n\n%s elapsed." % (message, util.format_seconds(elapsed))
+            if not state["dlg"]:
+                state["dlg"] = controls.ProgressWindow(self, title, cancel=on_cancel,
+                                                       agwStyle=wx.ALIGN_CENTER)
+                state["disabler"] = wx.WindowDisabler(state["dlg"])
+            state["dlg"].Update(0, text)
+            state["dlg"].Pulse()
+            wx.YieldIfNeeded()
+            return not state["cancel"]
+
+        def close():
+            state["disabler"] = None
+            if state["dlg"]: state["dlg"].Destroy()
+            state["dlg"] = None
+            return state["cancel"]
+        return progress, close
+
+
     def on_check_integrity(self, event):
         """
         Handler for checking database integrity, offers to save a fixed
         database if corruption detected.
         """
+        dlg = wx.MessageDialog(self, "Run a quick check or a full integrity check "
+                               "on %s?\n\nQuick check skips verifying index contents; "
+                               "full check can take a long time on large databases." % self.db,
+                               conf.Title, wx.ICON_QUESTION | wx.YES_NO | wx.CANCEL)
+        dlg.SetYesNoCancelLabels("&Quick check", "&Full check", "&Cancel")
+        choice = dlg.ShowModal()
+        dlg.Destroy()
+        if wx.ID_CANCEL == choice: return
+
+        quick = (wx.ID_YES == choice)
         msg = "Checking integrity of %s." % self.db.filename
         guibase.status(msg)
-        busy = controls.BusyPanel(self, msg)
-        wx.YieldIfNeeded()
+        progress, close = self.make_sql_progress("Integrity check", msg)
         try:
-            errors = self.db.check_integrity()
+            errors = self.db.check_integrity(quick, progress)
         except Exception as e:
             errors = e.args[:]
-        busy.Close()
+        if close(): # Cancelled by user
+            guibase.status("Cancelled checking integrity of %s.", self.db.filename)
+            return
         guibase.status()
         if not errors:
             wx.MessageBox("No database errors detected.",
@@ -4324,13 +4498,24 @@ class DatabasePage(wx.Panel):
                 if wx.ID_OK == self.dialog_savedb.ShowModal():
                     newfile = controls.get_dialog_path(self.dialog_savedb)
                     if newfile != self.db.filename:
+                        resume = self.db.is_recovery_resumable(newfile) and wx.YES == \
+                                 wx.MessageBox("%s contains an interrupted recovery.\n\n"
+                                               "Resume it?" % newfile, conf.Title,
+                                               wx.ICON_QUESTION | wx.YES | wx.NO)
                         guibase.status("Recovering data from %s to %s.",
                                        self.db.filename, newfile)
                         m = "Recovering data from %s\nto %s."
                         busy = controls.BusyPanel(self, m % (self.db, newfile))
                         wx.YieldIfNeeded()
+
+                        def progress(table, index, count, rows, rate):
+                            guibase.status("Recovering data from %s: table %s of %s, %s (%s/s).",
+                                           self.db, index + 1, count, util.plural("row", rows),
+                                           util.plural("row", int(rate)), flash=False)
+                            wx.YieldIfNeeded()
+                            return True
                         try:
-                            copyerrors = self.db.recover_data(newfile)
+                            copyerrors = self.db.recover_data(newfile, progress, resume)
                         finally:
                             busy.Close()
                         err = ("\n\nErrors occurred during the recovery, "
@@ -4414,25 +4599,16 @@ class DatabasePage(wx.Panel):
             self.db.update_accountinfo()
             self.update_accountinfo()
         for name in ["chats", "contacts", "messages", "transfers",
-        "lastmessage", "firstmessage", "size", "modified", "sha1", "md5"]:
+        "lastmessage", "firstmessage", "size", "modified", "sha1", "md5", "pragmas"]:
             getattr(self, "edit_info_%s" % name).Value = ""
         stats = {}
         try:
             stats = self.db.get_general_statistics()
         except Exception: pass
-        if stats:
-            self.edit_info_chats.Value     = "{:,}".format(stats["chats"])
-            self.edit_info_contacts.Value  = "{:,}".format(stats["contacts"])
-            self.edit_info_messages.Value  = "{:,}".format(stats["messages"])
-            text_sharing = util.plural("file transfer", stats["transfers"], sep=",")
-            if stats["shares"]:
-                text_sharing += ", %s" % util.plural("other share", stats["shares"], sep=",")
-            if stats.get("shared_files"):
-                text_sharing += ", {:,} locally on disk".format(stats["shared_files"])
-            self.edit_info_transfers.Value = text_sharing
-        if "messages_from" in stats:
-            self.edit_info_messages.Value += " ({:,} sent and {:,} received)".format(
-                stats.get("messages_from") or 0, stats.get("messages_to") or 0)
+        self.info_stats = stats
+        self.update_info_counts()
+        if any(stats.get(n + "_estimated") for n in ("contacts", "messages", "transfers")):
+            self.worker_rowcount.work({"db": self.db})
         text = ""
         if "lastmessage_dt" in stats:
             text = "%(lastmessage_dt)s %(lastmessage_from)s" % stats
@@ -4466,11 +4642,70 @@ class DatabasePage(wx.Panel):
             self.edit_info_md5.Value = md5.hexdigest()
         except Exception as e:
             self.edit_info_sha1.Value = self.edit_info_md5.Value = util.format_exc(e)
+        names = ["journal_mode", "synchronous", "cache_size", "mmap_size", "temp_store"]
+        pragmas = self.db.get_pragmas(names)
+        self.edit_info_pragmas.Value = "%s (%s)" % (self.db.pragma_profile or "default",
+            ", ".join("%s %s" % (n, pragmas[n]) for n in names if n in pragmas))
         self.button_check_integrity.Enabled = True
+        self.button_search_index.Enabled = True
+        self.button_optimize.Enabled = True
+        self.update_search_index_button()
         self.button_set_sharepath.Enabled = conf.ShareDirectoryEnabled
         self.button_refresh_fileinfo.Enabled = True
 
 
+    def update_info_counts(self):
+        """
+        Updates chat, contact, message and transfer counts on the Information page,
+        marking rowcounts still being estimated.
+        """
+        stats = self.info_stats
+        if stats:
+            fmt = lambda n: ("~" if stats.get(n + "_estimated") else "") + "{:,}".format(stats[n])
+            self.edit_info_chats.Value     = fmt("chats")
+            self.edit_info_contacts.Value  = fmt("contacts")
+            self.edit_info_messages.Value  = fmt("messages")
+            text_sharing = util.plural("file transfer", stats["transfers"], sep=",")
+            if stats.get("transfers_estimated"): text_sharing = "~" + text_sharing
+            if stats["shares"]:
+                text_sharing += ", %s" % util.plural("other share", stats["shares"], sep=",")
+            if stats.get("shared_files"):
+                text_sharing += ", {:,} locally on disk".format(stats["shared_files"])
+            self.edit_info_transfers.Value = text_sharing
+        if "messages_from" in stats:
+            self.edit_info_messages.Value += " ({:,} sent and {:,} received)".format(
+                stats.get("messages_from") or 0, stats.get("messages_to") or 0)
+
+
+    def on_rowcount_result(self, result):
+        """
+        Callback for workers.RowCountThread results,
+        updates exact rowcounts on Tables and Information pages.
+        """
+
+        def after(result):
+            if not self: return
+
+            if "table" in result:
+                item = self.tree_tables.GetNext(self.tree_tables.GetRootItem())
+                while item and item.IsOk():
+                    if self.tree_tables.GetItemPyData(item) == result["table"]:
+                        self.tree_tables.SetItemText(item, "%d row%s" % (
+                            result["rows"], "s" if result["rows"] != 1 else " "
+                        ), 1)
+                        break # while item
+                    item = self.tree_tables.GetNextSibling(item)
+                name = result["table"].lower()
+                if self.info_stats.get(name + "_estimated"):
+                    self.info_stats[name] = result["rows"]
+                    self.info_stats.pop(name + "_estimated")
+                    self.update_info_counts()
+            if result.get("error"):
+                logger.error("Error counting table rows in %s:\n\n%s", self.db, result["error"])
+
+        wx.CallAfter(after, result)
+
+
     def on_refresh_tables(self, event=None):
         """
         Refreshes the table tree and open table data. Asks for confirmation
@@ -4529,6 +4764,67 @@ class DatabasePage(wx.Panel):
             self.page_tables.Refresh()
 
 
+    def on_optimize(self, event):
+        """Handler for clicking to optimize database, opens options menu."""
+        names = self.db.get_optimize_indexes()
+        menu = wx.Menu()
+        item_add  = wx.MenuItem(menu, wx.ID_ANY, "&Add indexes for faster queries")
+        item_drop = wx.MenuItem(menu, wx.ID_ANY, "&Drop %s added by optimization" %
+                                util.plural("index", names, numbers=False))
+        menu.Append(item_add)
+        menu.Append(item_drop)
+        item_drop.Enable(bool(names))
+        menu.Bind(wx.EVT_MENU, self.on_optimize_add,  item_add)
+        menu.Bind(wx.EVT_MENU, self.on_optimize_drop, item_drop)
+        event.EventObject.PopupMenu(menu, (0, event.EventObject.Size[1]))
+
+
+    def on_optimize_add(self, event):
+        """
+        Handler for adding indexes for common queries to database,
+        reports created indexes and query timings before and after.
+        """
+        msg = "Optimizing %s." % self.db.filename
+        guibase.status(msg, log=True)
+        busy = controls.BusyPanel(self, msg)
+        wx.YieldIfNeeded()
+        try: result = self.db.optimize()
+        except Exception as e:
+            logger.exception("Error optimizing %s.", self.db)
+            busy.Close()
+            guibase.status()
+            return wx.MessageBox("Error optimizing %s:\n\n%s" % (self.db, util.format_exc(e)),
+                                 conf.Title, wx.OK | wx.ICON_WARNING)
+        busy.Close()
+        guibase.status()
+
+        if result["indexes"]:
+            info = "Created %s in %s:\n%s." % (util.plural("index", result["indexes"], sep=","),
+                                                 self.db, ", ".join(result["indexes"]))
+        else: info = "All optimization indexes already present in %s." % self.db
+        if result["timings"]:
+            info += "\n\nQuery timings before and after:\n\n" + "\n".join(
+                "%s: %.3fs, %.3fs" % x for x in result["timings"])
+        logger.info(info)
+        wx.MessageBox(info, conf.Title, wx.ICON_INFORMATION)
+
+
+    def on_optimize_drop(self, event):
+        """Handler for dropping indexes added by optimization from database."""
+        names = self.db.get_optimize_indexes()
+        if not names or wx.OK != wx.MessageBox(
+            "Drop %s added by optimization from %s?" % (util.plural("index", names), self.db),
+            conf.Title, wx.OK | wx.CANCEL | wx.ICON_INFORMATION
+        ): return
+        try: names = self.db.drop_optimize_indexes()
+        except Exception as e:
+            logger.exception("Error dropping indexes from %s.", self.db)
+            return wx.MessageBox("Error dropping indexes from %s:\n\n%s" %
+                                 (self.db, util.format_exc(e)),
+                                 conf.Title, wx.OK | wx.ICON_WARNING)
+        guibase.status("Dropped %s from %s.", util.plural("index", names), self.db, log=True)
+
+
     def on_set_sharepath(self, event):
         """Handler for selecting to set or clear local shared files path for database."""
         value1 = self.db.get_internal_option("ShareDirectory") or ""
@@ -6063,10 +6359,13 @@ class DatabasePage(wx.Panel):
         text or whole contents as an SQL script.
         """
         sql = self.stc_sql.SelectedText.strip() or self.stc_sql.Text.strip()
+        progress, close = self.make_sql_progress("SQL script", "Executing SQL script.")
         try:
             if sql:
                 logger.info("Executing SQL script \"%s\".", sql)
-                self.db.connection.executescript(sql)
+                with self.db.sql_task(progress):
+                    self.db.execute_script(sql)
+                close()
                 self.grid_sql.SetTable(None)
                 self.grid_sql.CreateGrid(1, 1)
                 self.grid_sql.SetColLabelValue(0, "Affected rows")
@@ -6079,31 +6378,42 @@ class DatabasePage(wx.Panel):
                 self.grid_sql.Size = size[0], size[1]-1
                 self.grid_sql.Size = size[0], size[1]
         except Exception as e:
+            if close(): # Cancelled by user
+                guibase.status("Cancelled SQL script (%s).", self.db, log=True)
+                return
             msg = util.format_exc(e)
             guibase.status(msg, log=True)
             wx.MessageBox(msg, conf.Title, wx.OK | wx.ICON_WARNING)
 
 
     def execute_sql(self, sql):
-        """Executes the SQL query and populates the SQL grid with results."""
+        """
+        Executes the SQL query and populates the SQL grid with results,
+        showing elapsed time and allowing to cancel if query runs long.
+        """
+        progress, close = self.make_sql_progress("SQL query", "Executing SQL query.")
         try:
             grid_data = None
             if sql.lower().startswith(("select", "pragma", "explain")):
                 # SELECT statement: populate grid with rows
-                grid_data = SqliteGridBase(self.db, sql=sql)
+                with self.db.sql_task(progress):
+                    grid_data = SqliteGridBase(self.db, sql=sql)
                 self.grid_sql.SetTable(grid_data, takeOwnership=True)
                 self.button_reset_grid_sql.Enabled = True
                 self.button_export_sql.Enabled = True
             else:
                 # Assume action query
-                affected_rows = self.db.execute_action(sql)
+                with self.db.sql_task(progress):
+                    affected_rows = self.db.execute_action(sql)
                 self.grid_sql.SetTable(None)
                 self.grid_sql.CreateGrid(1, 1)
                 self.grid_sql.SetColLabelValue(0, "Affected rows")
                 self.grid_sql.SetCellValue(0, 0, str(affected_rows))
                 self.button_reset_grid_sql.Enabled = False
                 self.button_export_sql.Enabled = False
-            guibase.status("Executed SQL \"%s\" (%s).", sql, self.db, log=True)
+            if close(): # Cancelled by user while retrieving rows: show rows retrieved
+                guibase.status("Cancelled SQL \"%s\" (%s).", sql, self.db, log=True)
+            else: guibase.status("Executed SQL \"%s\" (%s).", sql, self.db, log=True)
             size = self.grid_sql.Size
             self.grid_sql.Fit()
             # Jiggle size by 1 pixel to refresh scrollbars
@@ -6115,6 +6425,9 @@ class DatabasePage(wx.Panel):
                 col_range = range(grid_data.GetNumberCols())
                 [self.grid_sql.AutoSizeColLabelSize(x) for x in col_range]
         except Exception as e:
+            if close(): # Cancelled by user
+                guibase.status("Cancelled SQL \"%s\" (%s).", sql, self.db, log=True)
+                return
             msg = util.format_exc(e)
             guibase.status(msg, log=True)
             wx.MessageBox(msg, conf.Title, wx.OK | wx.ICON_WARNING)
@@ -6196,7 +6509,8 @@ class DatabasePage(wx.Panel):
             while item and item.IsOk():
                 table = self.tree_tables.GetItemPyData(item)
                 if table:
-                    self.tree_tables.SetItemText(item, "%d row%s" % (
+                    self.tree_tables.SetItemText(item, "%s%d row%s" % (
+                        "~" if tablemap[table].get("rows_estimated") else "",
                         tablemap[table]["rows"],
                         "s" if tablemap[table]["rows"] != 1 else " "
                     ), 1)
@@ -6205,6 +6519,8 @@ class DatabasePage(wx.Panel):
                         self.grid_table.Table.IsChanged())
                 item = self.tree_tables.GetNextSibling(item)
             self.grid_table.ForceRefresh()  # Refresh cell colours
+            if any(t.get("rows_estimated") for t in tablemap.values()):
+                self.worker_rowcount.work({"db": self.db})
 
 
     def on_rollback_table(self, event):
@@ -7112,7 +7428,8 @@ class DatabasePage(wx.Panel):
             child = None
             for table in tables:
                 child = self.tree_tables.AppendItem(root, table["name"])
-                self.tree_tables.SetItemText(child, "%d row%s" % (
+                self.tree_tables.SetItemText(child, "%s%d row%s" % (
+                    "~" if table.get("rows_estimated") else "",
                     table["rows"], "s" if table["rows"] != 1 else " "
                 ), 1)
                 self.tree_tables.SetItemPyData(child, table["name"])
@@ -7137,6 +7454,8 @@ class DatabasePage(wx.Panel):
                 coldata = self.db.get_table_columns(t["name"])
                 fields = [c["name"] for c in coldata]
                 self.stc_sql.AutoCompAddSubWords(t["name"], fields)
+            if any(t.get("rows_estimated") for t in tables):
+                self.worker_rowcount.work({"db": self.db})
         except Exception:
             if self:
                 logger.exception("Error loading table data from %s.", self.db)
@@ -8853,21 +9172,26 @@ class ChatContentSTC(controls.SearchableStyledTextCtrl):
             # starting from latest).
             if not self._messages[0]["datetime"] \
             or self._messages[0]["datetime"].date() >= self._filter["daterange"][0]:
-                mm, kws = [], dict(timestamp_from=self._messages[0]["timestamp"],
-                                   ascending=False, use_cache=False)
-                for m in self._db.get_messages(self._chat, **kws):
-                    mm.append(m)
-                    if m["datetime"].date() < self._filter["daterange"][0]:
-                        break # for m
+                mm, count = [], max(1, conf.MaxHistoryInitialMessages // 2)
+                key = (self._messages[0]["timestamp"], self._messages[0]["id"])
+                while key:
+                    page = self._db.get_messages_page(self._chat, key, count,
+                                                      columns=skypedata.MESSAGE_COLUMNS_CORE)
+                    key = (page[-1]["timestamp"], page[-1]["id"]) if len(page) == count else None
+                    for m in page:
+                        mm.append(m)
+                        if m["datetime"] and m["datetime"].date() < self._filter["daterange"][0]:
+                            key = None
+                            break # for m
                 self._messages[:0] = mm[::-1] # Insert ascending at front
         last_dt = self._chat.get("last_message_datetime")
         if self._messages and last_dt and self._messages[-1]["datetime"] < last_dt:
             # Last message timestamp is earlier than chat's last message
             # timestamp: new messages have arrived
-            self._messages.extend(self._db.get_messages(self._chat,
-                ascending=True, use_cache=False,
-                timestamp_from=self._messages[-1]["timestamp"]
-            ))
+            key = (self._messages[-1]["timestamp"], self._messages[-1]["id"])
+            mm = self._db.get_messages_page(self._chat, key, direction=1,
+                                            columns=skypedata.MESSAGE_COLUMNS_CORE)
+            self._messages.extend(mm)
 
 
     def RetrieveMoreMessages(self, count=None):
@@ -8880,22 +9204,19 @@ class ChatContentSTC(controls.SearchableStyledTextCtrl):
         if count is None: count = max(1, conf.MaxHistoryInitialMessages // 2)
         if not count: return
 
-        center_id, stamp_from = None, None
+        center_id, key = None, None
         if self._messages:
             if self._messages_current: center_id = self._messages_current[0]["id"]
-            stamp_from = self._messages[0]["timestamp"]
+            key = (self._messages[0]["timestamp"], self._messages[0]["id"])
         elif any(self._filter.get("daterange") or []):
-            stamp_from = util.datetime_to_epoch(self._filter["daterange"][0])
-        if stamp_from is None: return
+            key = (util.datetime_to_epoch(self._filter["daterange"][0]), None)
+        if key is None: return
 
-        mm, kws = [], dict(timestamp_from=stamp_from,
-                           ascending=False, use_cache=False)
         busy = controls.BusyPanel(self._page or self.Parent,
                                   "Retrieving more messages.")
         try:
-            for i, m in enumerate(self._db.get_messages(self._chat, **kws)):
-                mm.append(m)
-                if i + 1 >= count: break # for i, m
+            mm = self._db.get_messages_page(self._chat, key, count,
+                                            columns=skypedata.MESSAGE_COLUMNS_CORE)
             self._messages[:0] = mm[::-1] # Insert ascending at front
             self._center_message_id = self._center_message_index = None
             if self._messages:
@@ -9213,21 +9534,26 @@ class ChatContentSTC(controls.SearchableStyledTextCtrl):
         if chat is None:
             messages_current, message_range = [], []
         elif messages is None:
-            mm, center_message_i = [], None
-            for i, m in enumerate(db.get_messages(chat, ascending=False)):
-                mm.append(m)
-                if m["id"] == center_message_id:
-                    self._center_message_id = center_message_id
-                    center_message_i = i
-
-                if self._center_message_id is not None:
-                    if i + 1 - center_message_i >= conf.MaxHistoryInitialMessages // 2:
-                        break # for i, m
-                elif i + 1 >= conf.MaxHistoryInitialMessages: break # for i, m
+            center, cols = None, skypedata.MESSAGE_COLUMNS_CORE
+            if center_message_id is not None:
+                sql, params = "m.id = :id", {"id": center_message_id}
+                center = next(iter(db.get_messages_page(chat, additional_sql=sql,
+                                                        additional_params=params,
+                                                        columns=cols)), None)
+            if center:
+                # Take all messages after center, and half of maximum before and including it
+                key = (center["timestamp"], center["id"])
+                count = max(0, conf.MaxHistoryInitialMessages // 2 - 1)
+                newer = db.get_messages_page(chat, key, direction=1, columns=cols)
+                older = db.get_messages_page(chat, key, count, columns=cols) if count else []
+                mm = newer[::-1] + [center] + older # Descending
+                self._center_message_id = center_message_id
+                self._center_message_index = len(older)
+            else:
+                mm = db.get_messages_page(chat, count=max(1, conf.MaxHistoryInitialMessages),
+                                          columns=cols)
 
             messages_current, message_range = mm[::-1], mm[::-1] # Set ascending
-            if center_message_i is not None:
-                self._center_message_index = len(mm) - center_message_i-1
         else:
             messages_current, message_range = messages[from_index or 0:], messages[:]
 
@@ -8,12 +8,13 @@ Released under the MIT License.
 
 @author      Erki Suurjaak
 @created     16.02.2012
-@modified    26.04.2025
+@modified    16.10.2026
 ------------------------------------------------------------------------------
 """
 import base64
 import calendar
 import codecs
+import collections
 import ctypes
 import datetime
 try: import imghdr
@@ -68,6 +69,25 @@ def safe_filename(filename):
     return re.sub(r"\s+", " ", result)
 
 
+def estimate_size(value, sample=100):
+    """
+    Returns approximate memory size of value in bytes, counting nested
+    lists, tuples, sets and dict values, extrapolated from a sample of items.
+
+    @param   sample  number of items to measure in collections
+    """
+    result = sys.getsizeof(value)
+    if isinstance(value, dict): items = list(value.values())
+    elif isinstance(value, (list, tuple, set)): items = list(value)
+    else: return result
+    if items:
+        step = max(1, len(items) // sample)
+        sampled = items[::step]
+        total = sum(estimate_size(x, sample) for x in sampled)
+        result += int(total * len(items) / float(len(sampled)))
+    return result
+
+
 def format_bytes(size, precision=2, max_units=True):
     """
     Returns a formatted byte size (e.g. "421.45 MB" or "421,451,273 bytes").
@@ -781,3 +801,125 @@ def shortpath(path):
     buf = ctypes.create_unicode_buffer(4 * len(path))
     ctypes.windll.kernel32.GetShortPathNameW(path, buf, len(buf))
     return buf.value
+
+
+
+class LRUCache(object):
+    """
+    Size-bounded dictionary discarding least recently used items
+    when total estimated size exceeds limit. Thread-safe.
+    """
+
+    def __init__(self, limit, sizer=estimate_size, on_evict=None, name="cache"):
+        """
+        @param   limit     total size limit in bytes, no limit if None or negative
+        @param   sizer     function returning size of value in bytes
+        @param   on_evict  function(key, value) invoked for evicted items
+        @param   name      cache name for status texts
+        """
+        self.limit    = limit
+        self.sizer    = sizer
+        self.on_evict = on_evict
+        self.name     = name
+        self.size     = 0
+        self.hits = self.misses = self.evictions = 0
+        self._items = collections.OrderedDict() # {key: (value, size)}
+        self._lock  = threading.RLock()
+
+
+    def __len__(self):
+        return len(self._items)
+
+
+    def __contains__(self, key):
+        return key in self._items
+
+
+    def __iter__(self):
+        return iter(list(self._items))
+
+
+    def __getitem__(self, key):
+        with self._lock:
+            value, size = self._items.pop(key) # Raises KeyError if missing
+            self._items[key] = (value, size) # Move to end as most recent
+            return value
+
+
+    def __setitem__(self, key, value):
+        self.set(key, value)
+
+
+    def __delitem__(self, key):
+        with self._lock:
+            self.size -= self._items.pop(key)[1]
+
+
+    def get(self, key, default=None):
+        """Returns cached value and registers cache hit or miss."""
+        with self._lock:
+            if key in self._items:
+                self.hits += 1
+                return self[key]
+            self.misses += 1
+            return default
+
+
+    def set(self, key, value, size=None):
+        """
+        Caches value, evicting least recently used items if over limit.
+        The item just set is never evicted.
+
+        @param   size  value size in bytes, calculated with sizer if None
+        """
+        evicted = []
+        with self._lock:
+            if key in self._items: del self[key]
+            size = self.sizer(value) if size is None else size
+            self._items[key] = (value, size)
+            self.size += size
+            while self.limit is not None and 0 <= self.limit < self.size \
+            and len(self._items) > 1:
+                key0 = next(iter(self._items))
+                value0, size0 = self._items.pop(key0)
+                self.size -= size0
+                self.evictions += 1
+                evicted.append((key0, value0))
+        for key0, value0 in evicted:
+            if self.on_evict: self.on_evict(key0, value0)
+        return evicted
+
+
+    def pop(self, key, *default):
+        """Removes key from cache and returns its value, or default if given."""
+        with self._lock:
+            if key not in self._items and default: return default[0]
+            value, size = self._items.pop(key)
+            self.size -= size
+            return value
+
+
+    def clear(self):
+        """Empties cache, keeping counters."""
+        with self._lock:
+            self._items.clear()
+            self.size = 0
+
+
+    def keys(self):   return list(self._items)
+    def values(self): return [v for v, _ in self._items.values()]
+    def items(self):  return [(k, v) for k, (v, _) in self._items.items()]
+
+
+    def get_stats(self):
+        """Returns cache status as {"name", "items", "size", "limit", "hits", "misses", "evictions"}."""
+        return dict(name=self.name, items=len(self._items), size=self.size, limit=self.limit,
+                    hits=self.hits, misses=self.misses, evictions=self.evictions)
+
+
+    def format_stats(self):
+        """Returns cache status as readable text."""
+        return "%s: %s in %s of %s, %s hits, %s misses, %s evictions" % (
+            self.name, plural("item", len(self._items)), format_bytes(self.size),
+            format_bytes(self.limit) if self.limit is not None and self.limit >= 0 else "unlimited",
+            self.hits, self.misses, self.evictions)
@@ -8,7 +8,7 @@ Released under the MIT License.
 
 @author      Erki Suurjaak
 @created     08.07.2020
-@modified    10.05.2025
+@modified    16.10.2026
 ------------------------------------------------------------------------------
 """
 import collections
@@ -83,6 +83,7 @@ class SkypeLogin(object):
         self.query_stamps = [] # [datetime.datetime, ] for rate limiting
         self.msg_stamps   = {} # {remote_id: last timestamp__ms}
         self.msg_lookups  = collections.defaultdict(list) # {timestamp__ms: [{msg}, ]}
+        self.msg_remotes  = {} # {(convo_id, remote_id): {msg}} for detecting edited messages
         self.msg_parser   = None # skypedata.MessageParser instance
 
 
@@ -162,9 +163,10 @@ class SkypeLogin(object):
             for table in tables:
                 self.cache.pop(table, None)
                 if "messages" == table:
-                    self.msg_lookups.clear(), self.msg_stamps.clear()
+                    self.msg_lookups.clear(), self.msg_stamps.clear(), self.msg_remotes.clear()
         else:
-            for dct in (self.cache, self.msg_lookups, self.msg_stamps): dct.clear()
+            for dct in (self.cache, self.msg_lookups, self.msg_stamps, self.msg_remotes):
+                dct.clear()
 
         for table in "accounts", "chats", "contacts":
             if tables and table not in tables: continue # for table
@@ -172,13 +174,8 @@ class SkypeLogin(object):
             cols  = ", ".join(self.CACHE_COLS[table]) if table in self.CACHE_COLS else "*"
             dbtable = "conversations" if "chats" == table else table
             where = " WHERE %s IS NOT NULL" % key
-            for row in self.db.execute("SELECT %s FROM %s%s" % (cols, dbtable, where), log=False):
-                for k in BINARIES: # Convert binary fields back from Unicode
-                    if isinstance(row.get(k), six.text_type):
-                        try:
-                            row[k] = row[k].encode("latin1")
-                        except Exception:
-                            row[k] = row[k].encode("utf-8")
+            sql = "SELECT %s FROM %s%s" % (cols, dbtable, where)
+            for row in self.db.execute(sql, log=False, binary=BINARIES):
                 self.cache[table][row[key]] = row
         self.cache["contacts"].update(self.cache["accounts"]) # For name lookup
 
@@ -186,7 +183,7 @@ class SkypeLogin(object):
     def build_msg_cache(self, identity):
         """Fills in message cache for chat."""
         BINARIES = ("guid", )
-        for dct in (self.msg_lookups, self.msg_stamps, self.cache["messages"]):
+        for dct in (self.msg_lookups, self.msg_stamps, self.msg_remotes, self.cache["messages"]):
             dct.clear()
 
         chats = self.db.get_conversations(chatidentities=[identity], reload=True, log=False)
@@ -199,16 +196,14 @@ class SkypeLogin(object):
 
         table, key = "messages", "pk_id"
         cols  = ", ".join(self.CACHE_COLS[table]) if table in self.CACHE_COLS else "*"
-        for row in self.db.execute("SELECT %s FROM %s%s" % (cols, table, where), params, log=False):
-            for k in BINARIES: # Convert binary fields back from Unicode
-                if isinstance(row.get(k), six.text_type):
-                    try:
-                        row[k] = row[k].encode("latin1")
-                    except Exception:
-                        row[k] = row[k].encode("utf-8")
+        sql = "SELECT %s FROM %s%s" % (cols, table, where)
+        for row in self.db.execute(sql, params, log=False, binary=BINARIES):
             if row[key] is not None:  self.cache[table][row[key]] = row
             if row["timestamp__ms"] is not None:
                 self.msg_lookups[row["timestamp__ms"]].append(row)
+        for m in self.cache["messages"].values():
+            if m.get("remote_id") is not None:
+                self.msg_remotes.setdefault((m["convo_id"], m["remote_id"]), m)
         for m in self.cache["messages"].values():
             if m.get("remote_id") is not None and m.get("timestamp__ms") is not None:
                 val = max(m["timestamp__ms"], self.msg_stamps.get(m["remote_id"], -sys.maxsize))
@@ -305,9 +300,7 @@ class SkypeLogin(object):
         if "messages" == table and dbitem.get("remote_id") \
         and not isinstance(item, (skpy.SkypeCallMsg, skpy.SkypeMemberMsg, skpy.msg.SkypePropertyMsg)):
             # Look up message by remote_id instead, to detect edited messages
-            dbitem0 = next((v for v in self.cache[table].values()
-                            if v.get("remote_id") == dbitem["remote_id"]
-                            and v["convo_id"] == dbitem["convo_id"]), dbitem0)
+            dbitem0 = self.msg_remotes.get((dbitem["convo_id"], dbitem["remote_id"]), dbitem0)
 
         if "messages" == table and not dbitem0:
             # See if there is a message with same data in key fields
@@ -389,10 +382,15 @@ class SkypeLogin(object):
             self.msg_stamps[dbitem1["remote_id"]] = dbitem1["timestamp__ms"]
 
         if identity is not None:
-            cacheitem = dict(dbitem)
+            cacheitem, cacheitem0 = dict(dbitem), self.cache[table].get(identity)
             self.cache[table][identity] = cacheitem
             if "accounts" == table:
                 self.cache["contacts"][identity] = cacheitem # For name lookup
+            if "messages" == table and cacheitem.get("remote_id") is not None:
+                # Keep earliest cached message for remote_id, replacing it if updated
+                remotekey = (cacheitem["convo_id"], cacheitem["remote_id"])
+                if self.msg_remotes.get(remotekey, cacheitem0) is cacheitem0:
+                    self.msg_remotes[remotekey] = cacheitem
         if "messages" == table:
             self.msg_lookups[dbitem["timestamp__ms"]].append(cacheitem)
         if "chats" == table:
@@ -827,14 +825,15 @@ class SkypeLogin(object):
                     util.plural("contact profile", total, numbers=bool(contacts)))
         updateds = set()
         try:
-            for i, contact in enumerate(iterable):
-                if not i % 10 and not self.progress(
-                    action="info", message="Querying contacts..",
-                    **(dict(index=i + 1, count=total) if total > 1 else {})
-                ): break # for i, contact
-                dbitem, action = self.save("contacts", contact)
-                if action in (self.SAVE.INSERT, self.SAVE.UPDATE):
-                    updateds.add(dbitem["skypename"])
+            with self.db.bulk_write():
+                for i, contact in enumerate(iterable):
+                    if not i % 10 and not self.progress(
+                        action="info", message="Querying contacts..",
+                        **(dict(index=i + 1, count=total) if total > 1 else {})
+                    ): break # for i, contact
+                    dbitem, action = self.save("contacts", contact)
+                    if action in (self.SAVE.INSERT, self.SAVE.UPDATE):
+                        updateds.add(dbitem["skypename"])
         finally:
             self.progress(action="populate", table="contacts", end=True,
                           count=self.sync_counts["contacts_updated"],
@@ -893,6 +892,7 @@ class SkypeLogin(object):
                 sql += "(body_xml LIKE '<URIObject%' OR body_xml LIKE '<files>%') "
                 sql += "ORDER BY id DESC "
                 cursor = self.db.execute(sql)
+                self.db.prefetch_shared_files(chat)
                 first_ts, last_ts = sys.maxsize, 0
                 chat_messages_processed = 0
 
@@ -912,8 +912,8 @@ class SkypeLogin(object):
 
             messages_processed += 1
             chat_messages_processed += 1
-            localpath = self.db.get_shared_file_path(m["id"])
-            if localpath and os.path.exists(localpath): continue # while run
+            localpath = self.db.get_shared_file_path(m["id"], m["convo_id"])
+            if self.db.shared_file_exists(localpath): continue # while run
             metadata, content = self.msg_parser.make_message_share_data(body=m["body_xml"]), None
             if metadata:
                 content = self.download_content(metadata["url"], metadata.get("category") or "file")
@@ -981,7 +981,9 @@ class SkypeLogin(object):
                     break # while run
 
             for chat in mychats:
-                if not self.process_chat(chat, messages, processeds, updateds, completeds, msgids):
+                with self.db.bulk_write(): # Commit once per chat
+                    ok = self.process_chat(chat, messages, processeds, updateds, completeds, msgids)
+                if not ok:
                     run = False
                     break # for chat
 
@@ -1006,7 +1008,7 @@ class SkypeLogin(object):
             contact_count_new=self.sync_counts["contacts_new"],
             contact_count_updated=self.sync_counts["contacts_updated"], **pargs
         )
-        for dct in (self.cache, self.msg_lookups, self.msg_stamps): dct.clear()
+        for dct in (self.cache, self.msg_lookups, self.msg_stamps, self.msg_remotes): dct.clear()
         logger.info("Finished syncing %s'%s'.", cstr, self.db)
 
 
@@ -1102,6 +1104,7 @@ class SkypeLogin(object):
                             "last_activity_timestamp = :last, "
                             "creation_timestamp = COALESCE(creation_timestamp, :first) "
                             "WHERE id = :convo_id", row)
+            self.db.update_message_stats([row["convo_id"]])
             chats_completed.add(cidentity)
 
         pargs = dict(action="populate", table="chats", chat=cidentity)
@@ -1283,7 +1286,8 @@ class SkypeExport(skypedata.SkypeDatabase):
         except Exception: raise
         else:
             self.tarfp = tf
-            self.export_parse(f, progress)
+            with self.bulk_write():
+                self.export_parse(f, progress)
         finally:
             util.try_ignore(f and f.close)
             util.try_ignore(tf and tf.close)
@@ -9,7 +9,7 @@ Released under the MIT License.
 
 @author      Erki Suurjaak
 @created     26.11.2011
-@modified    25.04.2025
+@modified    16.10.2026
 ------------------------------------------------------------------------------
 """
 from __future__ import print_function
@@ -25,6 +25,7 @@ import locale
 import logging
 import io
 import itertools
+import multiprocessing
 import os
 import re
 import shutil
@@ -122,6 +123,10 @@ ARGUMENTS = {
              {"args": ["--store-password"], "dest": "store_password",
               "action": "store_true", "required": False,
               "help": "store entered password in configuration"},
+             {"args": ["-j", "--jobs"], "dest": "jobs", "type": int, "metavar": "N",
+              "default": 1, "required": False,
+              "help": "number of parallel processes for exporting chats\n"
+                      "to separate files (default 1)"},
              {"args": ["--verbose"], "action": "store_true",
               "help": "print detailed progress messages to stderr"},
              {"args": ["--no-terminal"], "action": "store_true", "dest": "no_terminal",
@@ -283,6 +288,10 @@ ARGUMENTS = {
                       "(supports * wildcards)"},
              {"args": ["-o", "--output"], "dest": "output", "required": False,
               "help": "Final database filename, auto-generated by default"},
+             {"args": ["-j", "--jobs"], "dest": "jobs", "type": int, "metavar": "N",
+              "default": 1, "required": False,
+              "help": "number of parallel processes for comparing chats\n"
+                      "(default 1)"},
              {"args": ["--verbose"], "action": "store_true",
               "help": "print detailed progress messages to stderr"},
              {"args": ["--no-terminal"], "action": "store_true", "dest": "no_terminal",
@@ -297,6 +306,28 @@ ARGUMENTS = {
          "arguments": [
              {"args": ["FILE1"], "help": "first Skype database", "nargs": 1},
              {"args": ["FILE2"], "help": "second Skype databases", "nargs": 1},
+             {"args": ["-j", "--jobs"], "dest": "jobs", "type": int, "metavar": "N",
+              "default": 1, "required": False,
+              "help": "number of parallel processes for comparing chats\n"
+                      "(default 1)"},
+             {"args": ["--verbose"], "action": "store_true",
+              "help": "print detailed progress messages to stderr"},
+             {"args": ["--no-terminal"], "action": "store_true", "dest": "no_terminal",
+              "help": "command-line output suitable for non-terminal display, "
+                      "like piping to a file"},
+             {"args": ["--config-file"], "dest": "config_file", "nargs": 1,
+              "help": "path of configuration file to use"},
+        ]},
+        {"name": "optimize",
+         "help": "add indexes for faster queries to Skype databases",
+         "description": "Add Skyperious indexes for common queries to Skype "
+                        "databases and analyze them, reporting query timings "
+                        "before and after; or drop added indexes.",
+         "arguments": [
+             {"args": ["FILE"], "nargs": "+",
+              "help": "Skype databases to optimize (supports * wildcards)"},
+             {"args": ["--drop"], "action": "store_true", "required": False,
+              "help": "drop indexes added by earlier optimization"},
              {"args": ["--verbose"], "action": "store_true",
               "help": "print detailed progress messages to stderr"},
              {"args": ["--no-terminal"], "action": "store_true", "dest": "no_terminal",
@@ -402,10 +433,14 @@ def run_merge(filenames, args):
     """
     Merges all Skype databases to a new database.
 
+    Chats and messages of the new database are indexed once and kept updated
+    over all merged databases, instead of re-reading them for each.
+
     @param   args       argparse.Namespace
                output   name of output database, auto-generated if not given
+               jobs     number of parallel processes for comparing chats
     """
-    dbs = [skypedata.SkypeDatabase(f) for f in filenames]
+    dbs = [skypedata.SkypeDatabase(f, readonly=True) for f in filenames] # Sources left untouched
     db_base = dbs.pop()
     counts = collections.defaultdict(lambda: collections.defaultdict(int))
     postbacks = queue.Queue()
@@ -419,7 +454,9 @@ def run_merge(filenames, args):
     shutil.copyfile(db_base.filename, output_filename)
     db2 = skypedata.SkypeDatabase(output_filename)
 
-    args = {"db2": db2, "type": "diff_merge_left"}
+    db2.get_conversations_stats(db2.get_conversations())
+    target = {} # N-way merge index of db2, populated and updated in worker
+    args = {"db2": db2, "type": "diff_merge_left", "jobs": args.jobs, "target": target}
     worker = workers.MergeThread(postbacks.put)
     bar.stop()
     try:
@@ -432,7 +469,6 @@ def run_merge(filenames, args):
             bar.start()
             chats = db1.get_conversations()
             db1.get_conversations_stats(chats)
-            db2.get_conversations_stats(db2.get_conversations(reload=True))
             worker.work(dict(args, db1=db1, chats=chats))
             while True:
                 result = postbacks.get()
@@ -486,7 +522,7 @@ def run_search(filenames, args):
     """
     TABLES = {"message": "messages", "contact": "contacts", "chat": "conversations",
               "table": "all tables"}
-    dbs = [skypedata.SkypeDatabase(f) for f in filenames]
+    dbs = [skypedata.SkypeDatabase(f, readonly=True) for f in filenames]
     postbacks = queue.Queue()
     wargs = {"text": args.query, "reverse": args.reverse, "offset": args.offset,
              "limit": args.limit, "table": TABLES.get(args.category, args.category),
@@ -808,20 +844,24 @@ def run_export(filenames, args):
                password         Skype password
                ask_password     whether to ask password on the command line interactively
                store_password   whether to store password in configuration file
+               jobs             number of parallel processes for exporting chats
     """
-    dbs = [skypedata.SkypeDatabase(f) for f in filenames]
     is_xlsx_single, format = ("xlsx_single" == args.format), args.format
     if is_xlsx_single: format = "xlsx"
+    # Read-only unless logging in to download media, which is stored in database
+    loginopts = {"password": args.password or args.ask_password, "files_folder": args.files_folder}
+    is_login = lambda f: export.is_media_login(os.path.realpath(f), format, loginopts)
+    dbs = [skypedata.SkypeDatabase(f, readonly=not is_login(f)) for f in filenames]
     timerange = [util.datetime_to_epoch(x) for x in (args.start_date, args.end_date)]
     output_dir = args.output_dir or os.getcwd()
 
     for db in dbs:
 
+        password = None
         if (args.password or args.ask_password) and db.username \
         and (conf.SharedImageAutoDownload or conf.SharedAudioVideoAutoDownload
              or conf.SharedFileAutoDownload and args.files_folder) \
         and "html" == format:
-            password = None
             while not db.live.is_logged_in():
                 password = args.password or get_password(db.username)
                 try: db.live.login(password=password)
@@ -867,6 +907,8 @@ def run_export(filenames, args):
                         timerange=timerange)
             if not is_xlsx_single: opts["multi"] = True
             if args.files_folder: opts["files_folder"] = True
+            if args.jobs > 1: opts["jobs"] = args.jobs
+            if password: opts["password"] = password
             result = export.export_chats(chats, path, format, db, opts)
             files, count, message_count = result
             bar.stop()
@@ -904,7 +946,7 @@ def run_contacts(filenames, args):
                                else skypedata.ACCOUNT_FIELD_TITLES
 
     for filename in filenames:
-        try: db = skypedata.SkypeDatabase(filename)
+        try: db = skypedata.SkypeDatabase(filename, readonly=True)
         except Exception as e:
             logger.exception("Error opening %s.", filename)
             output("Error opening %s: %s" % (filename, e))
@@ -976,12 +1018,16 @@ def run_contacts(filenames, args):
                   (e, traceback.format_exc()))
 
 
-def run_diff(filename1, filename2):
-    """Compares the first database for changes with the second."""
+def run_diff(filename1, filename2, jobs=1):
+    """
+    Compares the first database for changes with the second.
+
+    @param   jobs  number of parallel processes for comparing chats
+    """
     if os.path.realpath(filename1) == os.path.realpath(filename2):
         output("Error: cannot compare %s with itself." % filename1)
         return
-    db1, db2 = map(skypedata.SkypeDatabase, [filename1, filename2])
+    db1, db2 = (skypedata.SkypeDatabase(x, readonly=True) for x in (filename1, filename2))
     counts = collections.defaultdict(lambda: collections.defaultdict(int))
     postbacks = queue.Queue()
 
@@ -995,7 +1041,7 @@ def run_diff(filename1, filename2):
     chats1, chats2 = db1.get_conversations(), db2.get_conversations()
     db1.get_conversations_stats(chats1), db2.get_conversations_stats(chats2)
 
-    args = {"db1": db1, "db2": db2, "chats": chats1, "type": "diff_left"}
+    args = {"db1": db1, "db2": db2, "chats": chats1, "type": "diff_left", "jobs": jobs}
     worker = workers.MergeThread(postbacks.put)
     if conf.IsCLINonTerminal: output()
     try:
@@ -1042,6 +1088,50 @@ def run_diff(filename1, filename2):
     output()
 
 
+def run_optimize(filenames, args):
+    """
+    Adds indexes for common queries to the specified databases,
+    printing query timings before and after, or drops added indexes.
+
+    @param   args       argparse.Namespace
+               drop     drop indexes added by earlier optimization
+    """
+    for filename in filenames:
+        try: db = skypedata.SkypeDatabase(filename)
+        except Exception as e:
+            logger.exception("Error opening %s.", filename)
+            output("Error opening %s: %s" % (filename, e))
+            continue # for filename
+
+        try:
+            if args.drop:
+                names = db.drop_optimize_indexes()
+                output("Dropped %s from %s." % (util.plural("index", names, sep=","), db)
+                       if names else "No optimization indexes in %s." % db)
+                continue # for filename
+
+            bar = ProgressBar(afterword=" Optimizing %s.." % db, interval=0.05,
+                              pulse=True, static=conf.IsCLINonTerminal)
+            bar.start()
+            try: result = db.optimize()
+            finally: bar.stop()
+            output()
+            if result["indexes"]:
+                output("Created %s in %s: %s." % (util.plural("index", result["indexes"], sep=","),
+                                                  db, ", ".join(result["indexes"])))
+            else: output("All optimization indexes already present in %s." % db)
+            if result["timings"]:
+                TITLE_MAX = max(len(x[0]) for x in result["timings"])
+                output("\n%s  %10s  %10s" % ("Query".ljust(TITLE_MAX), "Before", "After"))
+                for title, time1, time2 in result["timings"]:
+                    output("%s  %9.3fs  %9.3fs" % (title.ljust(TITLE_MAX), time1, time2))
+        except Exception as e:
+            logger.exception("Error optimizing %s.", db)
+            output("Error optimizing %s: %s" % (db, e))
+        finally:
+            db.close()
+
+
 def run_gui(filenames):
     """Main GUI program entrance."""
     global logger, window
@@ -1075,6 +1165,7 @@ def run(nogui=False):
     global is_gui_possible, logger
 
     warnings.simplefilter("ignore", UnicodeWarning)
+    multiprocessing.freeze_support() # Required for worker processes in frozen binary
 
     if (conf.Frozen # Binary application
     or sys.executable.lower().endswith("pythonw.exe")):
@@ -1167,7 +1258,7 @@ def run(nogui=False):
     if "create" == arguments.command:
         run_create(arguments.FILE, arguments)
     elif "diff" == arguments.command:
-        run_diff(*arguments.FILE)
+        run_diff(*arguments.FILE, jobs=arguments.jobs)
     elif "merge" == arguments.command:
         if len(arguments.FILE) < 2:
             output("%s%s merge: error: too few FILE arguments" % (
@@ -1183,6 +1274,8 @@ def run(nogui=False):
         run_search(arguments.FILE, arguments)
     elif "sync" == arguments.command:
         run_sync(arguments.FILE, arguments)
+    elif "optimize" == arguments.command:
+        run_optimize(arguments.FILE, arguments)
     elif "gui" == arguments.command:
         try: run_gui(arguments.FILE)
         except Exception: traceback.print_exc()
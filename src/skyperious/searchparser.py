@@ -14,6 +14,8 @@ Parses a simple search grammar into SQL for querying a Skype database.
   all groups and OR-expressions.
 - "-" immediately before: exclude words, phrases, grouped words and keywords
 - can also provide queries to search all fields in any table
+- can use a full-text search index for message bodies if available,
+  matching words from the start, falling back to LIKE for infix wildcards
 
 If pyparsing is unavailable, falls back to naive split into words and keywords.
 
@@ -23,7 +25,7 @@ Released under the MIT License.
 
 @author      Erki Suurjaak
 @created     13.07.2013
-@modified    02.10.2022
+@modified    16.10.2026
 """
 import calendar
 import collections
@@ -104,7 +106,7 @@ class SearchQueryParser(object):
             self._grammar = grammar
 
 
-    def Parse(self, query, table=None):
+    def Parse(self, query, table=None, fts=None):
         """
         Parses the query string and returns (sql, sql params, words).
 
@@ -112,6 +114,8 @@ class SearchQueryParser(object):
                         specific table, ignoring all Skype-specific keywords,
                         only taking into account the table: keyword
                         {"name": "Table name": "columns[{"name", "pk_id", }, ]}
+        @param   fts    name of FTS5 full-text index table over message bodies
+                        to use instead of LIKE, rowid as message ID, if any
         @return         (SQL string, SQL parameter dict, word and phrase list)
         """
         words = [] # All encountered text words and quoted phrases
@@ -136,7 +140,7 @@ class SearchQueryParser(object):
                 parse_results = split_words
 
         result = self._makeSQL(parse_results, words, keywords, sql_params,
-                              table=table)
+                              table=table, fts=None if table else fts)
         if table:
             skip_table = False
             for kw, values in keywords.items():
@@ -163,14 +167,22 @@ class SearchQueryParser(object):
 
 
     def _makeSQL(self, item, words, keywords, sql_params,
-                table=None, parent_name=None):
+                table=None, parent_name=None, fts=None):
         """
         Returns the ParseResults item as an SQL string, appending
         words and phrases to words list, and keyword and sql parameter values
         to argument dictionaries.
         """
         result = ""
-        if isinstance(item, six.string_types):
+        match = fts and isinstance(item, six.string_types) \
+                and self._makeMatch(item, "QUOTES" == parent_name)
+        if isinstance(item, six.string_types) and match:
+            words.append(item)
+            i = len(sql_params)
+            result = "m.id IN (SELECT rowid FROM %s WHERE %s MATCH :body_fts%s)" % \
+                     (fts, fts, i)
+            sql_params["body_fts%s" % i] = match
+        elif isinstance(item, six.string_types):
             words.append(item)
             safe = self._escape(item, ("*" if "QUOTES" != parent_name else ""))
             if not table:
@@ -207,7 +219,7 @@ class SearchQueryParser(object):
                 words_ptr = [] if negation else words # No words from negations
                 for i in elements:
                     sql = self._makeSQL(i, words_ptr, keywords, sql_params,
-                                       table, name)
+                                       table, name, fts)
                     parsed_elements.append(sql)
                 or_names = ["OR_OPERAND", "OR_EXPRESSION"]
                 glue = " OR " if name in or_names else " AND "
@@ -300,6 +312,21 @@ class SearchQueryParser(object):
         return result
 
 
+    def _makeMatch(self, item, phrase=False):
+        """
+        Returns the word or phrase as an FTS5 MATCH expression, or None
+        if not expressible in FTS5 syntax, e.g. having a wildcard not at end.
+
+        @param   phrase  whether item is a quoted phrase, matched in full
+        """
+        text = item.rstrip("*") if not phrase else item
+        if "*" in text or not re.search(r"\w", text, re.U):
+            return None
+        result = '"%s"' % text.replace('"', '""')
+        if not phrase: result += "*" # Match word start, like LIKE matches substrings
+        return result
+
+
     def _flatten(self, items):
         """
         Flattens the list to a single level, if possible,
@@ -364,14 +391,14 @@ if "__main__" == __name__:
     loglines = [] # Cached trace lines
     def makeSQLLogger(func):
         level = [0] # List as workaround: enclosing scope cannot be reassigned
-        def inner(item, words, keywords, sql_params, table=None, parent_name=None):
+        def inner(item, words, keywords, sql_params, table=None, parent_name=None, fts=None):
             txt = "%s_makeSQL(<%s> %s, parent_name=%s)" % \
                   ("  " * level[0], item.__class__.__name__, item, parent_name)
             if hasattr(item, "getName"):
                 txt += ", name=%s" % item.getName()
             loglines.append(txt)
             level[0] += 1
-            result = func(item, words, keywords, sql_params, table, parent_name)
+            result = func(item, words, keywords, sql_params, table, parent_name, fts)
             level[0] -= 1
             loglines.append("%s = %s." % (txt, result))
             return result
@@ -8,22 +8,28 @@ Released under the MIT License.
 
 @author      Erki Suurjaak
 @created     26.11.2011
-@modified    10.05.2025
+@modified    16.10.2026
 ------------------------------------------------------------------------------
 """
 import collections
+import contextlib
 import copy
 import datetime
+import functools
+import hashlib
 import io
+import itertools
 import json
 import logging
 import math
+import operator
 import os
 import re
 import sqlite3
 import shutil
 import sys
 import textwrap
+import threading
 import time
 import warnings
 from xml.etree import cElementTree as ElementTree
@@ -135,6 +141,12 @@ ID_PREFIX_GROUP   = "19:" # Conversations.identity prefix for group chats
 ID_PREFIX_BOT     = "28:" # Conversations.identity and Contacts.skypename for bots
 ID_PREFIX_SPECIAL = "48:" # Conversations.identity prefix for special chats like calllogs
 AUTHORS_SPECIAL = ["sys"] # Used by Skype for system messages
+MESSAGE_COLUMNS_CORE = [ # Messages columns used in parsing, displaying and exporting messages
+    "id", "convo_id", "chatname", "author", "from_dispname", "dialog_partner", "guid", "pk_id",
+    "remote_id", "timestamp", "timestamp__ms", "type", "chatmsg_type", "identities", "body_xml",
+    "edited_by", "edited_timestamp",
+]
+BLOB_TYPES = frozenset((six.binary_type, memoryview) + ((buffer, ) if sys.version_info < (3, ) else ())) # sqlite3 BLOB value types
 
 logger = logging.getLogger(__name__)
 
@@ -142,6 +154,9 @@ logger = logging.getLogger(__name__)
 class SkypeDatabase(object):
     """Access to a Skype database file."""
 
+    """Counter for unique temporary table names, thread-safe under GIL."""
+    TEMP_COUNTER = itertools.count(1)
+
     """SQL CREATE statements for Skype tables."""
     CREATE_STATEMENTS = {
         "accounts":            "CREATE TABLE Accounts (id INTEGER NOT NULL PRIMARY KEY, is_permanent INTEGER, status INTEGER, pwdchangestatus INTEGER, logoutreason INTEGER, commitstatus INTEGER, suggested_skypename TEXT, skypeout_balance_currency TEXT, skypeout_balance INTEGER, skypeout_precision INTEGER, skypein_numbers TEXT, subscriptions TEXT, cblsyncstatus INTEGER, contactssyncstatus INTEGER, offline_callforward TEXT, chat_policy INTEGER, skype_call_policy INTEGER, pstn_call_policy INTEGER, avatar_policy INTEGER, buddycount_policy INTEGER, timezone_policy INTEGER, webpresence_policy INTEGER, phonenumbers_policy INTEGER, voicemail_policy INTEGER, authrequest_policy INTEGER, ad_policy INTEGER, partner_optedout TEXT, service_provider_info TEXT, registration_timestamp INTEGER, nr_of_other_instances INTEGER, partner_channel_status TEXT, flamingo_xmpp_status INTEGER, federated_presence_policy INTEGER, liveid_membername TEXT, roaming_history_enabled INTEGER, cobrand_id INTEGER, shortcircuit_sync INTEGER, signin_name TEXT, read_receipt_optout INTEGER, hidden_expression_tabs TEXT, owner_under_legal_age INTEGER, type INTEGER, skypename TEXT, pstnnumber TEXT, fullname TEXT, birthday INTEGER, gender INTEGER, languages TEXT, country TEXT, province TEXT, city TEXT, phone_home TEXT, phone_office TEXT, phone_mobile TEXT, emails TEXT, homepage TEXT, about TEXT, profile_timestamp INTEGER, received_authrequest TEXT, displayname TEXT, refreshing INTEGER, given_authlevel INTEGER, aliases TEXT, authreq_timestamp INTEGER, mood_text TEXT, timezone INTEGER, nrof_authed_buddies INTEGER, ipcountry TEXT, given_displayname TEXT, availability INTEGER, lastonline_timestamp INTEGER, capabilities BLOB, avatar_image BLOB, assigned_speeddial TEXT, lastused_timestamp INTEGER, authrequest_count INTEGER, assigned_comment TEXT, alertstring TEXT, avatar_timestamp INTEGER, mood_timestamp INTEGER, rich_mood_text TEXT, synced_email BLOB, set_availability INTEGER, options_change_future BLOB, msa_pmn TEXT, authorized_time INTEGER, sent_authrequest TEXT, sent_authrequest_time INTEGER, sent_authrequest_serial INTEGER, buddyblob BLOB, cbl_future BLOB, node_capabilities INTEGER, node_capabilities_and INTEGER, revoked_auth INTEGER, added_in_shared_group INTEGER, in_shared_group INTEGER, authreq_history BLOB, profile_attachments BLOB, stack_version INTEGER, offline_authreq_id INTEGER, verified_email BLOB, verified_company BLOB, uses_jcs INTEGER, forward_starttime INTEGER)",
@@ -192,21 +207,86 @@ class SkypeDatabase(object):
                               )""",
     }
 
-
-    def __init__(self, filename, log_error=True, truncate=False):
+    """Messages fields hashed for detecting changed content in merge fingerprints."""
+    FINGERPRINT_FIELDS = ["type", "chatmsg_type", "author", "body_xml", "identities",
+                          "timestamp", "edited_timestamp", "guid"]
+
+    """SQL CREATE statement for message fingerprints table in conf.FingerprintsFile."""
+    FINGERPRINTS_CREATE_STATEMENT = """
+        CREATE TABLE IF NOT EXISTS fingerprints (
+          file      TEXT NOT NULL,    -- Real path of Skype database file
+          msg_id    INTEGER NOT NULL, -- Messages.id
+          convo_id  INTEGER NOT NULL, -- Messages.convo_id
+          body_hash INTEGER NOT NULL, -- Hash of Messages fields parsed for content
+          text_hash INTEGER NOT NULL, -- Hash of message text parsed for merge
+          day       INTEGER NOT NULL, -- Messages.timestamp in days since UNIX epoch
+          author    TEXT,             -- Messages.author
+          PRIMARY KEY (file, msg_id)
+        )"""
+
+    """SQL CREATE statement for Skyperious table of message statistics per chat."""
+    STATS_CREATE_STATEMENT = """
+        CREATE TABLE _stats_ (
+          convo_id                INTEGER PRIMARY KEY NOT NULL, -- Conversations.id
+          message_count           INTEGER NOT NULL DEFAULT 0,
+          first_message_timestamp INTEGER, -- MIN(Messages.timestamp)
+          last_message_timestamp  INTEGER  -- MAX(Messages.timestamp)
+        )"""
+
+    """Name of Skyperious optional full-text search index table, rowid as Messages.id."""
+    SEARCH_INDEX_TABLE = "_messages_fts_"
+
+    """SQL CREATE statement for Skyperious optional full-text search index."""
+    SEARCH_INDEX_CREATE_STATEMENT = "CREATE VIRTUAL TABLE _messages_fts_ " \
+                                    "USING fts5(body, tokenize = 'unicode61')"
+
+    """Name of progress table in data recovery target, for resuming interrupted recovery."""
+    RECOVERY_STATE_TABLE = "_recovery_"
+
+    """Number of rowids to copy at a time in data recovery, failing ranges bisected further."""
+    RECOVERY_CHUNK = 10000
+
+    """Seconds allowed from writing message statistics until database file modification."""
+    STATS_MTIME_TOLERANCE = 2
+
+    """Skyperious optional indexes for common queries, as [(name, table, columns)]."""
+    OPTIMIZE_INDEXES = [
+        ("_messages_page_",        "messages",       "convo_id, timestamp, id"),
+        ("_messages_stats_",       "messages",       "convo_id, type, timestamp"),
+        ("_messages_authors_",     "messages",       "convo_id, author, type, timestamp"),
+        ("_transfers_guid_",       "transfers",      "chatmsg_guid, chatmsg_index"),
+        ("_smses_msg_",            "smses",          "chatmsg_id"),
+        ("_shared_files_msg_",     "_shared_files_", "msg_id"),
+        ("_shared_files_convo_",   "_shared_files_", "convo_id"),
+    ]
+
+
+    def __init__(self, filename, log_error=True, truncate=False, readonly=False):
         """
         Initializes a new Skype database object from the file.
 
         @param   log_error  if False, exceptions on opening the database
                             are not written to log (written by default)
         @param   truncate   create or overwrite file before opening
+        @param   readonly   open database in read-only mode, with connection
+                            tuned for reading and Skyperious tables not created,
+                            else using conf.DatabasePragmaProfile
         """
         global live
         self.filename = os.path.realpath(filename)
+        self.readonly = readonly and not truncate
         self.basefilename = os.path.basename(self.filename)
         self.filesize = None
         self.last_modified = None
         self.backup_created = False
+        self.backup_session = None # Background backup state, {"thread", "copied", "total", ..}
+        self.backup_lock = threading.Lock()
+        self.backup_progress = None # Callback for backup progress, as in start_backup()
+        self.backup_wait = None # Callback(backup session) waiting for running backup, returning
+                                # False if cancelled; defaults to joining backup thread
+        self.bulk_session = None # Active bulk write session state, {"depth", "rows", "size", ..}
+        self.sql_tasks = {} # Running cancellable SQL tasks, {thread ident: {"cancel", "start", ..}}
+        self.sql_lock = threading.Lock()
         self.consumers = set() # Registered objects using this database
         self.account = None    # Row from table Accounts
         self.id = None   # Accounts.skypename
@@ -215,15 +295,35 @@ class SkypeDatabase(object):
         self.tables_list = None # Ordered list of table items
         self.table_rows = {}    # {"tablename1": [..], }
         self.table_objects = {} # {"tablename1": {id1: {rowdata1}, }, }
+        self.table_indexes = {} # {"tablename1": {keyvalue1: [{rowdata1}, ], }, }
+        self.table_cache = util.LRUCache(conf.CacheTablesSizeLimit, on_evict=self.on_cache_evict,
+                                         name="tables cache") # {"tablename1": [{rowdata1}, ], }
+        self.shared_files_chats = set() # IDs of chats with all shared file rows in table_objects
+        self.share_listing = None # (share directory, set(normcased filenames)) as of last prefetch
+        self.pragma_profile = None # Name of applied profile from conf.DatabasePragmaProfiles
+        self.stats_rows = None # In-memory message statistics, {convo_id: {"message_count", ..}}
+        self.stats_state = None # (PRAGMA data_version, MAX(messages.id)) as of stats_rows
+        self.stats_dirty = set() # IDs of chats with messages changed since stats_rows,
+                                 # None if all chats need recount
+        self.stats_unsaved = None # IDs of chats in stats_rows not yet saved to _stats_,
+                                  # None if all
+        self.row_plans = threading.local() # .plan: (cursor description, column names, BLOB column indexes, getter for other columns)
         try:
             if truncate and os.path.exists(self.filename):
                 logger.info("Overwriting existing file %s.", self.filename)
             if truncate: util.create_file(self.filename)
             self.update_fileinfo()
-            self.connection = sqlite3.connect(self.filename,
-                                              check_same_thread=False)
+            if self.readonly and sys.version_info >= (3, 4):
+                # URI mode=ro takes no write locks, leaving database free for Skype client
+                uri = "file:%s?mode=ro" % urllib.request.pathname2url(self.filename)
+                self.connection = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            else:
+                self.connection = sqlite3.connect(self.filename,
+                                                  check_same_thread=False)
             self.connection.row_factory = self.row_factory
-            self.connection.text_factory = six.binary_type
+            self.connection.text_factory = decode_text
+            self.apply_pragma_profile(conf.DatabasePragmaProfileReadOnly if self.readonly
+                                      else conf.DatabasePragmaProfile)
             rows = self.execute("SELECT name, sql FROM sqlite_master "
                                 "WHERE type = 'table'").fetchall()
             for row in rows:
@@ -259,63 +359,198 @@ class SkypeDatabase(object):
         return "CASE %s ELSE '#' || %s.id END" % (result.strip(), alias or table)
 
 
-    def check_integrity(self):
-        """Checks SQLite database integrity, returning a list of errors."""
-        result = []
-        rows = self.execute("PRAGMA integrity_check").fetchall()
-        if len(rows) != 1 or "ok" != rows[0]["integrity_check"].lower():
-            result = [r["integrity_check"] for r in rows]
+    def check_integrity(self, quick=False, progress=None):
+        """
+        Checks SQLite database integrity, returning a list of errors.
+
+        @param   quick     run PRAGMA quick_check instead of integrity_check,
+                           skipping the slow verification of index contents
+        @param   progress  callback(elapsed=seconds) invoked periodically,
+                           returning false to cancel, see start_sql_task()
+        """
+        result, pragma = [], "quick_check" if quick else "integrity_check"
+        with self.sql_task(progress):
+            rows = self.execute("PRAGMA %s" % pragma).fetchall()
+        if len(rows) != 1 or "ok" != rows[0][pragma].lower():
+            result = [r[pragma] for r in rows]
         return result
 
 
-    def recover_data(self, filename):
+    def recover_data(self, filename, progress=None, resume=False):
         """
         Recovers as much data from this database to a new database as possible.
 
-        @return  a list of encountered errors, if any
+        Copies tables in rowid ranges, bisecting failing ranges down to single
+        rows, so that only unreadable rows are lost. Commits after every range,
+        creates indexes after all data is copied.
+
+        @param   progress  callback(table=, index=, count=, rows=, rate=) to report
+                           progress with: table name, table number and total tables,
+                           total rows copied and rows per second; returning false
+                           if recovery should cancel
+        @param   resume    continue interrupted recovery in existing file, if possible
+        @return            a list of encountered errors, if any
         """
-        result = []
-        with open(filename, "w"): pass # Truncate file
+        result, STATE = [], self.RECOVERY_STATE_TABLE
+        if not (resume and self.is_recovery_resumable(filename)):
+            with open(filename, "w"): pass # Truncate file
+        tables = [x for x in self.tables_list or [] if x.get("sql")
+                  and not x["name"].lower().startswith("sqlite_") # Internal use
+                  and not x["name"].lower().startswith(self.SEARCH_INDEX_TABLE)] # Rebuildable
+        self.connection.commit() # ATTACH is not possible within a transaction
         self.execute("ATTACH DATABASE ? AS new", (filename, ))
-        # Create structure for all tables
-        for t in (x for x in self.tables_list or [] if x.get("sql")):
-            if t["name"].lower().startswith("sqlite_"): continue # Internal use
-            sql  = t["sql"].replace("CREATE TABLE ", "CREATE TABLE new.")
-            self.execute(sql)
-        # Copy data from all tables
-        for t in (x for x in self.tables_list or [] if x.get("sql")):
-            if t["name"].lower().startswith("sqlite_"): continue # Internal use
-            sql = "INSERT INTO new.%(name)s SELECT * FROM main.%(name)s" % t
-            try:
-                self.execute(sql)
-            except Exception as e:
-                result.append(repr(e))
-                logger.exception("Error copying table %s from %s to %s.",
-                                 t["name"], self.filename, filename)
-        # Create indexes
-        indexes = []
         try:
-            sql = "SELECT * FROM sqlite_master WHERE TYPE = ?"
-            indexes = self.execute(sql, ("index", )).fetchall()
-        except Exception as e:
-            result.append(repr(e))
-            logger.exception("Error getting indexes from %s.", self.filename)
-        for i in (x for x in indexes if x.get("sql")):
-            sql  = i["sql"].replace("CREATE INDEX ", "CREATE INDEX new.")
-            try:
+            sql = "SELECT type, name FROM new.sqlite_master"
+            existing = set((x["type"], x["name"].lower()) for x in self.execute(sql))
+            # Create structure for all tables
+            for t in tables:
+                if ("table", t["name"].lower()) in existing: continue # for t
+                sql  = t["sql"].replace("CREATE TABLE ", "CREATE TABLE new.")
                 self.execute(sql)
+            self.execute("CREATE TABLE IF NOT EXISTS new.%s (name TEXT PRIMARY KEY, "
+                         "last_rowid INTEGER, done INTEGER)" % STATE)
+            self.connection.commit()
+            state = {x["name"]: x for x in self.execute("SELECT * FROM new.%s" % STATE)}
+            # Copy data from all tables
+            stats = {"rows": 0, "start": time.time()}
+            for i, t in enumerate(tables):
+                if state.get(t["name"], {}).get("done"): continue # for i, t
+                rowid0 = state.get(t["name"], {}).get("last_rowid")
+                counts = {"index": i, "count": len(tables)}
+                errors, ok = self._recover_table(t, rowid0, progress, counts, stats)
+                result.extend(errors)
+                if not ok:
+                    logger.info("Cancelled recovery from %s to %s, at table %s.",
+                                self.filename, filename, t["name"])
+                    return result
+            # Create indexes
+            indexes = []
+            try:
+                sql = "SELECT * FROM sqlite_master WHERE TYPE = ?"
+                indexes = self.execute(sql, ("index", )).fetchall()
             except Exception as e:
                 result.append(repr(e))
-                logger.exception("Error creating index %s for %s.",
-                                 i["name"], filename)
-        self.execute("DETACH DATABASE new")
+                logger.exception("Error getting indexes from %s.", self.filename)
+            for i in (x for x in indexes if x.get("sql")):
+                if ("index", i["name"].lower()) in existing: continue # for i
+                sql  = i["sql"].replace("CREATE INDEX ", "CREATE INDEX new.")
+                try:
+                    self.execute(sql)
+                except Exception as e:
+                    result.append(repr(e))
+                    logger.exception("Error creating index %s for %s.",
+                                     i["name"], filename)
+            self.execute("DROP TABLE new.%s" % STATE)
+            self.connection.commit()
+            logger.info("Recovered %s from %s to %s in %s.", util.plural("row", stats["rows"]),
+                        self.filename, filename,
+                        util.format_seconds(time.time() - stats["start"]))
+        finally:
+            util.try_ignore(self.connection.commit)
+            self.execute("DETACH DATABASE new")
         return result
 
 
+    def _recover_table(self, table, rowid0, progress, counts, stats):
+        """
+        Copies table rows to attached recovery database in rowid ranges,
+        bisecting failing ranges, recording progress in recovery state table.
+
+        @param   rowid0  last copied rowid if resuming interrupted recovery
+        @param   counts  {"index": table number, "count": total tables}, for progress
+        @param   stats   {"rows": total copied, "start": timestamp}, updated in place
+        @return          ([errors], whether recovery should continue)
+        """
+        errors, name, lost = [], table["name"], [] # [rowid that failed to copy]
+        sql_copy = "INSERT INTO new.%s SELECT * FROM main.%s WHERE rowid >= ? AND rowid < ?" % \
+                   (name, name)
+        sql_state = "INSERT OR REPLACE INTO new.%s (name, last_rowid, done) VALUES (?, ?, ?)" % \
+                    self.RECOVERY_STATE_TABLE
+        bounds = None
+        if not re.search(r"WITHOUT\s+ROWID", table["sql"], re.I):
+            try:
+                sql = "SELECT %s(rowid) AS id FROM main.%s"
+                bounds = [self.execute(sql % (f, name), log=False).fetchone()["id"]
+                          for f in ("MIN", "MAX")]
+            except Exception:
+                logger.exception("Error reading rowid range of table %s in %s, "
+                                 "copying all at once.", name, self.filename)
+
+        if not bounds: # WITHOUT ROWID or unreadable range: copy all at once
+            try:
+                count = self.execute("INSERT INTO new.%s SELECT * FROM main.%s" % (name, name),
+                                     log=False).rowcount
+                stats["rows"] += max(0, count)
+            except Exception as e:
+                errors.append(repr(e))
+                logger.exception("Error copying table %s from %s.", name, self.filename)
+        elif None not in bounds: # Empty table has no bounds
+            pos = bounds[0] if rowid0 is None else rowid0 + 1
+            while pos <= bounds[1]:
+                stack = [(pos, min(pos + self.RECOVERY_CHUNK, bounds[1] + 1))]
+                pos, failed = stack[0][1], False
+                while stack: # Ranges are completed in ascending order
+                    lo, hi = stack.pop()
+                    try:
+                        cursor = self.execute(sql_copy, [lo, hi], log=False)
+                        stats["rows"] += max(0, cursor.rowcount)
+                    except Exception:
+                        self.connection.rollback() # Connection unusable after corruption error
+                        failed = True
+                        if hi - lo > 1:
+                            stack.extend([((lo + hi) // 2, hi), (lo, (lo + hi) // 2)])
+                            continue # while stack
+                        if not lost: logger.exception("Error copying table %s from %s.",
+                                                      name, self.filename)
+                        lost.append(lo)
+                    if failed: # Keep salvaged rows around failures
+                        self.execute(sql_state, [name, hi - 1, False], log=False)
+                        self.connection.commit()
+                self.execute(sql_state, [name, pos - 1, False], log=False)
+                self.connection.commit()
+                if progress and not progress(table=name, rows=stats["rows"],
+                                             rate=self._get_recovery_rate(stats), **counts):
+                    return errors, False
+        if lost:
+            spans = [[lost[0], lost[0]]]
+            for x in lost[1:]:
+                if x == spans[-1][1] + 1: spans[-1][1] = x
+                else: spans.append([x, x])
+            errors.append("Failed to copy %s from table %s, rowid %s." % (
+                util.plural("row", lost), name,
+                ", ".join(str(a) if a == b else "%s-%s" % (a, b) for a, b in spans)))
+            logger.warning(errors[-1])
+        self.execute(sql_state, [name, bounds and bounds[1], True], log=False)
+        self.connection.commit()
+        if progress and not progress(table=name, rows=stats["rows"],
+                                     rate=self._get_recovery_rate(stats), **counts):
+            return errors, False
+        return errors, True
+
+
+    def _get_recovery_rate(self, stats):
+        """Returns rows copied per second in data recovery."""
+        return stats["rows"] / max(time.time() - stats["start"], 0.001)
+
+
+    def is_recovery_resumable(self, filename):
+        """Returns whether file is an interrupted data recovery target that can be resumed."""
+        if not os.path.isfile(filename): return False
+        try:
+            with contextlib.closing(sqlite3.connect(filename)) as db:
+                sql = "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?"
+                return bool(db.execute(sql, [self.RECOVERY_STATE_TABLE]).fetchone())
+        except Exception: return False
+
+
     def clear_cache(self):
         """Clears all the currently cached rows, and refreshes row counts."""
         self.table_rows.clear()
         self.table_objects.clear()
+        self.table_indexes.clear()
+        self.table_cache.clear()
+        self.shared_files_chats.clear()
+        self.share_listing = None
         self.get_tables(refresh=True)
 
 
@@ -325,11 +560,29 @@ class SkypeDatabase(object):
             for k in list(self.table_objects.get(table, {})):
                 if self.table_objects[table][k] in rows:
                     self.table_objects[table].pop(k)
-            if table in self.table_rows:
+            if "messages" == table: # Chat messages cache, re-query affected chats
+                self.table_rows.pop(table, None)
+            elif table in self.table_rows:
                 self.table_rows[table] = [x for x in self.table_rows[table] if x not in rows]
         if rows is None:
             self.table_objects.pop(table, None)
             self.table_rows.pop(table, None)
+        self.table_indexes.pop(table, None)
+        self.table_cache.pop(table, None)
+        if "_shared_files_" == table:
+            self.shared_files_chats.clear()
+            self.share_listing = None
+
+
+    def on_cache_evict(self, key, value):
+        """Handler for cache eviction, drops evicted table from other caches and logs cache status."""
+        cache = self.table_cache
+        if isinstance(key, six.string_types): # Table name from tables cache
+            if "messages" != key: self.table_rows.pop(key, None)
+            self.table_objects.pop(key, None)
+            self.table_indexes.pop(key, None)
+        else: cache = self.table_rows.get("messages") or cache # Chat ID from messages cache
+        logger.info("Evicted %s from %s.", key, cache.format_stats())
 
 
     def update_accountinfo(self, log_error=True):
@@ -377,11 +630,22 @@ class SkypeDatabase(object):
 
     def close(self):
         """Closes the database and frees all allocated data."""
+        session = getattr(self, "backup_session", None)
+        if session and not session["done"]:
+            session["cancel"] = True
+            session["thread"].join()
+        if getattr(self, "sql_tasks", None) and getattr(self, "connection", None):
+            self.cancel_sql_task()
+            util.try_ignore(self.connection.interrupt)
         if hasattr(self, "connection"):
             util.try_ignore(self.connection and self.connection.close)
             del self.connection
             self.connection = None
-        for attr in ["tables", "tables_list", "table_rows", "table_objects"]:
+        for cache in (getattr(self, "table_cache", None), getattr(self, "table_rows", {}).get("messages")):
+            if cache and (cache.hits or cache.misses):
+                logger.info("Closing %s, %s.", self.filename, cache.format_stats())
+        for attr in ["tables", "tables_list", "table_rows", "table_objects", "table_indexes",
+                     "table_cache"]:
             if hasattr(self, attr):
                 delattr(self, attr)
                 setattr(self, attr, None if ("tables_list" == attr) else {})
@@ -391,33 +655,329 @@ class SkypeDatabase(object):
             util.try_ignore(lambda: os.unlink(self.live.tokenpath))
 
 
-    def execute(self, sql, params=(), log=None):
+    def execute(self, sql, params=(), log=None, binary=(), rowtype=dict):
         """
         Shorthand for self.connection.execute().
 
-        @param   log  whether to log SQL statement, defaults to conf.LogSQL if None
+        @param   log      whether to log SQL statement, defaults to conf.LogSQL if None
+        @param   binary   names of columns to leave as bytes instead of converting to strings
+        @param   rowtype  dictionary class for resultset rows
         """
         result = None
         if self.connection:
             if conf.LogSQL if log is None else log:
                 logger.info("SQL: %s%s", sql,
                             ("\nParameters: %s" % params) if params else "")
-            result = self.connection.execute(sql, params)
+            if binary or rowtype is not dict:
+                cursor = self.connection.cursor()
+                cursor.row_factory = functools.partial(self.row_factory, binary=binary,
+                                                       rowtype=rowtype)
+                result = cursor.execute(sql, params)
+            else: result = self.connection.execute(sql, params)
+        return result
+
+
+    def executemany(self, sql, params, log=None):
+        """
+        Shorthand for self.connection.executemany().
+
+        @param   log  whether to log SQL statement, defaults to conf.LogSQL if None
+        """
+        result = None
+        if self.connection:
+            if conf.LogSQL if log is None else log:
+                logger.info("SQL: %s\nParameters: %s sets", sql, len(params))
+            result = self.connection.executemany(sql, params)
+        return result
+
+
+    def create_temp_ids(self, ids):
+        """
+        Creates a temporary table populated with the values,
+        as (pos INTEGER PRIMARY KEY, id) in given order.
+
+        @return  table name qualified with "temp.", to drop with drop_temp_ids()
+        """
+        if not self.connection: return None
+        name = "_ids_%s_" % next(SkypeDatabase.TEMP_COUNTER)
+        in_transaction = getattr(self.connection, "in_transaction", True) # Py2 lacks attribute
+        self.execute("CREATE TEMP TABLE %s (pos INTEGER PRIMARY KEY, id)" % name, log=False)
+        self.executemany("INSERT INTO temp.%s (id) VALUES (?)" % name, [(x, ) for x in ids],
+                         log=False)
+        if not in_transaction: self.connection.commit() # Do not leave transaction open
+        return "temp.%s" % name
+
+
+    def drop_temp_ids(self, *names):
+        """Drops temporary tables created with create_temp_ids()."""
+        if not self.connection: return
+        in_transaction = getattr(self.connection, "in_transaction", True)
+        for name in filter(bool, names):
+            util.try_ignore(self.execute, "DROP TABLE IF EXISTS %s" % name, log=False)
+        if not in_transaction and getattr(self.connection, "in_transaction", False):
+            self.connection.commit()
+
+
+    @contextlib.contextmanager
+    def temp_ids(self, ids):
+        """
+        Context manager for a temporary table populated with the values,
+        as (pos INTEGER PRIMARY KEY, id) in given order, dropped on exit.
+        Yields table name qualified with "temp.".
+        """
+        name = self.create_temp_ids(ids)
+        try: yield name
+        finally: self.drop_temp_ids(name)
+
+
+    def commit(self, rows=(), count=None):
+        """
+        Commits pending changes, unless within a bulk write session
+        that has not yet reached its row count or data size threshold,
+        or within an atomic bulk write session.
+
+        @param   rows   changed rows as dictionaries or lists, for data size threshold
+        @param   count  number of changed rows, defaults to length of rows or 1
+        """
+        session = self.bulk_session
+        if session:
+            session["rows"] += (len(rows) or 1) if count is None else count
+            if session["sizelimit"]:
+                values = (v for r in rows for v in (r.values() if isinstance(r, dict) else r))
+                session["size"] += sum(len(v) for v in values
+                                       if isinstance(v, (six.binary_type, six.text_type)))
+            if session["atomic"] \
+            or  (not session["rowlimit"]  or session["rows"] < session["rowlimit"]) \
+            and (not session["sizelimit"] or session["size"] < session["sizelimit"]):
+                return
+            session["rows"] = session["size"] = 0
+        self.connection.commit()
+
+
+    @contextlib.contextmanager
+    def bulk_write(self, rowlimit=None, sizelimit=None, atomic=False):
+        """
+        Returns a context manager for a bulk write session: changes from
+        insert_row(), update_row(), delete_row(), insert_messages() etc
+        are not committed row by row, but in batches upon reaching
+        row count or data size threshold, and at session end.
+        On error, pending changes are rolled back instead, by the outermost
+        or by an atomic session. Backup is checked only once per session. Nested sessions
+        join the outermost session. Connection uses PRAGMA profile
+        conf.DatabasePragmaProfileBulk for the duration of the session.
+
+        @param   rowlimit   number of changed rows to commit after,
+                            defaults to conf.BulkWriteRowLimit, 0 disables
+        @param   sizelimit  approximate size of changed data in bytes to commit after,
+                            defaults to conf.BulkWriteSizeLimit, 0 disables
+        @param   atomic     take database write lock at start and defer all commits
+                            until this session ends, e.g. for assigning new row IDs
+                            in advance without other writers taking them meanwhile
+        """
+        session = self.bulk_session
+        if session: session["depth"] += 1
+        else:
+            session = self.bulk_session = {
+                "depth": 1, "rows": 0, "size": 0, "backup": False, "atomic": 0,
+                "rowlimit":  conf.BulkWriteRowLimit  if rowlimit  is None else rowlimit,
+                "sizelimit": conf.BulkWriteSizeLimit if sizelimit is None else sizelimit,
+                "pragmas": None, # (previous profile name, [(pragma, previous value)])
+            }
+            if self.is_open() and not self.readonly and conf.DatabasePragmaProfileBulk \
+            and conf.DatabasePragmaProfileBulk != self.pragma_profile:
+                self.connection.commit() # Synchronous cannot change within transaction
+                profile0 = self.pragma_profile
+                pragmas0 = self.apply_pragma_profile(conf.DatabasePragmaProfileBulk)
+                session["pragmas"] = (profile0, pragmas0)
+        if atomic:
+            session["atomic"] += 1
+            self.begin_write()
+        try: yield session
+        except BaseException:
+            if atomic or 1 == session["depth"]: self.rollback()
+            raise
+        finally:
+            session["depth"] -= 1
+            if atomic: session["atomic"] -= 1
+            if atomic and session["depth"] and not session["atomic"]:
+                self.commit(count=0) # Commit if outer session reached threshold
+            if not session["depth"]:
+                self.bulk_session = None
+                if self.is_open(): self.connection.commit()
+                if self.is_open() and session["pragmas"]:
+                    self.set_pragmas(session["pragmas"][1])
+                    self.pragma_profile = session["pragmas"][0]
+
+
+    def rollback(self):
+        """
+        Rolls back pending changes, discarding cached rows and message stats
+        state that may reflect them.
+        """
+        if not self.is_open(): return
+        util.try_ignore(self.connection.rollback)
+        if self.bulk_session: self.bulk_session["rows"] = self.bulk_session["size"] = 0
+        self.table_rows.clear()
+        self.table_objects.clear()
+        self.table_indexes.clear()
+        self.table_cache.clear()
+        self.shared_files_chats.clear()
+        self.stats_rows = self.stats_state = self.stats_dirty = self.stats_unsaved = None
+
+
+    def begin_write(self):
+        """
+        Starts a transaction holding the database write lock (BEGIN IMMEDIATE),
+        unless a write transaction is already open.
+        """
+        if self.is_open() and not self.readonly \
+        and not getattr(self.connection, "in_transaction", False):
+            self.execute("BEGIN IMMEDIATE", log=False)
+
+
+    def apply_pragma_profile(self, name):
+        """
+        Applies named PRAGMA profile from conf.DatabasePragmaProfiles
+        to database connection, logging any error.
+
+        @return  previous values of changed PRAGMA settings, as [(pragma, value)]
+        """
+        pragmas = conf.DatabasePragmaProfiles.get(name) if name else None
+        if name and pragmas is None:
+            logger.warning("Unknown database PRAGMA profile %r.", name)
+        if not self.is_open() or pragmas is None: return []
+        result = self.set_pragmas(pragmas)
+        self.pragma_profile = name
         return result
 
 
+    def set_pragmas(self, pragmas):
+        """
+        Sets PRAGMA values on database connection, logging any error.
+
+        @param   pragmas  [(pragma, value)]
+        @return           previous values of changed PRAGMA settings, as [(pragma, value)]
+        """
+        result = []
+        for name, value in pragmas if self.is_open() else ():
+            try:
+                value0 = self.get_pragmas([name]).get(name)
+                self.execute("PRAGMA %s = %s" % (name, value), log=False).fetchall()
+                if value0 is not None: result.append((name, value0))
+            except Exception:
+                logger.exception("Error setting PRAGMA %s = %s in %s.", name, value, self.filename)
+        return result
+
+
+    def get_pragmas(self, names):
+        """Returns current values of specified PRAGMA settings, as {pragma: value}."""
+        result = {}
+        for name in names if self.is_open() else ():
+            row = self.execute("PRAGMA %s" % name, log=False).fetchone()
+            if row: result[name] = next(iter(row.values()))
+        return result
+
+
+    def start_sql_task(self, progress=None):
+        """
+        Starts a cancellable SQL task in current thread: statements executed
+        in this thread until end_sql_task() can be aborted by cancel_sql_task()
+        or by progress callback, within conf.SQLProgressSteps SQLite
+        virtual machine instructions. Aborted statement raises
+        sqlite3.OperationalError("interrupted"). Nested tasks in the same
+        thread join the outermost task.
+
+        @param   progress  callback(elapsed=seconds) invoked every conf.SQLProgressInterval
+                           seconds while a statement is running, returning false to cancel
+        @return            task {"thread", "start", "cancel", "progress", "depth", ..}
+        """
+        key = threading.current_thread().ident
+        with self.sql_lock:
+            task = self.sql_tasks.get(key)
+            if task: task["depth"] += 1
+            else:
+                now = time.time()
+                task = self.sql_tasks[key] = {"thread": key, "start": now, "reported": now,
+                                              "cancel": False, "progress": progress, "depth": 1}
+                if len(self.sql_tasks) == 1 and self.is_open():
+                    self.connection.set_progress_handler(self.on_sql_progress,
+                                                         max(1, conf.SQLProgressSteps))
+        return task
+
+
+    def end_sql_task(self, task):
+        """Ends cancellable SQL task started with start_sql_task()."""
+        with self.sql_lock:
+            task["depth"] -= 1
+            if task["depth"] > 0 or self.sql_tasks.get(task["thread"]) is not task: return
+            self.sql_tasks.pop(task["thread"])
+            if task["cancel"]:
+                logger.info("Cancelled SQL in %s after %s.", self.filename,
+                            util.format_seconds(time.time() - task["start"]))
+            if not self.sql_tasks and self.is_open():
+                util.try_ignore(self.connection.set_progress_handler, None, 0)
+
+
+    def cancel_sql_task(self, task=None):
+        """
+        Cancels cancellable SQL task, or all running tasks if not given,
+        aborting statement in progress.
+        """
+        with self.sql_lock:
+            for t in [task] if task else list(self.sql_tasks.values()): t["cancel"] = True
+
+
+    @contextlib.contextmanager
+    def sql_task(self, progress=None):
+        """
+        Returns a context manager for a cancellable SQL task in current thread,
+        see start_sql_task(). Yields task.
+        """
+        task = self.start_sql_task(progress)
+        try: yield task
+        finally: self.end_sql_task(task)
+
+
+    def on_sql_progress(self):
+        """
+        SQLite progress handler for cancellable SQL tasks,
+        returns non-zero if running statement should be aborted.
+        """
+        task = self.sql_tasks.get(threading.current_thread().ident)
+        if not task or task["cancel"]: return 1 if task else 0
+        now = time.time()
+        if task["progress"] and now - task["reported"] >= conf.SQLProgressInterval:
+            task["reported"] = now
+            try: task["cancel"] = not task["progress"](elapsed=now - task["start"])
+            except Exception:
+                logger.exception("Error reporting SQL progress in %s.", self.filename)
+        return 1 if task["cancel"] else 0
+
+
     def execute_action(self, sql):
         """
         Executes the specified SQL INSERT/UPDATE/DELETE statement and returns
         the number of affected rows.
         """
         self.ensure_backup()
-        res = self.execute(sql)
+        try: res = self.execute(sql)
+        finally: self.mark_message_stats_dirty() # Arbitrary SQL may change any table
         affected_rows = res.rowcount
         self.connection.commit()
         return affected_rows
 
 
+    def execute_script(self, sql):
+        """
+        Executes the specified SQL script of multiple statements,
+        committing any pending changes first, as sqlite3 executescript().
+        Marks all message statistics for recount, also if script fails midway.
+        """
+        self.ensure_backup()
+        try: self.connection.executescript(sql)
+        finally: self.mark_message_stats_dirty() # Arbitrary SQL may change any table
+
+
     def is_open(self):
         """Returns whether the database is currently open."""
         return (self.connection is not None)
@@ -426,9 +986,13 @@ class SkypeDatabase(object):
     def get_tables(self, refresh=False, this_table=None):
         """
         Returns the names and rowcounts of all tables in the database, as
-        [{"name": "tablename", "rows": 0, "sql": CREATE SQL}, ].
+        [{"name": "tablename", "rows": 0, "sql": CREATE SQL, ?"rows_estimated": True}, ].
         Uses already retrieved cached values if possible, unless refreshing.
 
+        If conf.RowCountsEstimated, rowcounts are taken from maximum rowid
+        instead of counting all rows, with "rows_estimated" set for
+        non-empty tables; get_table_rowcount() gives exact count.
+
         @param   refresh     if True, information including rowcounts is
                              refreshed
         @param   this_table  if set, only information for this table is
@@ -445,9 +1009,18 @@ class SkypeDatabase(object):
             for row in rows:
                 table = row
                 try:
-                    res = self.execute("SELECT COUNT(*) AS count FROM %s" %
-                                       table["name"], log=False)
-                    table["rows"] = res.fetchone()["count"]
+                    if conf.RowCountsEstimated:
+                        try:
+                            res = self.execute("SELECT MAX(rowid) AS count FROM %s" %
+                                               table["name"], log=False)
+                            table["rows"] = res.fetchone()["count"] or 0
+                            if table["rows"]: table["rows_estimated"] = True
+                        except sqlite3.DatabaseError: # WITHOUT ROWID table
+                            table.pop("rows", None)
+                    if "rows" not in table:
+                        res = self.execute("SELECT COUNT(*) AS count FROM %s" %
+                                           table["name"], log=False)
+                        table["rows"] = res.fetchone()["count"]
                 except sqlite3.DatabaseError:
                     table["rows"] = 0
                     logger.exception("Error getting %s row count for %s.",
@@ -472,9 +1045,25 @@ class SkypeDatabase(object):
         return self.tables_list
 
 
+    def get_table_rowcount(self, table):
+        """
+        Returns the exact number of rows in the specified table,
+        updating table information if rowcount was estimated.
+        """
+        res = self.execute("SELECT COUNT(*) AS count FROM %s" % table, log=False)
+        count = res.fetchone()["count"]
+        tdata = (self.tables or {}).get(table.lower())
+        if tdata:
+            tdata["rows"] = count
+            tdata.pop("rows_estimated", None)
+        return count
+
+
     def get_general_statistics(self, full=True):
         """
         Get up-to-date general statistics raw from the database.
+        Table counts are taken from estimated table rowcounts if not counted yet,
+        with "<table>_estimated" set, like {"messages": 1000, "messages_estimated": True}.
 
         @param   full  whether to return full statistics, or only tables and last chat
         """
@@ -483,6 +1072,11 @@ class SkypeDatabase(object):
             result.update({"name": self.account.get("name"),
                            "skypename": self.id, "username": self.username})
         for table in ["Messages", "Contacts"] + (["Transfers"] if full else []):
+            tdata = self.tables.get(table.lower())
+            if tdata and tdata.get("rows_estimated"):
+                result[table.lower()] = tdata["rows"]
+                result[table.lower() + "_estimated"] = True
+                continue # for table
             res = self.execute("SELECT COUNT(*) AS count FROM %s" % table)
             result[table.lower()] = next(res, {}).get("count")
 
@@ -540,12 +1134,13 @@ class SkypeDatabase(object):
 
     def get_messages(self, chat=None, ascending=True,
                      additional_sql=None, additional_params=None, limit=(),
-                     timestamp_from=None, timestamp_to=None, use_cache=True):
+                     timestamp_from=None, timestamp_to=None, use_cache=True,
+                     order_id=False, columns=None):
         """
         Yields all the messages (or messages for the specified chat), as
-        {"datetime": datetime, ..}, ordered from earliest to latest.
+        MessageRow {"datetime": datetime, ..}, ordered from earliest to latest.
         Uses already retrieved cached values if possible, unless additional
-        query parameters are used.
+        query parameters are used, or specific columns are requested.
 
         @param   chat               as returned by get_conversations(), if any
         @param   ascending          specify message order, earliest to latest
@@ -558,13 +1153,25 @@ class SkypeDatabase(object):
         @param   timestamp_to       timestamp beyond which messages will end
         @param   use_cache          whether to use cached values if available.
                                     The LIKE keywords will be ignored if True.
+        @param   order_id           whether to order by message ID after timestamp
+        @param   columns            Messages columns to select if not all,
+                                    like MESSAGE_COLUMNS_CORE, yielding
+                                    compact CompactMessageRow objects
         """
         if self.is_open() and "messages" in self.tables:
-            if "messages" not in self.table_rows:
-                self.table_rows["messages"] = {} # {convo_id: [{msg1},]}
-            if not use_cache \
-            or not (chat and chat["id"] in self.table_rows["messages"]):
-                sql, params = "SELECT m.* FROM messages m ", {}
+            if "messages" not in self.table_rows: # {convo_id: [{msg1},]}
+                self.table_rows["messages"] = util.LRUCache(conf.CacheMessagesSizeLimit,
+                    on_evict=self.on_cache_evict, name="messages cache")
+            cache = self.table_rows["messages"]
+            cached = cache.get(chat["id"]) if chat and use_cache and not columns else None
+            if cached is None:
+                sql, params, rowtype = "SELECT m.* FROM messages m ", {}, MessageRow
+                if columns:
+                    names = set(c["name"].lower() for c in self.get_table_columns("messages"))
+                    cols = [c for c in columns if c.lower() in names]
+                    cols += [c for c in ("id", "timestamp") if c not in cols]
+                    sql = "SELECT %s FROM messages m " % ", ".join("m.%s" % c for c in cols)
+                    rowtype = CompactMessageRow
                 if additional_sql and " c." in additional_sql:
                     sql += "LEFT JOIN conversations c ON m.convo_id = c.id "
                 if additional_sql and " cn." in additional_sql:
@@ -589,28 +1196,25 @@ class SkypeDatabase(object):
                     params.update(additional_params or {})
                 sql += " ORDER BY m.timestamp %s" \
                     % ("ASC" if ascending else "DESC")
+                if order_id: sql += ", m.id %s" % ("ASC" if ascending else "DESC")
                 limit  = limit if isinstance(limit, (list, tuple)) else [limit]
                 for i, (k, v) in enumerate(zip(("LIMIT", "OFFSET"), limit)):
                     if not i or v is not None: sql += " %s %s" % (k, v or 0)
-                res = self.execute(sql, params)
+                res = self.execute(sql, params, rowtype=rowtype)
+                do_cache = chat and use_cache and not columns and len(params) == 1
                 messages = []
                 message = res.fetchone()
                 while message:
-                    message["datetime"] = None
-                    if message["timestamp"]:
-                        message["datetime"] = self.stamp_to_date(
-                                              message["timestamp"])
-                    if chat and use_cache and len(params) == 1:
+                    if do_cache:
                         messages.append(message)
                     yield message
                     message = res.fetchone()
-                if chat and use_cache and len(params) == 1:
+                if do_cache:
                     # Only cache queries getting full range
-                    self.table_rows["messages"][chat["id"]] = messages
+                    cache[chat["id"]] = messages
             else:
                 messages_sorted = sorted(
-                    self.table_rows["messages"][chat["id"]],
-                    key=lambda m: m["timestamp"], reverse=not ascending
+                    cached, key=lambda m: m["timestamp"], reverse=not ascending
                 )
                 if timestamp_from:
                     messages_sorted = (x for x in messages_sorted
@@ -620,26 +1224,111 @@ class SkypeDatabase(object):
                     yield message
 
 
-    def row_factory(self, cursor, row):
+    def get_messages_page(self, chat=None, before=None, count=None, direction=-1,
+                          additional_sql=None, additional_params=None, columns=None):
+        """
+        Returns a page of messages (or messages for the specified chat),
+        as [{"datetime": datetime, ..}, ], ordered by timestamp and ID,
+        starting from the given position and moving in given direction.
+
+        Uses keyset pagination on (timestamp, ID), so that consecutive pages
+        neither skip nor repeat messages with the same timestamp.
+        Skyperious optional index _messages_page_ from optimize() speeds this up.
+
+        @param   chat               as returned by get_conversations(), if any
+        @param   before             (timestamp, message ID) of the message to
+                                    continue after in given direction,
+                                    with ID None to continue from timestamp only;
+                                    if not given, starts from latest or earliest
+        @param   count              maximum number of messages to return, all if None
+        @param   direction          negative for messages before position, latest first;
+                                    positive for messages after position, earliest first
+        @param   additional_sql     additional SQL string added to the end
+        @param   additional_params  SQL parameter dict for additional_sql
+        @param   columns            Messages columns to select if not all,
+                                    yielding compact CompactMessageRow objects
+        """
+        result = []
+        if not self.is_open() or "messages" not in self.tables:
+            return result
+
+        ascending, where, params = (direction > 0), "", {}
+        if before and before[0] is not None:
+            op = ">" if ascending else "<"
+            params.update(timestamp_page=before[0], id_page=before[1])
+            if before[1] is None:
+                where = "m.timestamp %s :timestamp_page" % op
+            else: # Range on timestamp for index, ID as tiebreaker
+                where = "m.timestamp %s= :timestamp_page AND (m.timestamp %s " \
+                        ":timestamp_page OR m.id %s :id_page)" % (op, op, op)
+        elif before: # Messages without timestamp are ordered first
+            params.update(id_page=before[1])
+            where = "(m.timestamp IS NOT NULL OR m.id > :id_page)" if ascending else \
+                    "m.timestamp IS NULL AND m.id < :id_page"
+        if additional_sql:
+            where += (" AND " if where else "") + "(%s)" % additional_sql
+            params.update(additional_params or {})
+        limit = () if count is None else (count, )
+        result = list(self.get_messages(chat, ascending, where or None, params, limit,
+                                        use_cache=False, order_id=True, columns=columns))
+        if not ascending and before and before[0] is not None \
+        and (count is None or len(result) < count): # Continue into messages without timestamp
+            result += self.get_messages_page(chat, (None, sys.maxsize),
+                                             None if count is None else count - len(result),
+                                             direction, additional_sql, additional_params, columns)
+        return result
+
+
+    def get_row_plan(self, cursor, row):
+        """
+        Returns (column names, indexes of columns holding BLOB values)
+        for cursor resultset row, cached per thread for as long as consecutive
+        rows come from the same query. BLOB columns are re-detected
+        only if a BLOB value appears in a column not yet known to hold them.
+        """
+        description, names, blobs, rest = getattr(self.row_plans, "plan", (None, [], (), None))
+        if cursor.description is not description:
+            description, names = cursor.description, [x[0] for x in cursor.description]
+            blobs, rest = (), None
+        elif rest and BLOB_TYPES.isdisjoint(map(type, rest(row))):
+            return names, blobs
+
+        blobs = tuple(i for i, v in enumerate(row) if i in blobs or type(v) in BLOB_TYPES)
+        others = [i for i in range(len(row)) if i not in blobs]
+        rest = operator.itemgetter(*others) if len(others) > 1 else \
+               lambda row, others=others: tuple(row[i] for i in others)
+        self.row_plans.plan = (description, names, blobs, rest)
+        return names, blobs
+
+
+    def row_factory(self, cursor, row, binary=(), rowtype=dict):
         """
         Creates dicts from resultset rows, with BLOB fields converted to
-        strings.
+        strings, as UTF-8 if valid else Latin-1. TEXT fields are decoded
+        by connection text factory already.
+
+        @param   binary   names of columns to leave as bytes
+        @param   rowtype  dictionary class to create
         """
-        result = {}
-        for idx, col in enumerate(cursor.description):
-            name = col[0]
-            result[name] = row[idx]
-        for name in list(result):
-            datatype = type(result[name])
-            if sys.version_info < (3, ) and datatype is buffer:  # Py2
-                result[name] = str(result[name]).decode("latin1")
-            elif datatype is memoryview:
-                result[name] = datatype.to_bytes().decode("latin1")
-            elif datatype is six.binary_type:
-                try:
-                    result[name] = result[name].decode("utf-8")
-                except Exception:
-                    result[name] = result[name].decode("latin1")
+        names, blobs = self.get_row_plan(cursor, row)
+        result = rowtype(zip(names, row))
+        for name in binary:
+            if isinstance(result.get(name), six.text_type): # From TEXT column
+                result[name] = result[name].encode("utf-8")
+        for idx in blobs:
+            name, value = names[idx], row[idx]
+            datatype = type(value)
+            if datatype not in BLOB_TYPES: continue # for idx
+            if name in binary:
+                if datatype is not six.binary_type: result[name] = bytes(value)
+                continue # for idx
+            if datatype is not six.binary_type: # memoryview or Py2 buffer
+                result[name] = bytes(value).decode("latin1")
+                continue # for idx
+            try:
+                result[name] = value.decode("utf-8")
+            except Exception:
+                result[name] = value.decode("latin1")
         return result
 
 
@@ -782,22 +1471,10 @@ class SkypeDatabase(object):
         log = conf.LogSQL if log is None else log
         if log and chats:
             logger.info("Statistics collection starting (%s).", self.filename)
-        stats = {}
-        if self.is_open() and "messages" in self.tables:
-            and_str, and_val = "", []
-            if 1 == len(chats):
-                cc = [x for x in (chats[0], chats[0].get("__link")) if x]
-                and_str = " AND convo_id IN (%s)" % ", ".join("?" * len(cc))
-                and_val = [c["id"] for c in cc]
-            sql = ("SELECT convo_id AS id, COUNT(*) AS message_count, "
-                   "MIN(timestamp) AS first_message_timestamp, "
-                   "MAX(timestamp) AS last_message_timestamp, "
-                   "NULL AS first_message_datetime, "
-                   "NULL AS last_message_datetime "
-                   "FROM messages WHERE type IN (%s)%s GROUP BY convo_id"
-                   % (", ".join(map(str, MESSAGE_TYPES_MESSAGE)), and_str))
-            rows_stat = self.execute(sql, and_val).fetchall()
-            stats = dict((i["id"], i) for i in rows_stat)
+        chat_ids = None
+        if 1 == len(chats):
+            chat_ids = [x["id"] for x in (chats[0], chats[0].get("__link")) if x]
+        stats = self.get_message_stats(chat_ids)
         for chat in chats:
             chat["message_count"] = 0
             cc = [x for x in (chat, chat.get("__link")) if x]
@@ -805,6 +1482,7 @@ class SkypeDatabase(object):
             if not datas: continue # for chat
             for data in datas: # Initialize datetime objects
                 for n in ["first_message", "last_message"]:
+                    data[n + "_datetime"] = None
                     if data[n + "_timestamp"]:
                         dt = self.stamp_to_date(data[n + "_timestamp"])
                         data[n + "_datetime"] = dt
@@ -822,6 +1500,165 @@ class SkypeDatabase(object):
             logger.info("Statistics collected (%s).", self.filename)
 
 
+    def get_message_stats(self, chat_ids=None):
+        """
+        Returns message counts and first and last timestamps per conversation,
+        as kept in memory by refresh_message_stats(). Does not write to database.
+
+        @param   chat_ids  specific conversation IDs to return if not all
+        @return            {convo_id: {"id", "message_count",
+                                       "first_message_timestamp", "last_message_timestamp"}}
+        """
+        result = {}
+        if not self.is_open() or "messages" not in self.tables: return result
+        self.refresh_message_stats()
+        ids = self.stats_rows if chat_ids is None else [x for x in chat_ids if x in self.stats_rows]
+        for chat_id in ids:
+            result[chat_id] = dict(self.stats_rows[chat_id], id=chat_id)
+        return result
+
+
+    def refresh_message_stats(self, chat_ids=(), reset=False):
+        """
+        Brings in-memory message statistics up to date with Messages, without
+        writing to database: new rows in Messages are aggregated into existing
+        values, given and changed conversations are recounted. Any change in
+        database not made via this instance causes a full recount, as detected
+        from PRAGMA data_version. Initial values are taken from Skyperious table
+        _stats_ if up to date with database, else counted from Messages.
+
+        @param   chat_ids  conversation IDs to recount regardless of changes
+        @param   reset     whether to recount all conversations
+        """
+        if not self.is_open() or "messages" not in self.tables: return
+
+        version = self._get_data_version()
+        max_id = self.execute("SELECT MAX(id) AS id FROM messages", log=False).fetchone()["id"] or 0
+        rows, max_id0 = None, None
+        if reset or self.stats_dirty is None: pass
+        elif self.stats_rows is not None and self.stats_state \
+        and version is not None and self.stats_state[0] == version:
+            rows, max_id0 = self.stats_rows, self.stats_state[1] # No changes by others
+        elif self.is_message_stats_current():
+            sql = "SELECT * FROM _stats_"
+            rows = {x["convo_id"]: dict(x) for x in self.execute(sql, log=False).fetchall()}
+            max_id0, self.stats_unsaved = max_id, set()
+        chat_ids = set(chat_ids) | (self.stats_dirty or set())
+        if rows is not None and max_id == max_id0 and not chat_ids:
+            self.stats_rows, self.stats_state = rows, (version, max_id)
+            return
+
+        sql_base = ("SELECT convo_id, COUNT(*) AS message_count, "
+                    "MIN(timestamp) AS first_message_timestamp, "
+                    "MAX(timestamp) AS last_message_timestamp "
+                    "FROM messages WHERE convo_id IS NOT NULL AND type IN (%s)"
+                    % ", ".join(map(str, MESSAGE_TYPES_MESSAGE)))
+        if rows is None:
+            sql = "%s GROUP BY convo_id" % sql_base
+            rows = {x["convo_id"]: dict(x) for x in self.execute(sql, log=False).fetchall()}
+            self.stats_unsaved, chat_ids = None, ()
+        elif max_id > max_id0:
+            sql = "%s AND id > ? GROUP BY convo_id" % sql_base
+            for row in self.execute(sql, [max_id0], log=False).fetchall():
+                if row["convo_id"] in chat_ids: continue # for row
+                row0 = rows.get(row["convo_id"])
+                if row0:
+                    row0["message_count"] += row["message_count"]
+                    for n, f in [("first_message_timestamp", min),
+                                 ("last_message_timestamp", max)]:
+                        values = [x for x in (row[n], row0[n]) if x is not None]
+                        row0[n] = f(values) if values else None
+                else: rows[row["convo_id"]] = dict(row)
+                if self.stats_unsaved is not None: self.stats_unsaved.add(row["convo_id"])
+
+        chat_ids = list(chat_ids)
+        for chunk in [chat_ids[i:i+999] for i in range(0, len(chat_ids), 999)]:
+            for chat_id in chunk: rows.pop(chat_id, None)
+            sql = "%s AND convo_id IN (%s) GROUP BY convo_id" % (sql_base, ", ".join("?" * len(chunk)))
+            rows.update((x["convo_id"], dict(x)) for x in self.execute(sql, chunk, log=False))
+            if self.stats_unsaved is not None: self.stats_unsaved.update(chunk)
+        self.stats_rows, self.stats_state, self.stats_dirty = rows, (version, max_id), set()
+
+
+    def update_message_stats(self, chat_ids=(), reset=False):
+        """
+        Updates message statistics as in refresh_message_stats(), and saves
+        changed values to Skyperious table _stats_, creating it if missing,
+        for reuse on next open. For write operations only, as it does not
+        check for backup. Does not commit.
+
+        @param   chat_ids  conversation IDs to recount regardless of changes
+        @param   reset     whether to recount all conversations
+        """
+        if not self.is_open() or self.readonly or "messages" not in self.tables: return
+
+        self.refresh_message_stats(chat_ids, reset)
+        for table, sql in [("_options_", self.INTERNAL_CREATE_STATEMENTS["_options_"]),
+                           ("_stats_",   self.STATS_CREATE_STATEMENT)]:
+            if table not in self.tables: # Created without commit, unlike create_table()
+                self.execute(sql, log=False)
+                self.get_tables(refresh=True, this_table=table)
+                if "_stats_" == table: self.stats_unsaved = None
+
+        sql_marker = "INSERT OR REPLACE INTO _options_ (name, value) VALUES ('StatsMarker', ?)"
+        sql_insert = ("INSERT OR REPLACE INTO _stats_ (convo_id, message_count, "
+                      "first_message_timestamp, last_message_timestamp) "
+                      "VALUES (:convo_id, :message_count, "
+                      ":first_message_timestamp, :last_message_timestamp)")
+        rows, unsaved = self.stats_rows, self.stats_unsaved
+        self.execute(sql_marker, ["{}"], log=False) # Force recount if interrupted
+        if unsaved is None:
+            self.execute("DELETE FROM _stats_", log=False)
+            self.executemany(sql_insert, [dict(v, convo_id=k) for k, v in rows.items()], log=False)
+        unsaved = [] if unsaved is None else list(unsaved)
+        for chunk in [unsaved[i:i+999] for i in range(0, len(unsaved), 999)]:
+            args = ", ".join("?" * len(chunk))
+            self.execute("DELETE FROM _stats_ WHERE convo_id IN (%s)" % args, chunk, log=False)
+            self.executemany(sql_insert, [dict(rows[x], convo_id=x) for x in chunk if x in rows],
+                             log=False)
+        marker = {"max_id": self.stats_state[1], "mtime": time.time()}
+        self.execute(sql_marker, [json.dumps(marker, sort_keys=True)], log=False)
+        self.clear_cache_rows("_options_")
+        self.stats_unsaved = set()
+
+
+    def mark_message_stats_dirty(self, *rows):
+        """
+        Marks chats of given changed Messages rows for recount in next statistics update,
+        or all chats if no rows given or chat unknown.
+        """
+        chat_ids = [r.get("convo_id") for r in rows]
+        if rows and all(x is not None for x in chat_ids) and self.stats_dirty is not None:
+            self.stats_dirty.update(chat_ids)
+        else: self.stats_dirty = None
+
+
+    def is_message_stats_current(self):
+        """
+        Returns whether Skyperious table _stats_ is present and up to date with Messages:
+        maximum message ID is unchanged and database file has not been modified
+        after last saving statistics.
+        """
+        if not self.is_open() or "_stats_" not in self.tables or "messages" not in self.tables \
+        or "_options_" not in self.tables:
+            return False
+        sql = "SELECT value FROM _options_ WHERE name = 'StatsMarker'"
+        row = self.execute(sql, log=False).fetchone()
+        marker0 = json.loads(row["value"] or "{}") if row else {}
+        if not marker0.get("mtime"): return False
+        max_id = self.execute("SELECT MAX(id) AS id FROM messages", log=False).fetchone()["id"]
+        mtimes = [os.path.getmtime(p) for p in (self.filename, "%s-wal" % self.filename)
+                  if os.path.exists(p)]
+        return marker0["max_id"] == (max_id or 0) \
+               and max(mtimes or [0]) <= marker0["mtime"] + self.STATS_MTIME_TOLERANCE
+
+
+    def _get_data_version(self):
+        """Returns PRAGMA data_version of database connection, or None if not supported."""
+        row = self.execute("PRAGMA data_version", log=False).fetchone()
+        return row["data_version"] if row else None
+
+
     def get_contacts_stats(self, contacts, chats, log=None):
         """
         Collects statistics for given contacts and fills in the values:
@@ -839,71 +1676,68 @@ class SkypeDatabase(object):
         if log and contacts:
             logger.info("Contact statistics collection starting (%s).", self.filename)
         stats, chatmap, linkedchatmap, singlechatmap = {}, {}, {}, {} # {author: []}, {oldid: newid}, {id: {}}, {author: id}
-        firstmsgs, lastmsgs = {}, {} # {(id, author): {}}
+        msgstats, chatidmap, filecounts = {}, {}, {} # {(id, author): {}}, {author: set(id)}, {author: count}
         chatmap = {x["id"]: x for x in chats}
         chatmap.update({x["__link"]["id"]: x["__link"] for x in chats if x.get("__link")})
         if self.is_open() and all(x in self.tables for x in ("contacts", "messages", "conversations")):
             and_str, and_val = "", []
             if 1 == len(contacts):
                 and_str, and_val = " AND author = ?", [contacts[0]["identity"]]
+            types_str = ", ".join(map(str, MESSAGE_TYPES_MESSAGE))
+            # Bare column in a single MIN/MAX aggregate query comes from the row holding the extreme
             sql = ("SELECT convo_id AS id, author AS identity, COUNT(*) AS message_count, "
-                   "MIN(timestamp) AS first_message_timestamp, "
-                   "MAX(timestamp) AS last_message_timestamp "
-                   "FROM messages WHERE type IN (%s)%s GROUP BY convo_id, author"
-                   % (", ".join(map(str, MESSAGE_TYPES_MESSAGE)), and_str))
-            for row in self.execute(sql, and_val).fetchall():
-                if row["id"] in chatmap:
-                    stats.setdefault(row["identity"], []).append(row)
-
-            sql = ("SELECT id AS first_message_id, convo_id AS id, author AS identity, "
-                   "MIN(timestamp) AS first_message_timestamp "
+                   "id AS first_message_id, MIN(timestamp) AS first_message_timestamp "
                    "FROM messages WHERE type IN (%s)%s GROUP BY convo_id, author"
-                   % (", ".join(map(str, MESSAGE_TYPES_MESSAGE)), and_str))
+                   % (types_str, and_str))
             for row in self.execute(sql, and_val).fetchall():
-                firstmsgs[(row["id"], row["identity"])] = row
-            sql = ("SELECT id AS last_message_id, convo_id AS id, author AS identity, "
+                msgstats[(row["id"], row["identity"])] = row
+            sql = ("SELECT convo_id AS id, author AS identity, id AS last_message_id, "
                    "MAX(timestamp) AS last_message_timestamp "
                    "FROM messages WHERE type IN (%s)%s GROUP BY convo_id, author"
-                   % (", ".join(map(str, MESSAGE_TYPES_MESSAGE)), and_str))
+                   % (types_str, and_str))
             for row in self.execute(sql, and_val).fetchall():
-                lastmsgs[(row["id"], row["identity"])] = row
+                msgstats[(row["id"], row["identity"])].update(row)
+            for row in sorted(msgstats.values(), key=lambda x: x["id"]):
+                if row["id"] in chatmap:
+                    stats.setdefault(row["identity"], []).append(dict(row))
 
             linkedchatmap = {x["__link"]["id"]: x["id"] for x in chats if x.get("__link")}
             singlechatmap = {x["identity"]: x["id"] for x in chats
                              if CHATS_TYPE_SINGLE == x["type"]}
+        for chat in chats:
+            for p in chat["participants"]:
+                chatidmap.setdefault(p["identity"], set()).add(chat["id"])
+        if conf.ShareDirectoryEnabled and contacts:
+            filecounts = self.get_shared_files_counts()
         for contact in contacts:
             contact["first_message_datetime"] = None
             contact["last_message_datetime"] = None
             contact["message_count_single"] = 0
             contact["message_count_group"] = 0
             contact["conversations"] = []
-            chatids = set(c["id"] for c in chats if any(
-                contact["identity"] == p["identity"] for p in c["participants"]
-            ))
+            chatids = set(chatidmap.get(contact["identity"], ()))
             if conf.ShareDirectoryEnabled:
-                contact["shared_files_count"] = self.get_shared_files_count(contacts=[contact])
+                contact["shared_files_count"] = sum(filecounts.values()) \
+                    if self.id == contact["identity"] else filecounts.get(contact["identity"], 0)
             datas, datas2 = stats.get(contact["identity"], []), []
             if not chatids and not datas: continue # for contact
 
             # First pass: add first/last message IDs, combine linked chats
             datamap = {x["id"]: x for x in datas}
             for data in datas:
-                data["first_message_id"] = firstmsgs[(data["id"], data["identity"])]["first_message_id"]
-                data["last_message_id"]  = lastmsgs [(data["id"], data["identity"])]["last_message_id"]
                 if data["id"] in linkedchatmap:
                     newid = linkedchatmap[data["id"]]
                     if newid in datamap:
                         data2 = datamap[newid]
-                        for n, f in zip(["message_count", "first_message_timestamp", "first_message_timestamp"],
+                        for n, f in zip(["message_count", "first_message_timestamp", "last_message_timestamp"],
                                         [sum, min, max]):
                             data2[n] = f(d.get(n) for d in (data, data2)) # Combine
                         for chatid in (data["id"], newid):
-                            firstdata = firstmsgs[(chatid, data["identity"])]
-                            if firstdata["first_message_timestamp"] == data2["first_message_timestamp"]:
-                                data2["first_message_id"] = firstdata["first_message_id"]
-                            lastdata = lastmsgs[(chatid, data["identity"])]
-                            if lastdata["last_message_timestamp"] == data2["last_message_timestamp"]:
-                                data2["last_message_id"] = lastdata["last_message_id"]
+                            msgdata = msgstats[(chatid, data["identity"])]
+                            if msgdata["first_message_timestamp"] == data2["first_message_timestamp"]:
+                                data2["first_message_id"] = msgdata["first_message_id"]
+                            if msgdata["last_message_timestamp"] == data2["last_message_timestamp"]:
+                                data2["last_message_id"] = msgdata["last_message_id"]
                         continue  # for data
                     else:
                         data = dict(data, id=newid)
@@ -1072,7 +1906,10 @@ class SkypeDatabase(object):
         result = []
         table = table.lower()
         if table in self.tables:
-            if reload or table not in self.table_rows:
+            rows = None if reload else self.table_cache.get(table)
+            if rows is None and not reload and "messages" != table:
+                rows = self.table_rows.get(table)
+            if rows is None:
                 col_data = self.get_table_columns(table)
                 pks = [c["name"] for c in col_data if c["pk"]]
                 pk = pks[0] if len(pks) == 1 else None
@@ -1082,8 +1919,9 @@ class SkypeDatabase(object):
                 if pk:
                     for row in result:
                         self.table_objects[table][row[pk]] = row
+                self.table_cache[table] = result
             else:
-                result = self.table_rows[table][:]
+                result = rows[:]
         return result
 
 
@@ -1092,6 +1930,7 @@ class SkypeDatabase(object):
         Returns all the SMSes in the database.
         Uses already retrieved cached values if possible.
         """
+        smses = []
         if self.is_open() and "smses" in self.tables:
             if "smses" not in self.table_rows:
                 rows = self.execute("SELECT * FROM smses ORDER BY id").fetchall()
@@ -1116,6 +1955,31 @@ class SkypeDatabase(object):
         return transfers
 
 
+    def get_message_smses(self, message):
+        """
+        Returns the SMSes of the SMS message.
+        Uses a cached index on SMSes.chatmsg_id, built on first call.
+        """
+        if "smses" not in self.table_indexes:
+            index = collections.defaultdict(list)
+            for s in self.get_smses(): index[s["chatmsg_id"]].append(s)
+            self.table_indexes["smses"] = dict(index)
+        return self.table_indexes["smses"].get(message["id"], [])[:]
+
+
+    def get_message_transfers(self, message):
+        """
+        Returns the transfers of the file message, ordered by chatmsg_index.
+        Uses a cached index on Transfers.chatmsg_guid, built on first call.
+        """
+        if "transfers" not in self.table_indexes:
+            index = collections.defaultdict(list)
+            for t in self.get_transfers(): index[t["chatmsg_guid"]].append(t)
+            for x in index.values(): x.sort(key=lambda t: t["chatmsg_index"] or 0)
+            self.table_indexes["transfers"] = dict(index)
+        return self.table_indexes["transfers"].get(message["guid"], [])[:]
+
+
     def get_videos(self, chat=None):
         """
         Returns all valid video rows in the database (with a matching row in
@@ -1235,12 +2099,82 @@ class SkypeDatabase(object):
 
 
     def ensure_backup(self):
-        """Creates a backup file if configured so, and not already created."""
-        if conf.DBDoBackup:
+        """
+        Creates a backup file if configured so, and not already created,
+        before the first write: starts backup if not yet running,
+        and waits for it to complete, via self.backup_wait if set,
+        raising RuntimeError if waiting was cancelled.
+        Checks only once within a bulk write session.
+        """
+        if conf.DBDoBackup and not self.readonly:
+            if self.bulk_session and self.bulk_session["backup"]: return
             if (not self.backup_created
             or not os.path.exists("%s.bak" % self.filename)):
-                shutil.copyfile(self.filename, "%s.bak" % self.filename)
-                self.backup_created = True
+                session = self.start_backup(self.backup_progress)
+                if session and not session["done"]:
+                    if not self.backup_wait: session["thread"].join()
+                    elif not self.backup_wait(session):
+                        raise RuntimeError("Cancelled waiting for backup of %s." % self.filename)
+                if session and session["error"]: six.reraise(*session["error"])
+            if self.bulk_session: self.bulk_session["backup"] = True
+
+
+    def start_backup(self, progress=None):
+        """
+        Starts creating a backup file in a background thread, if configured so
+        and not already created or running. Uses SQLite online backup API,
+        copying conf.DBBackupPageBatch pages at a time; backup restarts
+        automatically if database is modified by another connection mid-copy.
+
+        @param   progress  callback(copied=, total=) invoked after each batch,
+                           and with done=True and error=exception or None at end
+        @return            backup session {"thread", "copied", "total", "done", "error"},
+                           or None if backup not configured or already created
+        """
+        with self.backup_lock:
+            session = self.backup_session
+            if not conf.DBDoBackup or self.readonly or not self.is_open(): return None
+            if session and (not session["done"] or session["error"] is None
+                            and os.path.exists("%s.bak" % self.filename)):
+                return session
+            session = self.backup_session = {"copied": 0, "total": None, "done": False,
+                                             "error": None, "cancel": False}
+            session["thread"] = threading.Thread(target=self._run_backup,
+                                                 args=(session, progress))
+            session["thread"].daemon = True
+            session["thread"].start()
+        return session
+
+
+    def _run_backup(self, session, progress=None):
+        """Creates backup file, carrying out start_backup() in background thread."""
+        path = "%s.bak" % self.filename
+        tmppath = "%s.tmp" % path
+
+        def on_step(status, remaining, total):
+            if session["cancel"]: raise RuntimeError("Backup cancelled.")
+            session["copied"], session["total"] = total - remaining, total
+            if progress: progress(copied=total - remaining, total=total)
+
+        logger.info("Creating backup %s.", path)
+        try:
+            if hasattr(sqlite3.Connection, "backup"): # Py3.7+
+                util.try_ignore(os.unlink, tmppath)
+                source, target = sqlite3.connect(self.filename), sqlite3.connect(tmppath)
+                try: source.backup(target, pages=max(1, conf.DBBackupPageBatch), progress=on_step)
+                finally:
+                    source.close()
+                    target.close()
+            else: shutil.copyfile(self.filename, tmppath)
+            if not hasattr(os, "replace"): util.try_ignore(os.unlink, path) # Py2
+            getattr(os, "replace", os.rename)(tmppath, path)
+            self.backup_created = True
+        except Exception:
+            session["error"] = sys.exc_info()
+            util.try_ignore(os.unlink, tmppath)
+            if not session["cancel"]: logger.exception("Error creating backup %s.", path)
+        session["done"] = True
+        if progress: progress(done=True, error=session["error"] and session["error"][1])
 
 
     def ensure_schema(self, create_only=False):
@@ -1270,8 +2204,8 @@ class SkypeDatabase(object):
 
 
     def ensure_internal_schema(self):
-        """Adds Skyperious schema tables and columns not present."""
-        if not self.is_open(): return
+        """Adds Skyperious schema tables and columns not present, unless read-only."""
+        if not self.is_open() or self.readonly: return
         if all(t in self.tables for t in self.INTERNAL_CREATE_STATEMENTS): return
         self.get_tables()
         refresh = []
@@ -1289,6 +2223,7 @@ class SkypeDatabase(object):
         @param   reload  whether to requery from database
         """
         self.ensure_internal_schema()
+        if "_options_" not in self.tables: return None
         if reload or "_options_" not in self.table_objects:
             self.get_table_rows("_options_", reload=True)
         return self.table_objects["_options_"].get(name, {}).get("value")
@@ -1308,6 +2243,219 @@ class SkypeDatabase(object):
         self.get_internal_option(name, reload=True) # Update cache
 
 
+    def is_search_index_supported(self):
+        """Returns whether the SQLite library in use supports FTS5 full-text search."""
+        if not self.is_open(): return False
+        rows = self.execute("PRAGMA compile_options", log=False).fetchall()
+        return any("ENABLE_FTS5" == x["compile_options"] for x in rows)
+
+
+    def has_search_index(self, complete=True):
+        """
+        Returns whether database has full-text search index over message texts.
+
+        @param   complete  whether index must be fully built and up to date
+                           with messages, or can be partial
+        """
+        if not self.is_open() or self.SEARCH_INDEX_TABLE not in self.tables:
+            return False
+        if not complete: return True
+        if not self.get_internal_option("SearchIndexComplete"): return False
+        # Check for messages added outside of Skyperious
+        sql = "SELECT MAX(id) AS id FROM messages WHERE type IN (%s)" % \
+              ", ".join(map(str, MESSAGE_TYPES_MESSAGE))
+        maxid1 = self.execute(sql, log=False).fetchone()["id"]
+        sql = "SELECT MAX(rowid) AS id FROM %s" % self.SEARCH_INDEX_TABLE
+        maxid2 = self.execute(sql, log=False).fetchone()["id"]
+        return maxid1 == maxid2
+
+
+    def build_search_index(self, progress=None):
+        """
+        Creates full-text search index over message plain texts, or completes
+        a partially built or outdated index, committing after every chunk.
+
+        @param   progress  callback(index=, count=) to report progress with,
+                           returning false if indexing should cancel
+        @return            whether index was completed
+        """
+        if not self.is_open() or "messages" not in self.tables: return False
+        self.ensure_backup()
+        self.ensure_internal_schema()
+        if self.SEARCH_INDEX_TABLE not in self.tables:
+            logger.info("Creating full-text search index in %s.", self.filename)
+            self.create_table(self.SEARCH_INDEX_TABLE,
+                              self.SEARCH_INDEX_CREATE_STATEMENT)
+            self.get_tables(refresh=True, this_table=self.SEARCH_INDEX_TABLE)
+
+        self.set_internal_option("SearchIndexComplete", None)
+        self._update_search_index(purge=True)
+        ids, result = self._get_search_index_missing(), True
+        logger.info("Indexing %s for full-text search in %s.",
+                    util.plural("message", ids), self.filename)
+        for i in range(0, len(ids), 999):
+            if progress and not progress(index=i, count=len(ids)):
+                result = False
+                break # for i
+            self._update_search_index(ids[i:i + 999])
+            self.connection.commit()
+        if result:
+            self.set_internal_option("SearchIndexComplete", 1)
+            if progress: progress(index=len(ids), count=len(ids))
+        self.get_tables(refresh=True, this_table=self.SEARCH_INDEX_TABLE)
+        return result
+
+
+    def drop_search_index(self):
+        """Drops full-text search index from database, if present."""
+        if not self.is_open() or self.SEARCH_INDEX_TABLE not in self.tables:
+            return
+        logger.info("Dropping full-text search index from %s.", self.filename)
+        self.ensure_backup()
+        self.execute("DROP TABLE %s" % self.SEARCH_INDEX_TABLE)
+        self.connection.commit()
+        self.set_internal_option("SearchIndexComplete", None)
+        self.get_tables(refresh=True)
+
+
+    def _get_search_index_missing(self):
+        """Returns IDs of messages not present in full-text search index."""
+        sql = "SELECT id FROM messages m WHERE type IN (%s) AND NOT EXISTS " \
+              "(SELECT 1 FROM %s WHERE rowid = m.id) ORDER BY id" % \
+              (", ".join(map(str, MESSAGE_TYPES_MESSAGE)), self.SEARCH_INDEX_TABLE)
+        return [x["id"] for x in self.execute(sql, log=False)]
+
+
+    def _update_search_index(self, ids=(), delete=(), purge=False):
+        """
+        Updates full-text search index for the specified messages, if index
+        present. Does not commit.
+
+        @param   ids     message IDs to (re)index
+        @param   delete  message IDs to drop from index
+        @param   purge   whether to drop index entries for messages no longer present
+        """
+        if not self.is_open() or self.SEARCH_INDEX_TABLE not in self.tables:
+            return
+        if purge:
+            self.execute("DELETE FROM %s WHERE rowid NOT IN (SELECT id FROM messages)"
+                         % self.SEARCH_INDEX_TABLE, log=False)
+
+        dels = list(ids) + list(delete)
+        for chunk in [dels[i:i+999] for i in range(0, len(dels), 999)]:
+            self.execute("DELETE FROM %s WHERE rowid IN (%s)" %
+                         (self.SEARCH_INDEX_TABLE, ", ".join("?" * len(chunk))),
+                         chunk, log=False)
+        parser, rows = MessageParser(self), []
+        for m in self.message_iterator(list(ids)):
+            try: text = parser.parse(m, output={"format": "text"})
+            except Exception: text = m["body_xml"]
+            rows.append((m["id"], text or ""))
+        if rows:
+            self.executemany("INSERT INTO %s (rowid, body) VALUES (?, ?)" %
+                             self.SEARCH_INDEX_TABLE, rows, log=False)
+
+
+    def get_optimize_indexes(self):
+        """Returns names of Skyperious optional indexes present in database."""
+        if not self.is_open() or "_options_" not in self.tables: return []
+        names = json.loads(self.get_internal_option("OptimizeIndexes") or "[]")
+        sql = "SELECT name FROM sqlite_master WHERE type = 'index'"
+        existing = set(x["name"] for x in self.execute(sql, log=False))
+        return [x for x in names if x in existing]
+
+
+    def get_optimize_queries(self):
+        """
+        Returns standard queries for timing database optimization,
+        as [(title, SQL)] for tables present in database.
+        """
+        result = []
+        if not self.is_open(): return result
+        types = ", ".join(map(str, MESSAGE_TYPES_MESSAGE))
+        if "messages" in self.tables:
+            result += [
+                ("Chat history",
+                 "SELECT * FROM messages WHERE convo_id IN (SELECT convo_id FROM messages "
+                 "ORDER BY id DESC LIMIT 1) AND type IN (%s) ORDER BY timestamp" % types),
+                ("Chat statistics",
+                 "SELECT convo_id, COUNT(*), MIN(timestamp), MAX(timestamp) "
+                 "FROM messages WHERE type IN (%s) GROUP BY convo_id" % types),
+                ("Contact statistics",
+                 "SELECT convo_id, author, COUNT(*), MIN(timestamp), MAX(timestamp) "
+                 "FROM messages WHERE type IN (%s) GROUP BY convo_id, author" % types),
+            ]
+        if "transfers" in self.tables:
+            result += [("File transfers of message",
+                        "SELECT * FROM transfers WHERE chatmsg_guid IN (SELECT chatmsg_guid "
+                        "FROM transfers ORDER BY id DESC LIMIT 1) ORDER BY chatmsg_index")]
+        if "smses" in self.tables:
+            result += [("SMSes of message",
+                        "SELECT * FROM smses WHERE chatmsg_id IN "
+                        "(SELECT chatmsg_id FROM smses ORDER BY id DESC LIMIT 1)")]
+        if "_shared_files_" in self.tables:
+            result += [("Shared files of chat",
+                        "SELECT * FROM _shared_files_ WHERE convo_id IN "
+                        "(SELECT convo_id FROM _shared_files_ ORDER BY id DESC LIMIT 1)")]
+        return result
+
+
+    def optimize(self):
+        """
+        Creates Skyperious optional indexes for common queries, analyzes
+        database for query planner, and records created indexes in options.
+        Times standard queries before and after.
+
+        @return  {"indexes": [names of created indexes],
+                  "timings": [(query title, seconds before, seconds after)]}
+        """
+        result = {"indexes": [], "timings": []}
+        if not self.is_open(): return result
+
+        def timeit(sql):
+            start = time.time()
+            self.execute(sql, log=False).fetchall()
+            return time.time() - start
+
+        queries = self.get_optimize_queries()
+        timings1 = [timeit(sql) for _, sql in queries]
+
+        self.ensure_backup()
+        self.ensure_internal_schema()
+        self.get_tables(refresh=True)
+        names = self.get_optimize_indexes()
+        for name, table, cols in self.OPTIMIZE_INDEXES:
+            if table not in self.tables or name in names: continue # for name, ..
+            logger.info("Creating index %s on %s in %s.", name, table, self.filename)
+            self.execute("CREATE INDEX IF NOT EXISTS %s ON %s (%s)" % (name, table, cols))
+            result["indexes"].append(name)
+            names.append(name)
+        self.execute("ANALYZE")
+        self.connection.commit()
+        self.set_internal_option("OptimizeIndexes", json.dumps(names) if names else None)
+
+        timings2 = [timeit(sql) for _, sql in queries]
+        result["timings"] = [(t, a, b) for (t, _), a, b in zip(queries, timings1, timings2)]
+        return result
+
+
+    def drop_optimize_indexes(self):
+        """
+        Drops Skyperious optional indexes recorded in options.
+
+        @return  names of dropped indexes
+        """
+        names = self.get_optimize_indexes()
+        if not names: return names
+        self.ensure_backup()
+        for name in names:
+            logger.info("Dropping index %s from %s.", name, self.filename)
+            self.execute("DROP INDEX IF EXISTS %s" % name)
+        self.connection.commit()
+        self.set_internal_option("OptimizeIndexes", None)
+        return names
+
+
     def get_share_path(self):
         """Gets absolute path of local shared files path for this database as configured."""
         path = self.get_internal_option("ShareDirectory")
@@ -1318,16 +2466,60 @@ class SkypeDatabase(object):
         return path
 
 
-    def get_shared_file(self, msg_id):
-        """Returns data dictionary of shared file in conversation, or None if no such."""
+    def get_shared_file(self, msg_id, convo_id=None):
+        """
+        Returns data dictionary of shared file in conversation, or None if no such.
+
+        @param   convo_id  message chat ID, skips querying database if chat shared files
+                           have been prefetched
+        """
         self.ensure_internal_schema()
-        if msg_id not in self.table_objects.get("_shared_files_", {}):
+        if msg_id not in self.table_objects.get("_shared_files_", {}) \
+        and convo_id not in self.shared_files_chats and "_shared_files_" in self.tables:
             row = next(self.execute("SELECT * FROM _shared_files_ WHERE msg_id = ?", [msg_id]), None)
             if row:
                 self.table_objects.setdefault("_shared_files_", {})[msg_id] = row
         return self.table_objects.get("_shared_files_", {}).get(msg_id)
 
 
+    def prefetch_shared_files(self, chat):
+        """
+        Retrieves all shared file rows of chat into cache in one query,
+        and takes a snapshot listing of the shared files directory.
+
+        @param   chat  chat data dictionary, with optional "__link"
+        @return        [{.._shared_files_ row..}, ]
+        """
+        result = []
+        if not self.is_open() or not chat: return result
+        ids = [c["id"] for c in (chat, chat.get("__link")) if c]
+        if "_shared_files_" in self.tables:
+            cache = self.table_objects.setdefault("_shared_files_", {})
+            sql = "SELECT * FROM _shared_files_ WHERE convo_id IN (%s)" % ", ".join(map(str, ids))
+            for row in self.execute(sql):
+                cache[row["msg_id"]] = row
+                result.append(row)
+        self.shared_files_chats.update(ids)
+
+        directory = self.get_share_path()
+        names = set(map(os.path.normcase, os.listdir(directory))) \
+                if os.path.isdir(directory) else set()
+        self.share_listing = (directory, names)
+        return result
+
+
+    def shared_file_exists(self, path):
+        """
+        Returns whether shared file exists on disk, checking share directory files
+        against snapshot listing from last prefetch_shared_files() if available.
+        """
+        if not path: return False
+        directory, names = self.share_listing or (None, None)
+        if directory is not None and os.path.dirname(path) == directory:
+            return os.path.normcase(os.path.basename(path)) in names
+        return os.path.isfile(path)
+
+
     def get_shared_file_content(self, msg_id):
         """Returns shared file raw binary from share folder, or None if no such."""
         path = self.get_shared_file_path(msg_id)
@@ -1340,9 +2532,14 @@ class SkypeDatabase(object):
         return None
 
 
-    def get_shared_file_path(self, msg_id):
-        """Returns absolute calculated path of shared file, whether on disk or not."""
-        data = self.get_shared_file(msg_id)
+    def get_shared_file_path(self, msg_id, convo_id=None):
+        """
+        Returns absolute calculated path of shared file, whether on disk or not.
+
+        @param   convo_id  message chat ID, skips querying database if chat shared files
+                           have been prefetched
+        """
+        data = self.get_shared_file(msg_id, convo_id)
         if not data: return None
         path = data["filepath"]
         if not os.path.isabs(path):
@@ -1369,7 +2566,7 @@ class SkypeDatabase(object):
 
         total = 0
         directory = self.get_share_path()
-        if os.path.isdir(directory) and os.listdir(directory):
+        if "_shared_files_" in self.tables and os.path.isdir(directory) and os.listdir(directory):
             for row in self.execute("SELECT filepath FROM %s" % table_expr):
                 filepath = row["filepath"]
                 if not os.path.isabs(filepath):
@@ -1378,6 +2575,32 @@ class SkypeDatabase(object):
         return total
 
 
+    def get_shared_files_counts(self):
+        """
+        Returns the number of shared files on disk per author,
+        checking files against a single listing of the share directory.
+
+        @return  {author: count}
+        """
+        result = {}
+        directory = self.get_share_path()
+        if not os.path.isdir(directory) or "_shared_files_" not in self.tables:
+            return result
+        names = set(map(os.path.normcase, os.listdir(directory)))
+        if not names: return result
+
+        sql = "SELECT author, filepath FROM _shared_files_"
+        for row in self.execute(sql):
+            filepath = row["filepath"]
+            if os.path.isabs(filepath) or os.path.basename(filepath) != filepath:
+                if not os.path.isabs(filepath):
+                    filepath = os.path.join(directory, filepath)
+                exists = os.path.exists(filepath)
+            else: exists = os.path.normcase(filepath) in names
+            if exists: result[row["author"]] = result.get(row["author"], 0) + 1
+        return result
+
+
     def store_shared_file(self, message, content, data):
         """
         Saves file or media shared in message; replaces existing data if present.
@@ -1386,6 +2609,7 @@ class SkypeDatabase(object):
         @param   data     file metadata dictionary, as {?filename, ?docid, ?category, ?mimetype}
         @return           shared file ID, or None on failure
         """
+        if self.readonly: return None
         filedata0 = self.get_shared_file(message["id"])
 
         basename = data.get("filename")
@@ -1400,6 +2624,8 @@ class SkypeDatabase(object):
             outpath0 = self.get_shared_file_path(message["id"])
             try: os.unlink(outpath0)
             except Exception: pass
+            if self.share_listing:
+                self.share_listing[1].discard(os.path.normcase(os.path.basename(outpath0)))
         directory = self.get_share_path()
         outpath = util.unique_path(os.path.join(directory, basename))
         basename = os.path.basename(outpath)
@@ -1423,8 +2649,12 @@ class SkypeDatabase(object):
             filedata.update(mimetype=util.get_mime_type(content, data.get("category"), basename))
         if filedata0:
             self.update_row("_shared_files_", filedata, filedata0)
-            return filedata0["id"]
-        else: return self.insert_row("_shared_files_", filedata)
+            filedata = dict(filedata0, **filedata)
+        else: filedata["id"] = self.insert_row("_shared_files_", filedata)
+        self.table_objects.setdefault("_shared_files_", {})[message["id"]] = filedata
+        if self.share_listing and self.share_listing[0] == directory:
+            self.share_listing[1].add(os.path.normcase(basename))
+        return filedata["id"]
 
 
     def delete_shared_files(self, chats=None, contacts=None):
@@ -1463,7 +2693,7 @@ class SkypeDatabase(object):
         count_rows = self.execute("DELETE FROM _shared_files_ WHERE id IN "
                                   "(SELECT _shared_files_.id FROM %s)" % table_expr,
                                   log=True).rowcount
-        self.connection.commit()
+        self.commit(count=count_rows)
         self.last_modified = datetime.datetime.now()
         if count_files_deleted:
             logger.info("Deleted %s from disk.", util.plural("shared file", count_files_deleted))
@@ -1471,6 +2701,7 @@ class SkypeDatabase(object):
             try: os.rmdir(directory)
             except Exception as e: logger.warning("Error deleting %s: %s", directory, e)
             else: logger.info("Deleted empty shared files folder %s.", directory)
+        self.clear_cache_rows("_shared_files_")
         return count_rows
 
 
@@ -1510,6 +2741,7 @@ class SkypeDatabase(object):
             if os.path.isdir(path1) and not os.listdir(path1):
                 try: os.rmdir(path1)
                 except Exception as e: logger.warning("Error deleting %s: %s", path1, e)
+        self.clear_cache_rows("_shared_files_")
 
         if path and os.path.isabs(path):
             dbdir = os.path.dirname(self.filename) + os.sep
@@ -1523,22 +2755,34 @@ class SkypeDatabase(object):
         Converts blob columns in the list to sqlite3.Binary, suitable
         for using as a query parameter.
         """
-        result = []
-        is_dict = isinstance(values, dict)
-        list_values = [values[i] for i in list_columns] if is_dict else values
+        return self.make_blob_converter(list_columns, col_data)(values)
+
+
+    def make_blob_converter(self, list_columns, col_data):
+        """
+        Returns a function converting blob columns in a list or dict of
+        values to sqlite3.Binary, as blobs_to_binary() with column types
+        resolved once, for converting many rows.
+        """
         map_columns = dict([(i["name"], i) for i in col_data])
-        for i, val in enumerate(list_values):
-            if "blob" == map_columns[list_columns[i]]["type"].lower() and val:
-                if isinstance(val, six.text_type):
-                    try:
-                        val = val.encode("latin1")
-                    except Exception:
-                        val = val.encode("utf-8")
-                val = sqlite3.Binary(val)
-            result.append(val)
-        if is_dict:
-            result = dict([(list_columns[i], x) for i, x in enumerate(result)])
-        return result
+        blob_indexes = [i for i, c in enumerate(list_columns)
+                        if "blob" == map_columns[c]["type"].lower()]
+
+        def to_binary(val):
+            if isinstance(val, six.text_type):
+                try:
+                    val = val.encode("latin1")
+                except Exception:
+                    val = val.encode("utf-8")
+            return sqlite3.Binary(val)
+
+        def convert(values):
+            is_dict = isinstance(values, dict)
+            result = [values[c] for c in list_columns] if is_dict else list(values)
+            for i in blob_indexes:
+                if i < len(result) and result[i]: result[i] = to_binary(result[i])
+            return dict(zip(list_columns, result)) if is_dict else result
+        return convert
 
 
     def fill_missing_fields(self, data, fields):
@@ -1579,7 +2823,7 @@ class SkypeDatabase(object):
 
             cursor = self.execute("INSERT INTO conversations (%s) VALUES (%s)"
                                   % (str_cols, str_vals), chat_filled)
-            self.connection.commit()
+            self.commit([chat_filled])
             self.last_modified = datetime.datetime.now()
             return cursor.lastrowid
 
@@ -1591,6 +2835,9 @@ class SkypeDatabase(object):
         database, includes related rows in Calls, Videos, Transfers and
         SMSes.
 
+        Messages and related rows are inserted in batches
+        of conf.MergeInsertChunk.
+
         @param    messages      list of messages, or message IDs from source_db
         @param    shared_files  list of shared file data dictionaries
         @param    heartbeat     function called after every @beatcount message
@@ -1625,91 +2872,107 @@ class SkypeDatabase(object):
                 for i in self.execute("SELECT name FROM chats")])
             filemap = {f["msg_id"]: f for f in shared_files or ()}
             col_data = self.get_table_columns("messages")
-            fields = [col["name"] for col in col_data if col["name"] != "id"]
-            str_cols = ", ".join(fields)
-            str_vals = ":" + ", :".join(fields)
+            fields = ["id"] + [col["name"] for col in col_data if col["name"] != "id"]
+            msg_sql = "INSERT INTO messages (%s) VALUES (%s)" % \
+                      (", ".join(fields), ", ".join("?" * len(fields)))
             transfer_col_data = self.get_table_columns("transfers")
             transfer_fields = [col["name"] for col in transfer_col_data
                                if col["name"] != "id"]
-            transfer_cols = ", ".join(transfer_fields)
-            transfer_vals = ", ".join("?" * len(transfer_fields))
+            transfer_sql = "INSERT INTO transfers (%s) VALUES (%s)" % \
+                           (", ".join(transfer_fields), ", ".join("?" * len(transfer_fields)))
             sms_col_data = self.get_table_columns("smses")
             sms_fields = [col["name"] for col in sms_col_data
                           if col["name"] != "id"]
-            sms_cols = ", ".join(sms_fields)
-            sms_vals = ", ".join("?" * len(sms_fields))
+            sms_sql = "INSERT INTO smses (%s) VALUES (%s)" % \
+                      (", ".join(sms_fields), ", ".join("?" * len(sms_fields)))
             chat_col_data = self.get_table_columns("chats")
             chat_fields = [col["name"] for col in chat_col_data
                            if col["name"] not in ("id", "conv_dbid")]
-            chat_cols = ", ".join(chat_fields + ["conv_dbid"])
-            chat_vals = ", ".join("?" * (len(chat_fields) + 1))
-
-            timestamp_earliest = source_chat["creation_timestamp"] or sys.maxsize
-
-            for i, m in enumerate(source_db.message_iterator(messages)):
-                # Insert corresponding Chats entry, if not present
-                if m["chatname"] not in chatrows_present and m["chatname"] in chatrows_source:
-                    chatrowdata = chatrows_source[m["chatname"]]
-                    chatrow = [chatrowdata.get(col, "") for col in chat_fields]
-                    chatrow = self.blobs_to_binary(
-                        chatrow, chat_fields, chat_col_data)
-                    chatrow.append(chat["id"]) # For conv_dbid
-                    sql = "INSERT INTO chats (%s) VALUES (%s)" % \
-                          (chat_cols, chat_vals)
-                    self.execute(sql, chatrow)
-                    chatrows_present[m["chatname"]] = 1
-                m_filled = self.fill_missing_fields(m, fields)
-                m_filled["convo_id"] = chat["id"]
-                # Ensure correct author if merge from other account
-                if m["author"] and m["author"] in (self.username, source_db.id, source_db.username):
-                    m_filled["author"] = self.id
-                m_filled = self.blobs_to_binary(m_filled, fields, col_data)
-                cursor = self.execute("INSERT INTO messages (%s) VALUES (%s)"
-                                      % (str_cols, str_vals), m_filled)
-                m_id = cursor.lastrowid
-                if MESSAGE_TYPE_FILE == m["type"] and "transfers" in source_db.tables:
-                    transfers = [t for t in source_db.get_transfers()
-                                 if t.get("chatmsg_guid") == m["guid"]]
-                    if transfers:
-                        sql = "INSERT INTO transfers (%s) VALUES (%s)" % \
-                              (transfer_cols, transfer_vals)
-                        transfers.sort(key=lambda x: x.get("chatmsg_index"))
-                        for t in map(dict.copy, transfers):
+            chat_sql = "INSERT INTO chats (%s) VALUES (%s)" % \
+                       (", ".join(chat_fields + ["conv_dbid"]),
+                        ", ".join("?" * (len(chat_fields) + 1)))
+            convert = self.make_blob_converter(fields, col_data)
+            convert_transfer = self.make_blob_converter(transfer_fields, transfer_col_data)
+            convert_sms = self.make_blob_converter(sms_fields, sms_col_data)
+            convert_chat = self.make_blob_converter(chat_fields, chat_col_data)
+            pos_convo, pos_author = fields.index("convo_id"), fields.index("author")
+            authors_source = (source_db.id, source_db.username)
+            has_transfers = "transfers" in source_db.tables
+            has_smses = "smses" in source_db.tables
+
+            with self.bulk_write(atomic=True):
+                # New IDs are assigned up front as SQLite would, so that related
+                # rows can be mapped to them without a query per message;
+                # write lock is held from here until commit, for no other writer
+                # to take the same IDs meanwhile.
+                sql = "SELECT COALESCE(MAX(id), 0) AS id FROM messages"
+                next_id = self.execute(sql, log=False).fetchone()["id"] + 1
+                timestamp_earliest = source_chat["creation_timestamp"] or sys.maxsize
+                chunk = max(1, conf.MergeInsertChunk)
+                msg_rows, transfer_rows, sms_rows, file_rows = [], [], [], []
+
+                def flush():
+                    """Inserts accumulated rows in bulk and clears them."""
+                    if msg_rows:      self.executemany(msg_sql,      msg_rows)
+                    if transfer_rows: self.executemany(transfer_sql, transfer_rows)
+                    if sms_rows:      self.executemany(sms_sql,      sms_rows)
+                    if file_rows:
+                        self.insert_shared_files(chat, file_rows, source_db, heartbeat, beatcount)
+                    for x in (msg_rows, transfer_rows, sms_rows, file_rows): del x[:]
+
+                for i, m in enumerate(source_db.message_iterator(messages)):
+                    # Insert corresponding Chats entry, if not present
+                    if m["chatname"] not in chatrows_present and m["chatname"] in chatrows_source:
+                        chatrowdata = chatrows_source[m["chatname"]]
+                        chatrow = convert_chat([chatrowdata.get(col, "") for col in chat_fields])
+                        chatrow.append(chat["id"]) # For conv_dbid
+                        self.execute(chat_sql, chatrow)
+                        chatrows_present[m["chatname"]] = 1
+                    m_id, next_id = next_id, next_id + 1
+                    row = [m_id] + [m.get(col) for col in fields[1:]]
+                    row[pos_convo] = chat["id"]
+                    # Ensure correct author if merge from other account
+                    if m["author"] and (m["author"] == self.username
+                                        or m["author"] in authors_source):
+                        row[pos_author] = self.id
+                    msg_rows.append(convert(row))
+                    if MESSAGE_TYPE_FILE == m["type"] and has_transfers:
+                        for t in source_db.get_message_transfers(m):
                             # pk_id and nodeid are troublesome, ditto in SMSes,
                             # because their meaning is unknown - will
                             # something go out of sync if their values differ?
-                            if t["partner_handle"] == source_db.id:
-                                t["partner_handle"] = self.id
                             row = [t.get(col, "") if col != "convo_id" else chat["id"]
                                    for col in transfer_fields]
-                            row = self.blobs_to_binary(row, transfer_fields, transfer_col_data)
-                            self.execute(sql, row)
-                if MESSAGE_TYPE_SMS == m["type"] and "smses" in source_db.tables:
-                    smses = [s for s in source_db.get_smses()
-                             if s.get("chatmsg_id") == m["id"]]
-                    if smses:
-                        sql = "INSERT INTO smses (%s) VALUES (%s)" % (sms_cols, sms_vals)
-                        for sms in smses:
-                            t = [sms.get(col, "") if col != "chatmsg_id" else m_id
-                                 for col in sms_fields]
-                            t = self.blobs_to_binary(t, sms_fields, sms_col_data)
-                            self.execute(sql, t)
-                if m["id"] in filemap:
-                    self.insert_shared_files(chat, [dict(filemap[m["id"]], msg_id2=m_id)],
-                                             source_db, heartbeat, beatcount)
-                timestamp_earliest = min(timestamp_earliest, m["timestamp"])
-                result.append(m_id)
-                if heartbeat and beatcount and i and not i % beatcount:
-                    heartbeat()
-            if (timestamp_earliest and chat["creation_timestamp"]
-            and chat["creation_timestamp"] > timestamp_earliest):
-                # Conversations.creation_timestamp must not be later than the
-                # oldest message, Skype will not show messages older than that.
-                chat["creation_timestamp"] = timestamp_earliest
-                chat["created_datetime"] = self.stamp_to_date(timestamp_earliest)
-                self.execute("UPDATE conversations SET creation_timestamp = "
-                             ":creation_timestamp WHERE id = :id", chat)
-            self.connection.commit()
+                            if t["partner_handle"] == source_db.id:
+                                row[transfer_fields.index("partner_handle")] = self.id
+                            transfer_rows.append(convert_transfer(row))
+                    if MESSAGE_TYPE_SMS == m["type"] and has_smses:
+                        for sms in source_db.get_message_smses(m):
+                            row = [sms.get(col, "") if col != "chatmsg_id" else m_id
+                                   for col in sms_fields]
+                            sms_rows.append(convert_sms(row))
+                    if m["id"] in filemap:
+                        file_rows.append(dict(filemap[m["id"]], msg_id2=m_id))
+                    timestamp_earliest = min(timestamp_earliest, m["timestamp"])
+                    result.append(m_id)
+                    if len(msg_rows) >= chunk:
+                        flush()
+                    if heartbeat and beatcount and i and not i % beatcount:
+                        heartbeat()
+                flush()
+                if (timestamp_earliest and chat["creation_timestamp"]
+                and chat["creation_timestamp"] > timestamp_earliest):
+                    # Conversations.creation_timestamp must not be later than the
+                    # oldest message, Skype will not show messages older than that.
+                    chat["creation_timestamp"] = timestamp_earliest
+                    chat["created_datetime"] = self.stamp_to_date(timestamp_earliest)
+                    self.execute("UPDATE conversations SET creation_timestamp = "
+                                 ":creation_timestamp WHERE id = :id", chat)
+                for table in ("transfers", "smses"):
+                    if table in self.table_indexes: self.clear_cache_rows(table)
+                self._update_search_index(result)
+                self.update_message_stats()
+                self.commit(count=len(result))
             self.last_modified = datetime.datetime.now()
         return result
 
@@ -1761,22 +3024,23 @@ class SkypeDatabase(object):
             fields = [col["name"] for col in col_data if col["name"] != "id"]
             str_cols = ", ".join(fields)
             str_vals = ":" + ", :".join(fields)
-            contacts = []
+            contacts, rows = [], []
             existing = {c["identity"] for c in self.get_contacts()}
 
             for p in participants:
                 p_filled = self.fill_missing_fields(p, fields)
                 p_filled = self.blobs_to_binary(p_filled, fields, col_data)
                 p_filled["convo_id"] = chat["id"]
-                self.execute("INSERT INTO participants (%s) VALUES (%s)" % (
-                    str_cols, str_vals
-                ), p_filled)
+                rows.append(p_filled)
                 if p.get("contact") and p["contact"].get("identity") \
                 and p["contact"]["identity"] not in existing:
                     contacts.append(p["contact"])
+            self.executemany("INSERT INTO participants (%s) VALUES (%s)" % (
+                str_cols, str_vals
+            ), rows)
 
             if contacts: self.insert_contacts(contacts, source_db)
-            self.connection.commit()
+            self.commit(count=len(participants))
             self.last_modified = datetime.datetime.now()
 
 
@@ -1808,7 +3072,7 @@ class SkypeDatabase(object):
             self.execute("INSERT INTO accounts (%s) VALUES (%s)" % (
                 str_cols, str_vals
             ), a_filled)
-            self.connection.commit()
+            self.commit([a_filled])
             self.last_modified = datetime.datetime.now()
             self.account = a_filled
             self.id = a_filled["skypename"]
@@ -1841,7 +3105,7 @@ class SkypeDatabase(object):
                 self.table_rows.setdefault("contacts", []).append(c_filled)
                 self.table_objects.setdefault("contacts", {})[c_filled["id"]] = c_filled
             self.table_rows["contacts"].sort(key=lambda x: x.get("name"))
-            self.connection.commit()
+            self.commit(count=len(contacts))
 
             self.last_modified = datetime.datetime.now()
 
@@ -1878,14 +3142,16 @@ class SkypeDatabase(object):
                 c_filled = self.blobs_to_binary(c_filled, fields, col_data)
                 self.execute("INSERT INTO contactgroups (%s) VALUES (%s)" %
                              (str_cols, str_vals), c_filled)
-            self.connection.commit()
+            self.commit(count=len(groups))
             self.last_modified = datetime.datetime.now()
 
 
     def message_iterator(self, lst):
         """
         Yields message rows from the list. If the list consists of message IDs,
-        executes queries on the Messages table and yields result rows.
+        queries Messages table in one statement via a temporary table of the IDs,
+        and yields result rows ordered by timestamp. Temporary table is dropped
+        when generator is exhausted or closed.
         """
         if not lst:
             return
@@ -1893,26 +3159,158 @@ class SkypeDatabase(object):
             for m in lst:
                 yield m
         else:
-            for ids in [lst[i:i+999] for i in range(0, len(lst), 999)]:
-                # Divide into chunks: SQLite can take up to 999 parameters.
-                idstr = ", ".join(":id%s" % (j+1) for j in range(len(ids)))
-                s = "id IN (%s)" % idstr
-                p = dict(("id%s" % (j+1), x) for j, x in enumerate(ids))
-                res = self.get_messages(additional_sql=s, additional_params=p)
-                for m in res:
+            table, messages = self.create_temp_ids(lst), None
+            try:
+                messages = self.get_messages(additional_sql="m.id IN (SELECT id FROM %s)" % table)
+                for m in messages:
                     yield m
+            finally:
+                if messages is not None: messages.close() # Release statement reading table
+                self.drop_temp_ids(table)
 
 
-    def sort_message_ids(self, chat, *id_sequences):
-        """Returns a single list of all message IDs in ascending timestamp order."""
+    def get_message_fingerprints(self, chat, heartbeat=None, beatcount=None, changes=None,
+                                 ids=None):
+        """
+        Returns content fingerprints of chat messages for merge comparison,
+        as [{"id", "timestamp", "day", "author", "hash"}, ] ordered by timestamp,
+        where hash is of message text parsed for merge, and day is timestamp
+        in days since UNIX epoch. Skips messages without timestamp.
+
+        Fingerprints are cached in conf.FingerprintsFile, keyed by database file,
+        leaving database itself untouched. Messages are parsed only if new
+        or changed since last fingerprinting, in message fields
+        or in message file transfers or shared files.
+
+        @param    heartbeat  function called after every @beatcount parsed message
+        @param    beatcount  number of messages after which to call heartbeat
+        @param    changes    list to append new fingerprint rows to, instead of
+                             storing them, for store_message_fingerprints()
+        @param    ids        message IDs to return fingerprints for, if not all in chat
+        """
         result = []
-        ids = set(sum(map(list, id_sequences), []))
-        sql = "SELECT id FROM Messages WHERE convo_id = :id ORDER BY timestamp ASC"
-        for row in self.execute(sql, chat):
-            if row["id"] in ids: result.append(row["id"])
+        if not self.is_open() or "messages" not in self.tables:
+            return result
+
+        filters = [("convo_id", [x["id"] for x in (chat, chat.get("__link")) if x])]
+        if ids: filters.append((None, ids))
+        def make_where(idcol):
+            """Returns SQL WHERE for chat and message IDs, message ID column named idcol."""
+            return " AND ".join("%s IN (%s)" % (col or idcol, ", ".join(str(int(x)) for x in vals))
+                                for col, vals in filters)
+
+        fps = {} # {message ID: {fingerprints row}}
+        with self.fingerprint_cache() as cache:
+            if cache:
+                sql = "SELECT * FROM fingerprints WHERE file = ? AND %s" % make_where("msg_id")
+                try: fps = {x["msg_id"]: x for x in cache.execute(sql, [self.filename])}
+                except Exception:
+                    logger.exception("Error reading message fingerprints of %s from %s.",
+                                     self.filename, conf.FingerprintsFile)
+        sql = "SELECT id, convo_id, %s FROM messages WHERE %s " \
+              "AND type IN (%s) AND timestamp ORDER BY timestamp" % \
+              (", ".join(self.FINGERPRINT_FIELDS), make_where("id"),
+               ", ".join(map(str, MESSAGE_TYPES_MESSAGE)))
+        rows = self.execute(sql, log=False).fetchall()
+        files = collections.defaultdict(list) # {message ID: [_shared_files_ row, ]}
+        if "_shared_files_" in self.tables:
+            sql = "SELECT * FROM _shared_files_ WHERE %s ORDER BY id" % make_where("msg_id")
+            for f in self.execute(sql, log=False): files[f["msg_id"]].append(f)
+
+        fps_new = {} # {message ID: {fingerprints row}}
+        for m in rows:
+            data = "\x00".join(util.to_unicode(m[k]) for k in self.FINGERPRINT_FIELDS)
+            transfers = self.get_message_transfers(m) if m["guid"] else []
+            for f in transfers + files.get(m["id"], []):
+                data += "\x00" + "\x01".join(util.to_unicode(f[k]) for k in sorted(f))
+            body_hash = self.hash_text(data)
+            fp = fps.get(m["id"])
+            if not fp or fp["body_hash"] != body_hash or fp["convo_id"] != m["convo_id"]:
+                fp = fps_new[m["id"]] = {"msg_id": m["id"], "convo_id": m["convo_id"],
+                                         "body_hash": body_hash, "author": m["author"],
+                                         "day": int(m["timestamp"] // 86400)}
+            result.append({"id": m["id"], "timestamp": m["timestamp"], "day": fp["day"],
+                           "author": fp["author"], "hash": fp.get("text_hash")})
+
+        if fps_new:
+            parser = MessageParser(self)
+            parse_options = {"format": "text", "merge": True}
+            for i, m in enumerate(self.message_iterator(list(fps_new))):
+                t = util.to_unicode(parser.parse(m, output=parse_options), "utf-8")
+                fps_new[m["id"]]["text_hash"] = self.hash_text(t)
+                if heartbeat and beatcount and i and not i % beatcount:
+                    heartbeat()
+            for x in result:
+                if x["id"] in fps_new: x["hash"] = fps_new[x["id"]]["text_hash"]
+        if fps_new and changes is not None: changes.extend(fps_new.values())
+        elif fps_new: self.store_message_fingerprints(list(fps_new.values()))
         return result
 
 
+    def store_message_fingerprints(self, rows):
+        """
+        Stores message fingerprint rows in conf.FingerprintsFile, logging any error.
+        Also stores for read-only databases, as database itself is not modified.
+
+        @param   rows  [{"msg_id", "convo_id", "body_hash", "text_hash", "day", "author"}]
+        """
+        if not self.is_open() or not rows: return
+        with self.fingerprint_cache() as cache:
+            if not cache: return
+            try:
+                with cache:
+                    cache.executemany("INSERT OR REPLACE INTO fingerprints "
+                                      "(file, msg_id, convo_id, body_hash, text_hash, day, author) "
+                                      "VALUES (:file, :msg_id, :convo_id, :body_hash, "
+                                      ":text_hash, :day, :author)",
+                                      [dict(x, file=self.filename) for x in rows])
+            except Exception:
+                logger.exception("Error storing message fingerprints of %s in %s.",
+                                 self.filename, conf.FingerprintsFile)
+
+
+    @contextlib.contextmanager
+    def fingerprint_cache(self):
+        """
+        Context manager for a connection to message fingerprints cache
+        in conf.FingerprintsFile, created if not existing.
+        Yields None if cache could not be opened, logging the error.
+        """
+        cache = None
+        try:
+            path = conf.FingerprintsFile
+            if not os.path.exists(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            cache = sqlite3.connect(path, timeout=30)
+            cache.row_factory = lambda cursor, row: dict(zip([c[0] for c in cursor.description],
+                                                             row))
+            cache.execute("PRAGMA journal_mode = WAL")
+            cache.execute(self.FINGERPRINTS_CREATE_STATEMENT)
+        except Exception:
+            logger.exception("Error opening message fingerprints cache %s.",
+                             conf.FingerprintsFile)
+            if cache: util.try_ignore(cache.close)
+            cache = None
+        try: yield cache
+        finally:
+            if cache: util.try_ignore(cache.close)
+
+
+    @staticmethod
+    def hash_text(text):
+        """Returns a stable 60-bit integer hash of the text."""
+        return int(hashlib.md5(util.to_unicode(text).encode("utf-8")).hexdigest()[:15], 16)
+
+
+    def sort_message_ids(self, chat, *id_sequences):
+        """Returns a single list of all message IDs in ascending timestamp order."""
+        ids = set(x for xx in id_sequences for x in xx)
+        with self.temp_ids(ids) as table:
+            sql = "SELECT id FROM Messages WHERE convo_id = :id " \
+                  "AND id IN (SELECT id FROM %s) ORDER BY timestamp ASC" % table
+            return [row["id"] for row in self.execute(sql, chat)]
+
+
     def delete_data(self, conversations, contacts=()):
         """
         Deletes the specified conversations and contacts, and all their related data.
@@ -1987,8 +3385,8 @@ class SkypeDatabase(object):
         contacts      = sorted(contacts,      key=lambda x: x["name"].lower())
 
 
-        # [(table, "DELETE FROM ..")], {table}, {table: [where]}
-        sqls, clearables, deferreds = [], set(), collections.defaultdict(list)
+        # [(table, "DELETE FROM ..")], {table}, {table: [where]}, {(values): temporary table}
+        sqls, clearables, deferreds, temps = [], set(), collections.defaultdict(list), {}
         tables = [("Conversations", conversations, "title_long_lc"), ("Contacts", contacts, "name")]
         for table, deletables, labelcol in tables:
             if not deletables: continue # for table
@@ -2020,7 +3418,9 @@ class SkypeDatabase(object):
                 if "Conversations" == table:
                     svals.extend(y[del_alias(stable, scol)] for x in deletables
                                  for y in [x.get("__link")] if y)
-                val = ", ".join(str(v) for v in svals)
+                if tuple(svals) not in temps:
+                    temps[tuple(svals)] = self.create_temp_ids(svals)
+                val = "SELECT id FROM %s" % temps[tuple(svals)]
 
                 if len(path) != 2 and scol in REL_ALIASES.get(stable, {}): # One level of indirection
                     val = "SELECT %s FROM %s WHERE %s IN (%s)" % \
@@ -2040,17 +3440,23 @@ class SkypeDatabase(object):
 
         for table, col, wheres in ((k, DEFERRED[k], v) for k, v in deferreds.items()):
             selsql = "SELECT %s FROM %s WHERE %s" % (col, table, " OR ".join(wheres))
-            valstr = ", ".join(str(x[col]) for x in self.execute(selsql).fetchall())
-            if valstr:
-                sql = "DELETE FROM %s WHERE %s IN (%s)" % (table, col, valstr)
+            vals = tuple(x[col] for x in self.execute(selsql).fetchall())
+            if vals:
+                temps[vals] = temps.get(vals) or self.create_temp_ids(vals)
+                sql = "DELETE FROM %s WHERE %s IN (SELECT id FROM %s)" % (table, col, temps[vals])
                 sqls.append((table, sql))
 
         result["_shared_files_"] = self.delete_shared_files(chats=conversations, contacts=contacts)
-        for table, sql in sqls:
-            delcount = self.execute(sql, log=True).rowcount
-            if delcount:
-                logger.info("Deleted from %s: %s.", table, util.plural("row", delcount))
-                result[table] = delcount
+        try:
+            for table, sql in sqls:
+                delcount = self.execute(sql, log=True).rowcount
+                if delcount:
+                    logger.info("Deleted from %s: %s.", table, util.plural("row", delcount))
+                    result[table] = delcount
+        finally: self.drop_temp_ids(*temps.values())
+        if result.get("Messages"): self._update_search_index(purge=True)
+        if result.get("Messages"):
+            self.update_message_stats([c["id"] for c in conversations], reset=bool(contacts))
         self.connection.commit()
 
         identities = [c["identity"] for c in contacts]
@@ -2102,7 +3508,11 @@ class SkypeDatabase(object):
             return False # Sanity check: no primary key and no rowid
         self.execute("UPDATE %s SET %s WHERE %s" % (table, setsql, where),
                      values, log=log)
-        self.connection.commit()
+        if table in self.table_indexes: self.clear_cache_rows(table)
+        if "messages" == table:
+            self._update_search_index([original_row.get("id", rowid)])
+            self.mark_message_stats_dirty(original_row, row)
+        self.commit([{x["name"]: row[x["name"]] for x in col_data}])
         self.last_modified = datetime.datetime.now()
 
 
@@ -2127,7 +3537,9 @@ class SkypeDatabase(object):
         row = self.blobs_to_binary(row, fields, col_data)
         cursor = self.execute("INSERT INTO %s (%s) VALUES (%s)" %
                               (table, str_cols, str_vals), row, log=log)
-        self.connection.commit()
+        if table in self.table_indexes: self.clear_cache_rows(table)
+        if "messages" == table: self._update_search_index([cursor.lastrowid])
+        self.commit([row])
         self.last_modified = datetime.datetime.now()
         return cursor.lastrowid
 
@@ -2160,7 +3572,11 @@ class SkypeDatabase(object):
         if not where:
             return False # Sanity check: no primary key and no rowid
         self.execute("DELETE FROM %s WHERE %s" % (table, where), values, log=log)
-        self.connection.commit()
+        if table in self.table_indexes: self.clear_cache_rows(table)
+        if "messages" == table:
+            self._update_search_index(delete=[row.get("id", rowid)])
+            self.mark_message_stats_dirty(row)
+        self.commit()
         self.last_modified = datetime.datetime.now()
         return True
 
@@ -2249,6 +3665,7 @@ class MessageParser(object):
             expand_tabs=False, replace_whitespace=False,
             break_long_words=False, break_on_hyphens=False
         ).wrap # Text format output is wrapped with a fixed-width font
+        if chat and chat.get("id") is not None: db.prefetch_shared_files(chat)
         if stats:
             self.stats = {
                 "smses": 0, "transfers": [], "calls": 0, "messages": 0,
@@ -2392,14 +3809,13 @@ class MessageParser(object):
         elif MESSAGE_TYPE_FILE == message["type"] \
         or (MESSAGE_TYPE_INFO == message["type"]
         and "<files" in message["body_xml"]):
-            transfers = self.db.get_transfers()
-            files = dict((f["chatmsg_index"], dict(f)) for f in transfers
-                         if f["chatmsg_guid"] == message["guid"])
+            files = dict((f["chatmsg_index"], dict(f))
+                         for f in self.db.get_message_transfers(message))
 
             domfiles = {}
             localdata = None
             if not options.get("export") and not options.get("merge"):
-                localdata = self.db.get_shared_file(message["id"])
+                localdata = self.db.get_shared_file(message["id"], message.get("convo_id"))
 
             for f in dom.findall("*/file"):
                 domfiles[int(f.get("index"))] = domfile = {
@@ -2413,7 +3829,7 @@ class MessageParser(object):
                     "type": TRANSFER_TYPE_OUTBOUND}
                 if localdata: # Ok to be within loop: only early messages had multiple files
                     path = self.db.get_shared_file_path(message["id"])
-                    if os.path.isfile(path): domfile.update({
+                    if self.db.shared_file_exists(path): domfile.update({
                         "filepath": path, "filesize": localdata["filesize"], "url": None
                     })
             if files and domfiles:
@@ -2573,11 +3989,12 @@ class MessageParser(object):
 
         # Photo/video/file sharing: transform content, link to local file if available
         if any(dom.iter("URIObject")):
-            data = self.db.get_shared_file(message["id"]) or self.make_message_share_data(dom=dom)
+            data = self.db.get_shared_file(message["id"], message.get("convo_id")) \
+                   or self.make_message_share_data(dom=dom)
             if data:
                 data = dict(data)
                 path = self.db.get_shared_file_path(message["id"]) if data.get("filepath") else None
-                is_local_file = path and os.path.isfile(path)
+                is_local_file = self.db.shared_file_exists(path)
                 if not data.get("category"): data["category"] = "file"
                 if not data.get("filename"): data["filename"] = data.get("docid") or data["category"]
                 if is_local_file:
@@ -2688,7 +4105,7 @@ class MessageParser(object):
                           and output.get("files_folder") \
                           and message["datetime"] >= conf.SharedContentDownloadMinDate
             for f in message["__files"]:
-                if self.db.get_shared_file(message["id"]):
+                if self.db.get_shared_file(message["id"], message.get("convo_id")):
                     self.handle_shared_content(message, output, f)
                 elif do_download and f.get("url"):
                     content = self.db.live.get_api_content(f["url"], "file")
@@ -3066,9 +4483,8 @@ class MessageParser(object):
         elif MESSAGE_TYPE_FILE == message["type"]:
             files = message.get("__files")
             if files is None:
-                transfers = self.db.get_transfers()
-                filedict = dict((f["chatmsg_index"], f) for f in transfers
-                                if f["chatmsg_guid"] == message["guid"])
+                filedict = dict((f["chatmsg_index"], f)
+                                for f in self.db.get_message_transfers(message))
                 files = [f for i, f in sorted(filedict.items())]
                 message["__files"] = files
             for f in files: f["__message_id"] = message["id"]
@@ -3324,6 +4740,160 @@ class MessageParser(object):
 
 
 
+class MessageRow(dict):
+    """
+    Messages-table row dictionary, with "datetime" converted from "timestamp"
+    on first access and cached.
+    """
+
+    def __missing__(self, key):
+        if "datetime" != key: raise KeyError(key)
+        stamp = self.get("timestamp")
+        value = self[key] = datetime.datetime.fromtimestamp(stamp) if stamp else None
+        return value
+
+
+    def get(self, key, default=None):
+        """Returns value for key if present or datetime, else default."""
+        return self[key] if "datetime" == key or key in self else default
+
+
+    def copy(self):
+        """Returns a shallow copy of the row."""
+        return type(self)(self)
+
+
+
+class CompactMessageRow(object):
+    """
+    Compact Messages-table row with dictionary access, holding column values
+    in a list, with column positions shared between rows of the same columns.
+    Keys outside row columns are kept in an additional dictionary;
+    "datetime" is converted from "timestamp" on first access and cached.
+    """
+    __slots__ = ("_names", "_index", "_values", "_extra")
+
+    """Shared column positions, as {(column name, ): {column name: position}}."""
+    INDEXES = {}
+
+
+    def __init__(self, items=()):
+        """
+        @param   items  dictionary or sequence of (column name, value) pairs
+        """
+        if hasattr(items, "items"): items = items.items()
+        pairs = list(items)
+        names = tuple(k for k, _ in pairs)
+        self._names, self._index, self._extra = names, self._get_index(names), None
+        self._values = [v for _, v in pairs]
+
+
+    def __getitem__(self, key):
+        idx = self._index.get(key)
+        if idx is not None: return self._values[idx]
+        if self._extra and key in self._extra: return self._extra[key]
+        if "datetime" != key: raise KeyError(key)
+        stamp = self.get("timestamp")
+        value = self[key] = datetime.datetime.fromtimestamp(stamp) if stamp else None
+        return value
+
+
+    def __setitem__(self, key, value):
+        idx = self._index.get(key)
+        if idx is not None: self._values[idx] = value
+        else:
+            if self._extra is None: self._extra = {}
+            self._extra[key] = value
+
+
+    def __delitem__(self, key):
+        idx = self._index.get(key)
+        if idx is not None:
+            names = self._names[:idx] + self._names[idx + 1:]
+            self._names, self._index = names, self._get_index(names)
+            del self._values[idx]
+        elif self._extra and key in self._extra: del self._extra[key]
+        else: raise KeyError(key)
+
+
+    def __contains__(self, key):
+        return key in self._index or bool(self._extra) and key in self._extra
+
+
+    def __iter__(self):
+        return iter(self.keys())
+
+
+    def __len__(self):
+        return len(self._names) + len(self._extra or ())
+
+
+    def __reduce__(self):
+        return (type(self), (self.items(), ))
+
+
+    def __repr__(self):
+        return "%s(%r)" % (type(self).__name__, dict(self.items()))
+
+
+    def get(self, key, default=None):
+        """Returns value for key if present or datetime, else default."""
+        return self[key] if "datetime" == key or key in self else default
+
+
+    def keys(self):
+        """Returns a list of row keys."""
+        return list(self._names) + list(self._extra or ())
+
+
+    def values(self):
+        """Returns a list of row values."""
+        return self._values + list((self._extra or {}).values())
+
+
+    def items(self):
+        """Returns a list of (key, value) pairs."""
+        return list(zip(self._names, self._values)) + list((self._extra or {}).items())
+
+
+    def pop(self, key, *default):
+        """Removes key and returns its value, or default if key not present and default given."""
+        if key not in self:
+            if default: return default[0]
+            raise KeyError(key)
+        value = self[key]
+        del self[key]
+        return value
+
+
+    def setdefault(self, key, default=None):
+        """Returns value for key, setting it to default if not present."""
+        if key not in self: self[key] = default
+        return self[key]
+
+
+    def update(self, *args, **kwargs):
+        """Updates row from dictionary or (key, value) pairs, and keyword arguments."""
+        for arg in args:
+            for k, v in (arg.items() if hasattr(arg, "items") else arg): self[k] = v
+        for k, v in kwargs.items(): self[k] = v
+
+
+    def copy(self):
+        """Returns a shallow copy of the row."""
+        return type(self)(self.items())
+
+
+    @classmethod
+    def _get_index(cls, names):
+        """Returns shared column positions for column names tuple, creating if not cached."""
+        index = cls.INDEXES.get(names)
+        if index is None:
+            index = cls.INDEXES.setdefault(names, {k: i for i, k in enumerate(names)})
+        return index
+
+
+
 def is_skype_database(filename, path=None, log_error=True):
     """Returns whether the file looks to be a Skype database file."""
     result, conn = False, None
@@ -3421,6 +4991,12 @@ def make_db_path(username, directory=None):
     return os.path.join(directory or conf.VarDirectory, "%s.main.db" % base)
 
 
+def decode_text(value):
+    """Returns bytes decoded as UTF-8 if valid else as Latin-1, for SQLite text factory."""
+    try: return value.decode("utf-8")
+    except UnicodeError: return value.decode("latin1")
+
+
 def get_avatar_data(datadict):
     """Returns contact/account avatar raw data or ""."""
     return datadict.get("avatar_image") or datadict.get("profile_attachments") or ""
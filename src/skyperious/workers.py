@@ -9,14 +9,15 @@ Released under the MIT License.
 
 @author      Erki Suurjaak
 @created     10.01.2012
-@modified    10.05.2025
+@modified    16.10.2026
 ------------------------------------------------------------------------------
 """
 import collections
 import datetime
 import logging
-import os
+import multiprocessing
 import re
+import sqlite3
 import threading
 import traceback
 
@@ -107,6 +108,35 @@ class SearchThread(WorkerThread):
     results back to main thread in chunks.
     """
 
+    # Number of messages to retrieve from database at a time
+    PAGE_SIZE = 1000
+
+
+    def __init__(self, callback):
+        """
+        @param   callback  function to call with result chunks
+        """
+        super(SearchThread, self).__init__(callback)
+        self._sql_task = None # (database, cancellable SQL task) of current search
+
+
+    def stop(self, drop_results=True):
+        """Stops the worker thread, aborting any running query."""
+        super(SearchThread, self).stop(drop_results)
+        self.cancel_sql()
+
+
+    def stop_work(self, drop_results=False):
+        """Signals to stop the currently ongoing work, aborting any running query."""
+        super(SearchThread, self).stop_work(drop_results)
+        self.cancel_sql()
+
+
+    def cancel_sql(self):
+        """Cancels SQL task of current search, if any."""
+        db, task = self._sql_task or (None, None)
+        if task: db.cancel_sql_task(task)
+
 
     def match_all(self, text, words):
         """Returns whether the text contains all the specified words."""
@@ -115,6 +145,36 @@ class SearchThread(WorkerThread):
         return result
 
 
+    def iter_messages(self, db, sql, params, limit=None, offset=None, direction=-1):
+        """
+        Yields messages matching search query, retrieved in pages
+        continuing from last message of previous page.
+
+        @param   limit      maximum number of messages to yield
+        @param   offset     number of matching messages to skip from the beginning
+        @param   direction  negative for latest first, positive for earliest first
+        """
+        key, skip, count = None, offset or 0, 0
+        while self._is_working:
+            pagesize = self.PAGE_SIZE
+            if limit: pagesize = min(pagesize, limit - count + skip)
+            try:
+                page = db.get_messages_page(before=key, count=pagesize, direction=direction,
+                                            additional_sql=sql, additional_params=params)
+            except sqlite3.OperationalError:
+                if self._is_working: raise
+                break # while self._is_working
+            for m in page:
+                if skip:
+                    skip -= 1
+                    continue # for m
+                count += 1
+                yield m
+            if len(page) < pagesize or (limit and count >= limit):
+                break # while self._is_working
+            key = (page[-1]["timestamp"], page[-1]["id"])
+
+
     def run(self):
         self._is_running = True
         # For identifying "chat:xxx" and "from:xxx" keywords
@@ -127,6 +187,7 @@ class SearchThread(WorkerThread):
                     continue # continue while self._is_running
 
                 self._is_working, self._drop_results = True, False
+                self._sql_task = (search["db"], search["db"].start_sql_task())
                 is_html = ("text" != search.get("output"))
                 reverse, offset, limit = (search.get(k, 0) for k in ("reverse", "offset", "limit"))
                 wrap_html = None # MessageParser wrap function, for HTML output
@@ -166,7 +227,9 @@ class SearchThread(WorkerThread):
                 # map data: {"contact:666": {"contact": {contact data}}, }
                 result = {"output": "", "map": {},
                           "search": search, "count": 0}
-                sql, params, match_words = query_parser.Parse(search["text"])
+                fts = search["db"].SEARCH_INDEX_TABLE \
+                      if search["db"].has_search_index() else None
+                sql, params, match_words = query_parser.Parse(search["text"], fts=fts)
                 match_words = [x.lower() for x in match_words]
 
                 # Turn wildcard characters * into regex-compatible .*
@@ -283,10 +346,8 @@ class SearchThread(WorkerThread):
                     count, result_type = 0, "messages"
                     chat_messages = {} # {chat id: [message, ]}
                     chat_order = []    # [chat id, ]
-                    messages = search["db"].get_messages(
-                        additional_sql=sql, additional_params=params,
-                        limit=(limit, offset) if limit or offset else (),
-                        ascending=reverse, use_cache=False)
+                    messages = self.iter_messages(search["db"], sql, params, limit, offset,
+                                                  direction=1 if reverse else -1)
                     for m in messages:
                         chat = chat_map.get(m["convo_id"])
                         body = parser.parse(m, pattern_replace if match_words
@@ -328,8 +389,12 @@ class SearchThread(WorkerThread):
                             continue # continue for table in search["db"]..
                         if reverse and re.search(r" ORDER BY \S+$", sql):
                             sql += " DESC"
-                        rows = search["db"].execute(sql, params)
-                        row = rows.fetchone()
+                        try:
+                            rows = search["db"].execute(sql, params)
+                            row = rows.fetchone()
+                        except sqlite3.OperationalError:
+                            if self._is_working: raise
+                            break # for table
                         namepre, namesuf = ("<b>", "</b>") if row else ("", "")
                         countpre, countsuf = (("<a href='#%s'>" %
                             step.step.escape_html(table["name"]), "</a>") if row
@@ -368,7 +433,10 @@ class SearchThread(WorkerThread):
                             if not self._is_working or (is_html
                             and result_count >= conf.MaxSearchTableRows):
                                 break # while row
-                            row = rows.fetchone()
+                            try: row = rows.fetchone()
+                            except sqlite3.OperationalError:
+                                if self._is_working: raise
+                                row = None
                         if not self._drop_results:
                             if is_html:
                                 result["output"] += "</table>"
@@ -415,11 +483,16 @@ class SearchThread(WorkerThread):
             except Exception as e:
                 if not result:
                     result = {}
-                result["done"], result["error"] = True, traceback.format_exc()
-                result["error_short"] = repr(e)
+                result["done"] = True
+                if self._is_working or not isinstance(e, sqlite3.OperationalError):
+                    result["error"] = traceback.format_exc() # Not aborted by stop
+                    result["error_short"] = repr(e)
                 self.postback(result)
             finally:
                 self._is_working = False
+                db, task = self._sql_task or (None, None)
+                self._sql_task = None
+                if task: db.end_sql_task(task)
 
 
 class MergeThread(WorkerThread):
@@ -490,13 +563,8 @@ class MergeThread(WorkerThread):
         compared.sort(key=lambda x: x["title"].lower())
         info_template = step.Template(templates.DIFF_RESULT_ITEM, escape=True)
 
-        for index, chat in enumerate(compared):
-            result["chatindex"] = index
-            postback = dict((k, v) for k, v in result.items()
-                            if k not in ["output", "chats", "params"])
-            diff = self.get_chat_diff_left(chat, db1, db2, postback, runcheck=True)
-            if not self._is_working:
-                break # for index, chat
+        diffs = self.iter_chat_diffs_left(compared, db1, db2, result, params.get("jobs"))
+        for index, chat, diff in diffs:
             if not conf.ShareDirectoryEnabled: diff["shared_files"] = []
             if diff["messages"] or diff["shared_files"] \
             or (chat["message_count"] and diff["participants"]):
@@ -516,12 +584,11 @@ class MergeThread(WorkerThread):
                 info += ".<br />"
                 result["output"] += info
                 result["chats"].append({"chat": chat, "diff": diff})
-            result["index"] = postback["index"]
             if not self._drop_results:
                 if index < len(compared) - 1:
                     result["status"] = ("Scanning %s." % compared[index + 1]["title_long_lc"])
-                self.postback(result)
-                result = dict(result, output="", chats=[])
+                self.postback(dict(result)) # Copy, result is shared with diff iterator
+                result.update(output="", chats=[])
         if not self._drop_results:
             result["done"] = True
             self.postback(result)
@@ -532,6 +599,11 @@ class MergeThread(WorkerThread):
         """
         Worker branch that compares all chats on the left side for differences,
         copies them over to the right, posting progress back to application.
+
+        If params has "target" dictionary, uses and updates it as an index of
+        the right side in N-way merge, retaining chats and message buckets
+        over several passes from different left sides, as
+        {"chats": [db2 chats], "buckets": {chat2 ID: message buckets}}.
         """
         result = {"output": "", "index": 0, "count": 0, "chatindex": 0,
                   "chatcount": 0, "params": params, "chats": [],
@@ -539,9 +611,14 @@ class MergeThread(WorkerThread):
         error, exc = None, None
         compared = []
         db1, db2 = params["db1"], params["db2"]
+        target = params.get("target")
         try:
             chats1 = params.get("chats") or db1.get_conversations()
-            chats2 = db2.get_conversations()
+            if target is not None and "chats" in target:
+                chats2 = target["chats"]
+            else:
+                chats2 = db2.get_conversations()
+                if target is not None: target["chats"] = list(chats2)
             c2map = dict((c["identity"], c) for c in chats2)
             for c in (c for c in chats2 if c.get("__link")):
                 c2map[c["__link"]["identity"]] = c
@@ -559,36 +636,39 @@ class MergeThread(WorkerThread):
             compared.sort(key=lambda x: x["title"].lower())
             counts = collections.defaultdict(int)
 
-            for index, chat in enumerate(compared):
-                result["chatindex"] = index
-                postback = dict((k, v) for k, v in result.items()
-                                if k not in ["output", "chats", "params"])
-                diff = self.get_chat_diff_left(chat, db1, db2, postback, runcheck=True)
-                if not self._is_working:
-                    break # for index, chat
+            buckets = None if target is None else target.setdefault("buckets", {})
+            if target is not None: self.prepare_merge_target(target, compared, db2)
+            diffs = self.iter_chat_diffs_left(compared, db1, db2, result,
+                                              params.get("jobs"), buckets, writing=True)
+            for index, chat, diff in diffs:
                 if not conf.ShareDirectoryEnabled: diff["shared_files"] = []
                 if diff["messages"] or diff["shared_files"] \
                 or (chat["message_count"] and diff["participants"]):
+                    message_ids2 = []
                     chat1 = chat["c1"]
                     chat2 = chat["c2"]
                     new_chat = not chat2
-                    if new_chat:
-                        chat2 = chat1.copy()
-                        chat["c2"] = chat2
-                        chat2["id"] = db2.insert_conversation(chat2, db1)
-                    if diff["participants"]:
-                        db2.insert_participants(chat2, diff["participants"], db1)
-                        counts["participants"] += len(diff["participants"])
-                    if diff["messages"]:
-                        db2.insert_messages(chat2, diff["messages"], db1, chat1, diff["shared_files"],
-                                            self.yield_ui, self.REFRESH_COUNT)
-                        counts["messages"] += len(diff["messages"])
-                    if diff["shared_files"]:
-                        files_missing = [f for f in diff["shared_files"] if f.get("msg_id2")]
-                        if files_missing:
-                            db2.insert_shared_files(chat2, files_missing, db1,
-                                                    self.yield_ui, self.REFRESH_COUNT)
-                        counts["shared_files"] += len(diff["shared_files"])
+                    with db2.bulk_write():
+                        if new_chat:
+                            chat2 = chat1.copy()
+                            chat["c2"] = chat2
+                            chat2["id"] = db2.insert_conversation(chat2, db1)
+                        if diff["participants"]:
+                            db2.insert_participants(chat2, diff["participants"], db1)
+                            counts["participants"] += len(diff["participants"])
+                        if diff["messages"]:
+                            message_ids2 = db2.insert_messages(chat2, diff["messages"], db1, chat1,
+                                                               diff["shared_files"],
+                                                               self.yield_ui, self.REFRESH_COUNT)
+                            counts["messages"] += len(diff["messages"])
+                        if diff["shared_files"]:
+                            files_missing = [f for f in diff["shared_files"] if f.get("msg_id2")]
+                            if files_missing:
+                                db2.insert_shared_files(chat2, files_missing, db1,
+                                                        self.yield_ui, self.REFRESH_COUNT)
+                            counts["shared_files"] += len(diff["shared_files"])
+                    if target is not None:
+                        self.update_merge_target(target, chat, diff, message_ids2, new_chat)
 
                     newstr = "" if new_chat else "new "
                     info = "Merged %s" % chat["title_long_lc"]
@@ -604,14 +684,13 @@ class MergeThread(WorkerThread):
                         info += ", %s" % util.plural("%sparticipant" % newstr, diff["participants"])
                     result["output"] = info + "."
                     result["diff"] = diff
-                result["index"] = postback["index"]
                 result["chats"].append(chat)
                 if not self._drop_results:
                     if index < len(compared) - 1:
                         result["status"] = ("Scanning %s." %
                                             compared[index+1]["title_long_lc"])
-                    self.postback(result)
-                    result = dict(result, output="", chats=[])
+                    self.postback(dict(result)) # Copy, result is shared with diff iterator
+                    result.update(output="", chats=[])
         except Exception as e:
             error = traceback.format_exc()
             exc = e
@@ -670,23 +749,24 @@ class MergeThread(WorkerThread):
                 if shared_files:
                     html += ", %s" % util.plural("%sshared file" % newstr, shared_files)
                 html += "."
-                if not chat2:
-                    chat2 = chat1.copy()
-                    chat_data["chat"]["c2"] = chat2
-                    chat2["id"] = db2.insert_conversation(chat2, db1)
-                if participants:
-                    db2.insert_participants(chat2, participants, db1)
-                    counts["participants"] += len(participants)
-                if messages:
-                    db2.insert_messages(chat2, messages, db1, chat1, shared_files,
-                                        self.yield_ui, self.REFRESH_COUNT)
-                    counts["messages"] += len(messages)
-                if shared_files:
-                    files_missing = [f for f in shared_files if f.get("msg_id2")]
-                    if files_missing:
-                        db2.insert_shared_files(chat2, files_missing, db1,
-                                                self.yield_ui, self.REFRESH_COUNT)
-                    counts["shared_files"] += len(shared_files)
+                with db2.bulk_write():
+                    if not chat2:
+                        chat2 = chat1.copy()
+                        chat_data["chat"]["c2"] = chat2
+                        chat2["id"] = db2.insert_conversation(chat2, db1)
+                    if participants:
+                        db2.insert_participants(chat2, participants, db1)
+                        counts["participants"] += len(participants)
+                    if messages:
+                        db2.insert_messages(chat2, messages, db1, chat1, shared_files,
+                                            self.yield_ui, self.REFRESH_COUNT)
+                        counts["messages"] += len(messages)
+                    if shared_files:
+                        files_missing = [f for f in shared_files if f.get("msg_id2")]
+                        if files_missing:
+                            db2.insert_shared_files(chat2, files_missing, db1,
+                                                    self.yield_ui, self.REFRESH_COUNT)
+                        counts["shared_files"] += len(shared_files)
 
                 if not self._drop_results:
                     result.update(output=html, chatindex=index, chats=[chat_data["chat"]])
@@ -716,7 +796,78 @@ class MergeThread(WorkerThread):
                 self.postback(result)
 
 
-    def get_chat_diff_left(self, chat, db1, db2, postback=None, runcheck=False):
+    def iter_chat_diffs_left(self, compared, db1, db2, result, jobs=None, buckets=None,
+                             writing=False):
+        """
+        Yields (index, chat, diff) for compared chats in order, as from
+        get_chat_diff_left(), updating result "chatindex" and "index"
+        and posting the result at POSTBACK_COUNT intervals.
+        Stops when thread is no longer marked working.
+
+        @param   jobs     number of worker processes for comparing chats
+                          in parallel, with separate read-only connections,
+                          if more than 1; changes are written in this thread only
+        @param   buckets  message buckets of db2 to use and populate
+                          in get_chat_diff_left(), if not comparing in parallel
+        @param   writing  whether caller writes to db2 between yielded diffs:
+                          parallel comparison is then completed for all chats
+                          before yielding the first, so that worker processes
+                          never read db2 while it is being changed
+        """
+        if (jobs or 0) < 2 or len(compared) < 2:
+            for index, chat in enumerate(compared):
+                result["chatindex"] = index
+                postback = dict((k, v) for k, v in result.items()
+                                if k not in ["output", "chats", "params"])
+                diff = self.get_chat_diff_left(chat, db1, db2, postback, runcheck=True,
+                                               buckets=buckets)
+                if not self._is_working:
+                    break # for index, chat
+                result["index"] = postback["index"]
+                yield index, chat, diff
+            return
+
+        logger.info("Comparing %s from %s with %s in %s worker processes.",
+                    util.plural("chat", compared), db1, db2, min(jobs, len(compared)))
+        configfile = conf.ConfigFile if conf.ConfigFileStatic else None
+        pool = multiprocessing.Pool(min(jobs, len(compared)), init_diff_process,
+                                    (db1.filename, db2.filename, configfile))
+        collected = [] # [(index, chat, diff, changes)] if writing
+        try:
+            diffs = pool.imap(diff_chat_process, compared)
+            for index, chat in enumerate(compared):
+                result["chatindex"] = index
+                while self._is_working:
+                    try: diff, changes = diffs.next(timeout=1)
+                    except multiprocessing.TimeoutError: continue # while
+                    break # while
+                if not self._is_working:
+                    break # for index, chat
+                result["index"] += chat["messages1"] + chat["messages2"]
+                if writing:
+                    collected.append((index, chat, diff, changes))
+                    if not self._drop_results:
+                        self.postback(dict((k, v) for k, v in result.items()
+                                           if k not in ["output", "chats", "params"]))
+                    continue # for index, chat
+                db1.store_message_fingerprints(changes[0])
+                db2.store_message_fingerprints(changes[1])
+                yield index, chat, diff
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
+        for index, chat, diff, (changes1, changes2) in collected:
+            if not self._is_working:
+                break # for index, chat
+            result["chatindex"] = index
+            db1.store_message_fingerprints(changes1)
+            db2.store_message_fingerprints(changes2)
+            yield index, chat, diff
+
+
+    def get_chat_diff_left(self, chat, db1, db2, postback=None, runcheck=False,
+                           changes=None, buckets=None):
         """
         Compares the chat in the two databases and returns the differences from
         the left as {"messages": [message IDs different in db1],
@@ -726,6 +877,11 @@ class MergeThread(WorkerThread):
         @param   postback  if {"count": .., "index": ..}, updates index
                            and posts the result at POSTBACK_COUNT intervals
         @param   runcheck  if true, breaks when thread is no longer marked working
+        @param   changes   ([], []) to collect new message fingerprints of db1 and db2 into,
+                           instead of storing them in databases
+        @param   buckets   {chat2 ID: {day: {(author, body hash): [(id, datetime), ]}}}
+                           to use for db2 messages if chat present,
+                           and to populate if not
         """
         c = chat
         participants1 = c["c1"]["participants"] if c["c1"] else []
@@ -738,40 +894,39 @@ class MergeThread(WorkerThread):
         if conf.ShareDirectoryEnabled:
             for db, convo, fmap in [(db1, c["c1"], c1f_map), (db2, c["c2"], c2f_map)]:
                 if convo and "_shared_files_" in db.tables:
-                    for f in db.execute("SELECT * FROM _shared_files_ WHERE convo_id = :id", convo):
+                    for f in db.prefetch_shared_files(convo):
                         path = db.get_shared_file_path(f["msg_id"])
-                        if path and os.path.isfile(path): fmap[f["msg_id"]] = f
+                        if db.shared_file_exists(path): fmap[f["msg_id"]] = f
 
         c1m_diff = [] # [(id, datetime), ] messages different in chat 1
         c1f_diff = [] # [{..shared file dict, ?msg_id2..}, ] files from chat 1 missing in chat 2
         db_account_ids = set(filter(bool, [db1.id, db1.username, db2.id, db2.username]))
+        account_authors = [util.to_unicode(x, "utf-8") for x in db_account_ids]
 
         if not c["messages1"]:   # Left side empty, skip all messages
             if postback: postback["index"] += c["messages2"]
         elif not c["messages2"]: # Right side empty, take entire left
-            messages1 = db1.get_messages(c["c1"], use_cache=False)
+            messages1 = db1.get_messages(c["c1"], use_cache=False, columns=["id", "timestamp"])
             c1m_diff = [(m["id"], m["datetime"]) for m in messages1]
             if postback: postback["index"] += len(c1m_diff)
         else:
-            messages1 = db1.get_messages(c["c1"], use_cache=False)
-            messages2 = db2.get_messages(c["c2"], use_cache=False)
-            parser1 = skypedata.MessageParser(db1)
-            parser2 = skypedata.MessageParser(db2)
-            parse_options = {"format": "text", "merge": True}
-
-            m2buckets = {} # {datetime.date: {(author, body): [(id, datetime), ]}}
+            # Message contents as hashes of parsed text, cached in databases
+            changes1, changes2 = changes or (None, None)
+            beat = dict(heartbeat=self.yield_ui, beatcount=self.REFRESH_COUNT)
+            messages1 = db1.get_message_fingerprints(c["c1"], changes=changes1, **beat)
+
+            # {day: {(author, body hash): [(id, datetime), ]}}
+            m2buckets = None if buckets is None else buckets.get(c["c2"]["id"])
+            if m2buckets is None:
+                m2buckets = {}
+                messages2 = db2.get_message_fingerprints(c["c2"], changes=changes2, **beat)
+            else: # Reusing buckets from earlier pass
+                messages2 = []
+                if postback: postback["index"] += c["messages2"]
 
             # Assemble all chat message contents from db2
             for i, m in enumerate(messages2):
-                if not m.get("datetime"): continue # for i, m
-
-                mkey, akey = (m["id"], m["datetime"]), None
-                t = util.to_unicode(parser2.parse(m, output=parse_options), "utf-8")
-                if m["author"] not in db_account_ids:
-                    akey = util.to_unicode(m["author"] or "", "utf-8")
-                bucket = m2buckets.setdefault(m["datetime"].date(), {})
-                bucket.setdefault((akey, t), []).append(mkey)
-
+                self.add_message_bucket(m2buckets, m, db2)
                 if runcheck and not self._is_working:
                     break # for i, m
                 if i and not i % self.REFRESH_COUNT:
@@ -779,24 +934,25 @@ class MergeThread(WorkerThread):
                 if postback: postback["index"] += 1
                 if postback and i and not i % self.POSTBACK_COUNT:
                     self.postback(postback)
+            if messages2 and buckets is not None and not (runcheck and not self._is_working):
+                buckets[c["c2"]["id"]] = m2buckets
 
             # For every chat message in db1, see if there is a match in db2
-            DELTAS = [datetime.timedelta(days=x) for x in range(-1, 2)]
             for i, m in enumerate(messages1):
-                if not m.get("datetime"): continue # for i, m
+                mdt = db1.stamp_to_date(m["timestamp"])
+                if m["author"] in db_account_ids:
+                    ckeys = [(x, m["hash"]) for x in account_authors]
+                else: ckeys = [(util.to_unicode(m["author"] or "", "utf-8"), m["hash"])]
 
-                t = util.to_unicode(parser1.parse(m, output=parse_options), "utf-8")
-                if m["author"] in db_account_ids: ckey = (None, t)
-                else: ckey = (util.to_unicode(m["author"] or "", "utf-8"), t)
-
-                potentials, mdate = [], m["datetime"].date()
-                for delta in DELTAS:
+                potentials = []
+                for delta in range(-1, 2):
                     # Look for matching messages within -1/+1 day interval
-                    potentials += m2buckets.get(mdate+delta, {}).get(ckey, [])
+                    bucket = m2buckets.get(m["day"] + delta, {})
+                    for ckey in ckeys: potentials += bucket.get(ckey, [])
                 m2key = next((x for x in potentials
-                              if self.match_time(m["datetime"], x[1], 180)), None)
+                              if self.match_time(mdt, x[1], 180)), None)
                 if not m2key:
-                    c1m_diff.append((m["id"], m["datetime"]))
+                    c1m_diff.append((m["id"], mdt))
                 if m["id"] in c1f_map and (not m2key or m2key[0] not in c2f_map):
                     filedata = c1f_map[m["id"]]
                     if m2key: filedata = dict(filedata, msg_id2=m2key[0])
@@ -815,6 +971,66 @@ class MergeThread(WorkerThread):
         return result
 
 
+    def add_message_bucket(self, buckets, fingerprint, db):
+        """
+        Adds message to chat message buckets for merge comparison.
+
+        @param   buckets      {day: {(author, body hash): [(id, datetime), ]}}
+        @param   fingerprint  message fingerprint as from get_message_fingerprints()
+        """
+        m = fingerprint
+        mkey = (m["id"], db.stamp_to_date(m["timestamp"]))
+        akey = util.to_unicode(m["author"] or "", "utf-8")
+        buckets.setdefault(m["day"], {}).setdefault((akey, m["hash"]), []).append(mkey)
+
+
+    def update_merge_target(self, target, chat, diff, message_ids, new_chat):
+        """
+        Updates N-way merge target index with changes merged into database,
+        queueing new messages for chat buckets already populated.
+
+        @param   target       {"chats": [target chats],
+                               "buckets": {chat ID: {day: {(author, body hash): [(id, datetime), ]}}},
+                               "pending": {chat ID: [message IDs to add to buckets]}}
+        @param   chat         compared chat, with "c2" as merged target chat
+        @param   diff         merged differences as from get_chat_diff_left()
+        @param   message_ids  IDs of messages inserted into database
+        @param   new_chat     whether target chat was newly inserted
+        """
+        chat2 = chat["c2"]
+        if new_chat:
+            chat2 = dict(chat2, message_count=0, participants=[])
+            chat2.pop("__link", None)
+            target["chats"].append(chat2)
+        if diff["participants"]:
+            pmap = collections.OrderedDict((p["identity"], p) for p in chat2["participants"])
+            pmap.update((p["identity"], p) for p in diff["participants"])
+            chat2["participants"] = list(pmap.values())
+        if not message_ids: return
+
+        chat2["message_count"] = (chat2.get("message_count") or 0) + len(message_ids)
+        if chat2["id"] in target.get("buckets", {}): # Else populated on first comparison
+            target.setdefault("pending", {}).setdefault(chat2["id"], []).extend(message_ids)
+
+
+    def prepare_merge_target(self, target, compared, db):
+        """
+        Adds pending new messages to N-way merge target chat buckets,
+        for compared chats that will use them.
+
+        @param   target    N-way merge target index, as in update_merge_target()
+        @param   compared  [{"c1": chat1, "c2": chat2, "messages1": count, ..}, ]
+        """
+        pending = target.get("pending", {})
+        for c in compared:
+            if not c["c2"] or not c["messages1"] or c["c2"]["id"] not in pending:
+                continue # for c
+            buckets = target["buckets"][c["c2"]["id"]]
+            ids = pending.pop(c["c2"]["id"])
+            for m in db.get_message_fingerprints(c["c2"], ids=ids):
+                self.add_message_bucket(buckets, m, db)
+
+
     def match_time(self, d1, d2, slack=0):
         """
         Returns whether datetimes might be same but from different timezones:
@@ -837,6 +1053,37 @@ class MergeThread(WorkerThread):
 
 
 
+"""Worker process state in parallel chat comparison, as {"db1", "db2", "thread"}."""
+DIFF_PROCESS = {}
+
+
+def init_diff_process(filename1, filename2, configfile=None):
+    """
+    Initializes worker process for parallel chat comparison,
+    opening its own read-only database connections.
+    """
+    if not conf.Defaults: conf.load(configfile) # Spawned process, not forked
+    db1, db2 = (skypedata.SkypeDatabase(x, readonly=True) for x in (filename1, filename2))
+    thread = MergeThread(None)
+    thread.yield_ui = lambda: None # No UI in worker process
+    DIFF_PROCESS.update(db1=db1, db2=db2, thread=thread)
+
+
+def diff_chat_process(chat):
+    """
+    Compares chat in parallel comparison worker process.
+
+    @param   chat  compared chat data as in MergeThread.get_chat_diff_left()
+    @return        (diff as from MergeThread.get_chat_diff_left(),
+                    ([new fingerprints of db1], [new fingerprints of db2]))
+    """
+    changes = ([], [])
+    diff = DIFF_PROCESS["thread"].get_chat_diff_left(chat, DIFF_PROCESS["db1"],
+                                                     DIFF_PROCESS["db2"], changes=changes)
+    return diff, changes
+
+
+
 class DetectDatabaseThread(WorkerThread):
     """
     Skype database detection background thread, goes through potential
@@ -951,3 +1198,69 @@ class SkypeArchiveThread(WorkerThread):
 
             if not self._drop_results: self.postback(result)
             self._is_working = False
+
+
+
+class SearchIndexThread(WorkerThread):
+    """
+    Full-text search index builder thread, carries out indexing database messages.
+    """
+
+
+    def run(self):
+        self._is_running = True
+
+        def progress(**kwargs):
+            if kwargs and not self._drop_results: self.postback(kwargs)
+            return self._is_working
+
+        while self._is_running:
+            action = self._queue.get()
+            if not action: continue # while self._is_running
+
+            self._is_working, self._drop_results = True, False
+            result = {"action": action["action"], "opts": action, "done": True}
+            try:
+                if "build" == action["action"]:
+                    result["complete"] = action["db"].build_search_index(progress)
+            except Exception as e:
+                logger.exception("Error building search index in %s.", action["db"])
+                result["error"] = traceback.format_exc()
+                result["error_short"] = util.format_exc(e)
+            if not self.is_working(): result["stop"] = True
+
+            if not self._drop_results: self.postback(result)
+            self._is_working = False
+
+
+
+class RowCountThread(WorkerThread):
+    """
+    Table rowcount thread, counts exact rows in tables having estimated rowcounts,
+    posting back results one table at a time.
+    """
+
+
+    def run(self):
+        self._is_running = True
+        while self._is_running:
+            action = self._queue.get()
+            if not action: continue # while self._is_running
+
+            self._is_working, self._drop_results = True, False
+            db, result = action["db"], {"done": True, "counts": {}}
+            try:
+                for table in [x for x in db.get_tables() if x.get("rows_estimated")]:
+                    if not self._is_working: break # for table
+                    count = db.get_table_rowcount(table["name"])
+                    result["counts"][table["name"]] = count
+                    if not self._drop_results:
+                        self.postback({"table": table["name"], "rows": count})
+            except Exception as e:
+                logger.exception("Error counting table rows in %s.", db)
+                result["error"] = traceback.format_exc()
+                result["error_short"] = util.format_exc(e)
+            if not self.is_working(): result["stop"] = True
+
+            if not self._drop_results: self.postback(result)
+            self._is_working = False